@@ -8,7 +8,7 @@ class AccountSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'company_name', 'street', 'exterior_number', 'interior_number',
             'neighborhood', 'postal_code', 'city', 'state', 'country', 'phone',
-            'email', 'subscription_plan', 'max_locations', 'max_users', 'is_active',
+            'email', 'time_zone', 'subscription_plan', 'max_locations', 'max_users', 'is_active',
             'subscription_start_date', 'subscription_end_date', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'max_locations', 'max_users']
@@ -17,6 +17,11 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_login']
 
 
+class UserCompactSerializer(UserSerializer):
+    """Usuario con la cuenta como ID (listados compactos)"""
+    account = None
+
+
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     
@@ -15,7 +15,7 @@ class AccountViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_superuser:
             return Account.objects.all()
-        return Account.objects.filter(id=user.account.id)
+        return Account.objects.filter(id=user.account_id)
     
     @action(detail=True, methods=['post'])
     def activate(self, request, pk=None):
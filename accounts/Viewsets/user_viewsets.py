@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
 from accounts.models import User
+from pack_a_stock_api.query_plans import FetchPlan, FetchPlanMixin
 from accounts.Serializers.user_serializer import (
     UserSerializer, 
     UserCreateSerializer, 
@@ -13,16 +14,20 @@ from accounts.Serializers.user_serializer import (
 )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FetchPlanMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    fetch_plans = {
+        'default': FetchPlan(select=['account']),
+    }
+    query_budgets = {'list': 2, 'retrieve': 1}
     
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return User.objects.all()
-        return User.objects.filter(account=user.account)
+            return self.plan_queryset(User.objects.all())
+        return self.plan_queryset(User.objects.filter(account_id=user.account_id))
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -0,0 +1,40 @@
+"""
+Fecha local de cada cuenta.
+
+Los vencimientos de préstamos se cuentan por día en la zona horaria de la
+cuenta (Account.time_zone), no en UTC. La zona se guarda en caché por cuenta
+para no leer la cuenta en cada guardado o consulta; se olvida al guardar la
+cuenta (ver accounts.signals).
+"""
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from accounts.models import Account
+
+TIME_ZONE_CACHE_TIMEOUT = 3600
+
+
+def _cache_key(account_id):
+    return f'account:time_zone:{account_id}'
+
+
+def account_time_zone(account_id):
+    """Zona horaria de la cuenta (la del proyecto si no existe)"""
+    key = _cache_key(account_id)
+    name = cache.get(key)
+    if name is None:
+        name = Account.objects.filter(pk=account_id).values_list('time_zone', flat=True).first()
+        name = name or settings.TIME_ZONE
+        cache.set(key, name, TIME_ZONE_CACHE_TIMEOUT)
+    return ZoneInfo(name)
+
+
+def local_date(account_id):
+    """Fecha actual en la zona horaria de la cuenta"""
+    return timezone.localdate(timezone=account_time_zone(account_id))
+
+
+def forget_time_zone(account_id):
+    cache.delete(_cache_key(account_id))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 09:27
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='time_zone',
+            field=models.CharField(default='America/Mexico_City', help_text='Zona horaria IANA; define el día local para vencimientos', max_length=63, validators=[accounts.models.validate_time_zone]),
+        ),
+    ]
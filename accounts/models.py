@@ -1,9 +1,20 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
+from audit.changes import AuditedModel, AuditedQuerySet
+
+
+def validate_time_zone(value):
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"'{value}' no es una zona horaria válida")
 
 
-class Account(models.Model):
+class Account(AuditedModel):
     PLAN_CHOICES = [
         ('freemium', 'Freemium'),
         ('premium', 'Premium'),
@@ -20,6 +31,12 @@ class Account(models.Model):
     country = models.CharField(max_length=255, default='México')
     phone = models.CharField(max_length=50, blank=True)
     email = models.EmailField(unique=True)
+    time_zone = models.CharField(
+        max_length=63,
+        default='America/Mexico_City',
+        validators=[validate_time_zone],
+        help_text="Zona horaria IANA; define el día local para vencimientos"
+    )
     
     subscription_plan = models.CharField(max_length=50, choices=PLAN_CHOICES, default='freemium')
     max_locations = models.IntegerField(default=1)
@@ -32,6 +49,10 @@ class Account(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Captura de cambios (audit.changes)
+    audit_table = 'accounts'
+    audit_account_field = 'id'
+    
     class Meta:
         db_table = 'accounts'
         indexes = [
@@ -43,7 +64,7 @@ class Account(models.Model):
         return self.company_name
 
 
-class UserManager(BaseUserManager):
+class UserManager(BaseUserManager.from_queryset(AuditedQuerySet)):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('El email es obligatorio')
@@ -61,7 +82,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractBaseUser):
+class User(AuditedModel, AbstractBaseUser):
     USER_TYPE_CHOICES = [
         ('inventarista', 'Inventarista'),
         ('employee', 'Empleado'),
@@ -91,6 +112,11 @@ class User(AbstractBaseUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['full_name']
     
+    # Captura de cambios (audit.changes)
+    audit_table = 'users'
+    audit_exclude = ('updated_at', 'last_login')
+    audit_masked = ('password', 'face_encoding')
+    
     class Meta:
         db_table = 'users'
         indexes = [
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from accounts.local_time import forget_time_zone
+from accounts.models import Account
+
+
+@receiver([post_save, post_delete], sender=Account)
+def invalidate_time_zone(sender, instance, **kwargs):
+    """La zona horaria en caché se vuelve a leer tras cambiar la cuenta"""
+    forget_time_zone(instance.pk)
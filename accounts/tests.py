@@ -1,3 +1,26 @@
-from django.test import TestCase
+from accounts.Viewsets.user_viewsets import UserViewSet
+from pack_a_stock_api.testing import QueryBudgetTestCase
 
-# Create your tests here.
+# AccountViewSet no usa planes de carga; su presupuesto se fija aquí
+ACCOUNT_BUDGETS = {'list': 2, 'retrieve': 1}
+
+
+class AccountQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/accounts/accounts/'
+
+    def test_list(self):
+        self.assertListBudget(self.url, ACCOUNT_BUDGETS['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, ACCOUNT_BUDGETS['retrieve'])
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/accounts/users/'
+    budgets = UserViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
@@ -0,0 +1,419 @@
+"""
+Escritura diferida de la auditoría.
+
+AuditLog.log_action no inserta en la request: agrega la entrada a un buffer
+en memoria del proceso y a un archivo de spool local (una línea JSON por
+entrada). Un hilo del proceso las inserta con bulk_create cada
+AUDIT_FLUSH_INTERVAL segundos o en cuanto se juntan AUDIT_BUFFER_SIZE.
+
+El spool se rota en cada flush y el segmento se borra solo cuando sus
+entradas quedaron en la base de datos; si la base no responde, las entradas
+se reintentan en el siguiente flush. Una entrada que no se puede serializar
+o que la base rechaza (datos inválidos) se descarta con un error en el log,
+para no bloquear la cola. Los segmentos de un proceso que terminó
+sin vaciarlos (caída, reinicio) se reinsertan al arrancar el siguiente
+proceso del servidor o con el comando audit_spool --replay. Los nombres
+llevan el PID y un token aleatorio del proceso
+(audit-<pid>-<token>_<n>.jsonl): un proceso nuevo que reutiliza el PID de
+uno caído no escribe en sus segmentos y los reinserta como ajenos. La entrega es
+al menos una vez: una caída entre el INSERT y el borrado del segmento
+duplica esas entradas.
+
+Cada proceso escribe sus métricas (entradas en cola, segmentos pendientes,
+latencia de los flush) en stats-<pid>.json dentro del spool; el comando
+audit_spool las muestra.
+"""
+import atexit
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    'action', 'user_id', 'account_id', 'table_name', 'record_id',
+    'changes', 'ip_address', 'user_agent', 'description',
+)
+
+# Espera máxima entre reintentos con la base de datos caída (segundos)
+MAX_BACKOFF = 60
+
+# Errores de base no disponible: las entradas se reintentan, no se descartan
+UNAVAILABLE = (OperationalError, InterfaceError)
+
+
+def serialize(entry):
+    """Línea de spool de un AuditLog sin guardar"""
+    data = {name: getattr(entry, name) for name in FIELDS}
+    data['created_at'] = entry.created_at.isoformat()
+    return json.dumps(data, separators=(',', ':'))
+
+
+def deserialize(line):
+    from audit.models import AuditLog
+
+    data = json.loads(line)
+    data['created_at'] = parse_datetime(data['created_at'])
+    return AuditLog(**data)
+
+
+_token = secrets.token_hex(4)
+
+
+def process_token():
+    """Token aleatorio del proceso actual (cambia en cada arranque y fork)"""
+    return _token
+
+
+def segment_owner(name):
+    """(pid, token) dueños de un segmento audit-<pid>-<token>_<n>.jsonl, o None"""
+    parts = name.split('-')
+    if len(parts) != 3 or parts[0] != 'audit' or not name.endswith('.jsonl'):
+        return None
+    try:
+        pid = int(parts[1])
+    except ValueError:
+        return None
+    # Segmentos audit-<pid>-<n>.jsonl anteriores al token: sin token
+    token, sep, _ = parts[2].partition('_')
+    return pid, token if sep else None
+
+
+def segment_pid(name):
+    """PID dueño de un segmento, o None"""
+    owner = segment_owner(name)
+    return owner[0] if owner else None
+
+
+def is_orphan(name):
+    """El segmento es de un proceso terminado (o de otro arranque con el mismo PID)"""
+    owner = segment_owner(name)
+    if owner is None:
+        return False
+    pid, token = owner
+    if pid == os.getpid():
+        return token != process_token()
+    return not pid_alive(pid)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_segment(path):
+    """Entradas de un segmento; ignora una última línea cortada por una caída"""
+    entries = []
+    with open(path, encoding='utf-8') as spool:
+        for number, line in enumerate(spool, 1):
+            try:
+                entries.append(deserialize(line))
+            except (ValueError, TypeError, KeyError):
+                logger.warning('Línea %d inválida en %s, se omite', number, path)
+    return entries
+
+
+def insert(entries):
+    """
+    Inserta las entradas en un INSERT. Si un usuario o cuenta se borró
+    mientras la entrada esperaba, la entrada queda sin usuario o se descarta
+    con la cuenta (igual que con las ya guardadas).
+    """
+    from accounts.models import Account, User
+    from audit.models import AuditLog
+
+    try:
+        with transaction.atomic():
+            AuditLog.objects.bulk_create(entries)
+        return
+    except IntegrityError:
+        pass
+    users = set(User.objects.filter(pk__in={e.user_id for e in entries}).values_list('pk', flat=True))
+    accounts = set(Account.objects.filter(pk__in={e.account_id for e in entries}).values_list('pk', flat=True))
+    kept = []
+    for entry in entries:
+        if entry.account_id is not None and entry.account_id not in accounts:
+            continue
+        if entry.user_id not in users:
+            entry.user_id = None
+        kept.append(entry)
+    with transaction.atomic():
+        AuditLog.objects.bulk_create(kept)
+
+
+def insert_valid(entries):
+    """
+    Inserta las entradas; si la base rechaza el lote por otra causa que no
+    sea estar caída, las inserta una por una y descarta las rechazadas.
+    Retorna cuántas descartó. Va sacando de `entries` las ya resueltas: si
+    la base deja de responder, el error se propaga y en `entries` quedan
+    las que faltan.
+    """
+    try:
+        insert(entries)
+    except UNAVAILABLE:
+        raise
+    except Exception:
+        logger.exception('Lote de auditoría rechazado, se inserta entrada por entrada')
+    else:
+        entries.clear()
+        return 0
+
+    dropped = 0
+    while entries:
+        entry = entries[0]
+        try:
+            insert([entry])
+        except UNAVAILABLE:
+            raise
+        except Exception:
+            logger.exception('Entrada de auditoría descartada: %s #%s', entry.table_name, entry.record_id)
+            dropped += 1
+        del entries[0]
+    return dropped
+
+
+def replay_spool(directory=None):
+    """
+    Inserta los segmentos que dejaron procesos ya terminados; retorna
+    cuántas entradas insertó. Cada segmento se toma renombrándolo, así dos
+    procesos no lo insertan dos veces.
+    """
+    directory = directory or settings.AUDIT_SPOOL_DIR
+    if not os.path.isdir(directory):
+        return 0
+    replayed = 0
+    for name in sorted(os.listdir(directory)):
+        if not is_orphan(name):
+            continue
+        # El nombre tomado es de este proceso: si cae, otro lo vuelve a tomar
+        claimed = os.path.join(
+            directory, f"audit-{os.getpid()}-{process_token()}_r{name[len('audit-'):-len('.jsonl')].replace('-', '_')}.jsonl"
+        )
+        try:
+            os.rename(os.path.join(directory, name), claimed)
+        except FileNotFoundError:
+            # Otro proceso lo tomó
+            continue
+        entries = read_segment(claimed)
+        total = len(entries)
+        try:
+            dropped = insert_valid(entries)
+        except Exception:
+            # Se reintenta después: vuelve a quedar como segmento huérfano
+            logger.exception('No se pudo reinsertar %s', name)
+            os.rename(claimed, os.path.join(directory, name))
+            continue
+        os.remove(claimed)
+        replayed += total - dropped
+    if replayed:
+        logger.info('%d entradas de auditoría reinsertadas desde el spool', replayed)
+    return replayed
+
+
+class AuditBuffer:
+    """Buffer de auditoría de un proceso (ver get_buffer)"""
+
+    def __init__(self, directory, size, interval, fsync=False):
+        self.directory = directory
+        self.size = size
+        self.interval = interval
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self.token = process_token()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending = []
+        # Segmentos cerrados cuyas entradas siguen en `pending`
+        self.sealed = []
+        self.sequence = 0
+        self.spool = None
+        self.thread = None
+        self.stats = {
+            'flushes': 0, 'failures': 0, 'written': 0, 'dropped': 0,
+            'last_flush_ms': None, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0,
+            'last_flush_at': None, 'last_error': None,
+        }
+
+    def _open_segment(self):
+        self.sequence += 1
+        path = os.path.join(self.directory, f'audit-{self.pid}-{self.token}_{self.sequence}.jsonl')
+        self.spool = open(path, 'a', encoding='utf-8')
+
+    def add(self, entry):
+        """Agrega una entrada (AuditLog sin guardar) al spool y al buffer"""
+        try:
+            line = serialize(entry) + '\n'
+        except (TypeError, ValueError, AttributeError):
+            logger.exception('Entrada de auditoría no serializable, se descarta: %s #%s',
+                             entry.table_name, entry.record_id)
+            with self.lock:
+                self.stats['dropped'] += 1
+            return
+        with self.lock:
+            if self.spool is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._open_segment()
+            self.spool.write(line)
+            self.spool.flush()
+            if self.fsync:
+                os.fsync(self.spool.fileno())
+            self.pending.append(entry)
+            full = len(self.pending) >= self.size
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='audit-buffer', daemon=True)
+                self.thread.start()
+        if full:
+            self.wake.set()
+
+    def flush(self):
+        """Inserta las entradas en cola; retorna cuántas insertó"""
+        with self.lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, []
+            segments, self.sealed = self.sealed, []
+            if self.spool is not None:
+                segments.append(self.spool.name)
+                self.spool.close()
+                self._open_segment()
+
+        started = time.perf_counter()
+        total = len(batch)
+        try:
+            dropped = insert_valid(batch)
+        except Exception as error:
+            # `batch` conserva solo las entradas que no se insertaron
+            with self.lock:
+                self.pending[:0] = batch
+                self.sealed[:0] = segments
+                self.stats['failures'] += 1
+                self.stats['last_error'] = str(error)
+            raise
+        elapsed = (time.perf_counter() - started) * 1000
+
+        for path in segments:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.stats['flushes'] += 1
+            self.stats['written'] += total - dropped
+            self.stats['dropped'] += dropped
+            self.stats['last_flush_ms'] = round(elapsed, 2)
+            self.stats['max_flush_ms'] = round(max(self.stats['max_flush_ms'], elapsed), 2)
+            self.stats['total_flush_ms'] += elapsed
+            self.stats['last_flush_at'] = time.time()
+        return total - dropped
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats, pid=self.pid, queue_depth=len(self.pending), segments=len(self.sealed) + 1)
+        total = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total / stats['flushes'], 2) if stats['flushes'] else None
+        return stats
+
+    def _write_metrics(self):
+        path = os.path.join(self.directory, f'stats-{self.pid}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as output:
+            json.dump(self.metrics(), output)
+        os.replace(path + '.tmp', path)
+
+    def _run(self):
+        """
+        Hilo de flush: al arrancar reinserta los segmentos huérfanos. Si el
+        hilo termina por un error inesperado, el siguiente add lo reinicia.
+        """
+        backoff = self.interval
+        try:
+            try:
+                replay_spool(self.directory)
+            except Exception:
+                logger.exception('No se pudo reinsertar el spool de auditoría')
+            while True:
+                self.wake.wait(backoff)
+                self.wake.clear()
+                try:
+                    close_old_connections()
+                    self.flush()
+                    backoff = self.interval
+                except Exception:
+                    logger.exception('Flush de auditoría fallido, %d entradas en cola', len(self.pending))
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                finally:
+                    close_old_connections()
+                try:
+                    self._write_metrics()
+                except OSError:
+                    pass
+        except Exception:
+            logger.exception('Hilo de auditoría detenido, se reinicia con la siguiente entrada')
+        finally:
+            with self.lock:
+                self.thread = None
+
+    def close(self):
+        """Vacía el buffer al terminar el proceso"""
+        if os.getpid() != self.pid:
+            # atexit heredado por un proceso hijo
+            return
+        try:
+            self.flush()
+        except Exception:
+            # Quedan en el spool para el siguiente proceso
+            logger.exception('Auditoría pendiente queda en el spool')
+        with self.lock:
+            if self.spool is not None:
+                self.spool.close()
+                if not self.pending:
+                    os.remove(self.spool.name)
+                self.spool = None
+        try:
+            os.remove(os.path.join(self.directory, f'stats-{self.pid}.json'))
+        except OSError:
+            pass
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Buffer del proceso actual (se crea al primer uso)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditBuffer(
+                    settings.AUDIT_SPOOL_DIR,
+                    settings.AUDIT_BUFFER_SIZE,
+                    settings.AUDIT_FLUSH_INTERVAL,
+                    settings.AUDIT_SPOOL_FSYNC,
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def _reset_after_fork():
+    # El hijo no hereda el buffer ni el hilo del padre: sus entradas y su
+    # spool siguen siendo del padre
+    global _buffer, _buffer_lock, _token
+    _buffer = None
+    _buffer_lock = threading.Lock()
+    _token = secrets.token_hex(4)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,251 @@
+"""
+Captura automática de cambios para la auditoría.
+
+Los modelos auditados heredan de AuditedModel. Al leer una fila se guarda
+la tupla de valores que ya trae from_db (sin copiarla); al guardar se
+comparan solo los campos cargados con su valor actual y los distintos se
+registran como {campo: {old, new}} en un AuditLog 'update' que se arma y
+encola (audit.buffer) al confirmar la transacción, sin SELECT adicional.
+Crear o guardar sin cambios no registra nada.
+
+Las actualizaciones en bloque del manager también se registran:
+bulk_update compara cada objeto igual que save(), y update() registra una
+entrada con los valores nuevos (los anteriores no se leen; el número de
+filas va en la descripción). Los flujos que ya escriben su propia auditoría o su propio registro
+(revisión en bloque, barrido de vencidos, ledger de stock) corren dentro de
+untracked().
+
+El usuario, la IP y el user agent salen de la request en curso
+(AuditContextMiddleware); fuera de una request el cambio queda sin usuario.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+MASK = '***'
+
+_request = ContextVar('audit_request', default=None)
+_suppressed = ContextVar('audit_suppressed', default=False)
+
+
+@contextmanager
+def untracked():
+    """Las escrituras dentro del bloque no se registran automáticamente"""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def tracking():
+    return settings.AUDIT_CHANGES_ENABLED and not _suppressed.get()
+
+
+class AuditContextMiddleware:
+    """Deja la request en curso a la vista de la captura de cambios"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+
+def _json(value):
+    if value is None or isinstance(value, (str, int, float, list, dict)):
+        return value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return f'<{len(value)} bytes>'
+    # FieldFile, UUID, ...
+    return str(getattr(value, 'name', value))
+
+
+def _tracked_fields(model):
+    """{attname: (nombre, enmascarado)} de los campos auditados de `model`"""
+    fields = model.__dict__.get('_audit_fields')
+    if fields is None:
+        fields = {
+            field.attname: (field.name, field.name in model.audit_masked)
+            for field in model._meta.concrete_fields
+            if field.name not in model.audit_exclude and not field.primary_key
+        }
+        model._audit_fields = fields
+    return fields
+
+
+def _snapshot(instance):
+    """Tupla (attnames, valores) de los campos cargados de la instancia"""
+    loaded = instance.__dict__
+    names = tuple(name for name in _tracked_fields(type(instance)) if name in loaded)
+    return names, tuple(loaded[name] for name in names)
+
+
+def diff(instance, only=None):
+    """Campos cambiados desde la lectura: {campo: {old, new}}"""
+    names, values = instance.__dict__.get('_audit_loaded', ((), ()))
+    fields = _tracked_fields(type(instance))
+    current = instance.__dict__
+    changes = {}
+    for attname, old in zip(names, values):
+        new = current.get(attname, old)
+        if new == old:
+            continue
+        field = fields.get(attname)
+        if field is None or (only is not None and field[0] not in only and attname not in only):
+            continue
+        name, masked = field
+        changes[name] = {'old': MASK, 'new': MASK} if masked else {'old': _json(old), 'new': _json(new)}
+    # Campos diferidos asignados sin leerlos: solo se conoce el valor nuevo
+    # (`names` también trae columnas no auditadas, no basta comparar tamaños)
+    deferred = fields.keys() - set(names)
+    if deferred:
+        for attname, (name, masked) in fields.items():
+            if attname in deferred and attname in current and (only is None or name in only or attname in only):
+                changes[name] = {'new': MASK if masked else _json(current[attname])}
+    return changes
+
+
+def _entry(model, changes, request, record_id=None, account_id=None, description=None, at=None):
+    from audit.models import AuditLog
+
+    user = getattr(request, 'user', None)
+    if user is not None and not user.is_authenticated:
+        user = None
+    entry = AuditLog(
+        action='update',
+        user_id=user.pk if user is not None else None,
+        table_name=model.audit_table or model._meta.db_table,
+        record_id=record_id,
+        changes=changes,
+        ip_address=request.META.get('REMOTE_ADDR') if request else None,
+        user_agent=request.META.get('HTTP_USER_AGENT') if request else None,
+        description=description,
+    )
+    if at is not None:
+        entry.created_at = at
+    entry.account_id = account_id if account_id is not None else getattr(user, 'account_id', None)
+    return entry
+
+
+def _record(instance, changes):
+    from audit.models import AuditLog
+
+    model = type(instance)
+    record_id = instance.pk
+    account_id = instance.__dict__.get(model.audit_account_field)
+    request = _request.get()
+    at = timezone.now()
+    AuditLog.defer(lambda: _entry(model, changes, request, record_id, account_id, at=at))
+
+
+def _reload(instance, attnames):
+    """Marca como leídos los valores actuales de `attnames`"""
+    names, values = instance.__dict__.get('_audit_loaded', ((), ()))
+    loaded = dict(zip(names, values))
+    for attname in attnames:
+        if attname in instance.__dict__:
+            loaded[attname] = instance.__dict__[attname]
+    instance._audit_loaded = (tuple(loaded), tuple(loaded.values()))
+
+
+class AuditedQuerySet(models.QuerySet):
+    """QuerySet que registra update() y bulk_update() (ver AuditedModel)"""
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if not rows or not tracking():
+            return rows
+        fields = {name for name, _ in _tracked_fields(self.model).values()}
+        masked = self.model.audit_masked
+        changes = {
+            name: {'new': MASK if name in masked else _json(value)}
+            for name, value in kwargs.items() if name in fields
+        }
+        if changes:
+            from audit.models import AuditLog
+
+            AuditLog.record(_entry(
+                self.model, changes, _request.get(), description=f'{rows} registros actualizados en bloque'
+            ))
+        return rows
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        changed = [diff(obj, set(fields)) for obj in objs] if tracking() else [None] * len(objs)
+        # Los UPDATE internos de bulk_update se registran por objeto
+        with untracked():
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        attnames = [self.model._meta.get_field(name).attname for name in fields]
+        for obj, changes in zip(objs, changed):
+            if changes:
+                _record(obj, changes)
+            _reload(obj, attnames)
+        return rows
+
+    bulk_update.alters_data = True
+
+
+class AuditedModel(models.Model):
+    """
+    Modelo con captura de cambios. Atributos de clase:
+    - audit_table: table_name del AuditLog (por defecto la tabla del modelo)
+    - audit_exclude: campos que no se registran
+    - audit_masked: campos que se registran sin sus valores
+    - audit_account_field: columna con la cuenta del registro
+    """
+    audit_table = None
+    audit_exclude = ('updated_at',)
+    audit_masked = ()
+    audit_account_field = 'account_id'
+
+    objects = AuditedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Los valores leídos tal cual: la tupla de la fila, sin copia
+        instance._audit_loaded = (field_names, values)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Los campos recargados pasan a ser los leídos; los demás conservan
+        # su valor leído aunque se hayan modificado
+        if fields is None:
+            self._audit_loaded = _snapshot(self)
+        else:
+            _reload(self, [self._meta.get_field(name).attname for name in fields])
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if not adding and tracking():
+            changes = diff(self, None if update_fields is None else set(update_fields))
+            if changes:
+                _record(self, changes)
+                # Solo los campos cambiados difieren de lo leído
+                _reload(self, [self._meta.get_field(name).attname for name in changes])
+        elif update_fields is None:
+            self._audit_loaded = _snapshot(self)
+        else:
+            _reload(self, [self._meta.get_field(name).attname for name in update_fields])
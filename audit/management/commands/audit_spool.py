@@ -0,0 +1,58 @@
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from audit.buffer import is_orphan, pid_alive, replay_spool, segment_pid
+
+
+class Command(BaseCommand):
+    help = (
+        'Estado de la auditoría diferida de este servidor: entradas en cola y '
+        'latencia de flush por proceso, y segmentos de spool pendientes. Con '
+        '--replay inserta los segmentos de procesos que ya terminaron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replay', action='store_true', help='Insertar los segmentos huérfanos')
+
+    def handle(self, *args, **options):
+        directory = settings.AUDIT_SPOOL_DIR
+        if options['replay']:
+            replayed = replay_spool(directory)
+            self.stdout.write(self.style.SUCCESS(f'{replayed} entradas reinsertadas'))
+        if not os.path.isdir(directory):
+            self.stdout.write(f'Sin spool en {directory}')
+            return
+
+        segments = [name for name in os.listdir(directory) if segment_pid(name) is not None]
+
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith('stats-') and name.endswith('.json')):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path, encoding='utf-8') as source:
+                    stats = json.load(source)
+            except (OSError, ValueError):
+                continue
+            if not pid_alive(stats['pid']):
+                os.remove(path)
+                continue
+            last = stats['last_flush_at']
+            self.stdout.write(
+                f"PID {stats['pid']}: {stats['queue_depth']} en cola, {stats['written']} escritas en "
+                f"{stats['flushes']} flush ({stats['failures']} fallidos, {stats.get('dropped', 0)} descartadas), latencia última/media/máx "
+                f"{stats['last_flush_ms']}/{stats['avg_flush_ms']}/{stats['max_flush_ms']} ms, último "
+                f"{datetime.fromtimestamp(last):%H:%M:%S}" if last else
+                f"PID {stats['pid']}: {stats['queue_depth']} en cola, sin flush"
+            )
+            if stats['last_error']:
+                self.stdout.write(self.style.WARNING(f"  último error: {stats['last_error']}"))
+
+        orphaned = sum(1 for name in segments if is_orphan(name))
+        self.stdout.write(
+            f'{len(segments)} segmentos de spool, '
+            f'{orphaned} de procesos terminados'
+        )
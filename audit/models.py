@@ -1,4 +1,6 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 from accounts.models import Account, User
 
 
@@ -58,7 +60,9 @@ class AuditLog(models.Model):
     # Descripción adicional
     description = models.TextField(blank=True, null=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Con default y no auto_now_add: las entradas diferidas (audit.buffer)
+    # conservan la hora del evento al insertarse después
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         verbose_name = 'Registro de Auditoría'
@@ -94,11 +98,15 @@ class AuditLog(models.Model):
             ip_address=request.META.get('REMOTE_ADDR'),
             description=f'Préstamo #{loan.id} emitido'
         )
+        
+        Con AUDIT_BUFFER_ENABLED la entrada se inserta después, junto con
+        otras (ver audit.buffer), y se retorna sin guardar. Dentro de una
+        transacción se encola al confirmarla.
         """
-        return cls.objects.create(
+        entry = cls(
             action=action,
             user=user,
-            account=account or (user.account if user else None),
+            account=account,
             table_name=table_name,
             record_id=record_id,
             changes=changes,
@@ -106,3 +114,48 @@ class AuditLog(models.Model):
             user_agent=user_agent,
             description=description
         )
+        if account is None and user is not None:
+            entry.account_id = user.account_id
+        return cls.record(entry)
+    
+    @classmethod
+    def record(cls, entry):
+        """Guarda una entrada construida, diferida con AUDIT_BUFFER_ENABLED"""
+        if not settings.AUDIT_BUFFER_ENABLED:
+            entry.save()
+            return entry
+        
+        from audit.buffer import get_buffer
+        transaction.on_commit(lambda: get_buffer().add(entry))
+        return entry
+    
+    @classmethod
+    def record_many(cls, entries):
+        """Como record para varias entradas; sin buffer se guardan en un INSERT"""
+        entries = list(entries)
+        if not entries:
+            return entries
+        if not settings.AUDIT_BUFFER_ENABLED:
+            return cls.objects.bulk_create(entries)
+        
+        from audit.buffer import get_buffer
+        
+        def add_all():
+            audit_buffer = get_buffer()
+            for entry in entries:
+                audit_buffer.add(entry)
+        transaction.on_commit(add_all)
+        return entries
+    
+    @classmethod
+    def defer(cls, build):
+        """
+        Como record, pero la entrada se construye con build() recién al
+        confirmar la transacción (audit.changes: fuera del camino de save)
+        """
+        if not settings.AUDIT_BUFFER_ENABLED:
+            cls.record(build())
+            return
+        
+        from audit.buffer import get_buffer
+        transaction.on_commit(lambda: get_buffer().add(build()))
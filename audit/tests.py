@@ -1,3 +1,194 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from audit import buffer
+from audit.changes import diff
+from audit.models import AuditLog
+from loans.models import Loan
+from loans.overdue import sweep_overdue
+from materials.models import Material
+from pack_a_stock_api.testing import make_account, make_material, make_user
+
+
+class AuditBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.buffer = buffer.AuditBuffer(directory.name, size=100, interval=60)
+        # Sin hilo: las pruebas llaman a flush directamente
+        self.buffer.thread = mock.Mock()
+
+    def entry(self, **fields):
+        fields.setdefault('record_id', 1)
+        return AuditLog(account_id=self.account.pk, action='update', table_name='materials', **fields)
+
+    def segments(self):
+        return [name for name in os.listdir(self.buffer.directory) if name.endswith('.jsonl')]
+
+    def test_flush_inserts_and_removes_segment(self):
+        self.buffer.add(self.entry(record_id=1))
+        self.buffer.add(self.entry(record_id=2))
+
+        self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertEqual(AuditLog.objects.filter(account=self.account).count(), 2)
+        self.assertEqual(len(self.segments()), 1)  # solo el segmento nuevo, vacío
+        self.assertEqual(self.buffer.pending, [])
+
+    def test_unserializable_entry_is_dropped(self):
+        with self.assertLogs('audit.buffer', 'ERROR'):
+            self.buffer.add(self.entry(changes={'valor': object()}))
+        self.assertEqual(self.buffer.pending, [])
+        self.assertEqual(self.buffer.metrics()['dropped'], 1)
+
+    def test_rejected_entry_is_dropped_and_others_inserted(self):
+        self.buffer.add(self.entry(record_id=1))
+        # La base rechaza la entrada (no es un error de conexión)
+        self.buffer.pending.append(self.entry(record_id='no-numérico'))
+        self.buffer.add(self.entry(record_id=3))
+
+        with self.assertLogs('audit.buffer', 'ERROR') as logs:
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertIn('descartada: materials #no-numérico', logs.output[-1])
+        self.assertEqual(
+            sorted(AuditLog.objects.filter(account=self.account).values_list('record_id', flat=True)), [1, 3]
+        )
+        self.assertEqual(self.buffer.pending, [])
+        self.assertEqual(self.buffer.metrics()['dropped'], 1)
+
+    def test_unavailable_database_requeues_batch(self):
+        entries = [self.entry(record_id=1), self.entry(record_id=2)]
+        for entry in entries:
+            self.buffer.add(entry)
+
+        with mock.patch('audit.buffer.insert', side_effect=OperationalError('server closed the connection')):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+
+        self.assertEqual(self.buffer.pending, entries)
+        self.assertEqual(len(self.buffer.sealed), 1)
+        self.assertEqual(self.buffer.metrics()['failures'], 1)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.sealed, [])
+        self.assertEqual(len(self.segments()), 1)
+
+    def test_unexpected_error_requeues_batch(self):
+        self.buffer.add(self.entry())
+        with mock.patch('audit.buffer.insert_valid', side_effect=RuntimeError('inesperado')):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(len(self.buffer.pending), 1)
+
+    def test_thread_is_reset_when_loop_exits(self):
+        self.buffer.thread = None
+        with mock.patch('audit.buffer.replay_spool'), \
+                mock.patch.object(self.buffer, 'flush'), \
+                mock.patch.object(self.buffer, '_write_metrics', side_effect=RuntimeError('inesperado')), \
+                self.assertLogs('audit.buffer', 'ERROR'):
+            self.buffer.add(self.entry())
+            thread = self.buffer.thread
+            self.buffer.wake.set()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.buffer.thread)
+
+    def test_replay_drops_rejected_entries(self):
+        valid = buffer.serialize(self.entry(record_id=7))
+        rejected = valid.replace('"record_id":7', '"record_id":"no-numérico"')
+        # PID mayor que el máximo del sistema: proceso terminado
+        path = os.path.join(self.buffer.directory, 'audit-4194305-abcd1234_1.jsonl')
+        with open(path, 'w', encoding='utf-8') as segment:
+            segment.write(f'{valid}\n{rejected}\n')
+
+        with self.assertLogs('audit.buffer', 'ERROR'):
+            self.assertEqual(buffer.replay_spool(self.buffer.directory), 1)
+
+        self.assertEqual(self.segments(), [])
+        self.assertTrue(AuditLog.objects.filter(account=self.account, record_id=7).exists())
+
+
+class RecordManyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+
+    def entries(self):
+        return [
+            AuditLog(account_id=self.account.pk, action='approve', table_name='loan_requests', record_id=pk)
+            for pk in (1, 2)
+        ]
+
+    @override_settings(AUDIT_BUFFER_ENABLED=False)
+    def test_without_buffer_inserts_at_once(self):
+        with self.assertNumQueries(1):
+            AuditLog.record_many(self.entries())
+        self.assertEqual(AuditLog.objects.filter(account=self.account).count(), 2)
+
+    @override_settings(AUDIT_BUFFER_ENABLED=True)
+    def test_with_buffer_adds_on_commit(self):
+        audit_buffer = mock.Mock()
+        with mock.patch('audit.buffer.get_buffer', return_value=audit_buffer):
+            with self.captureOnCommitCallbacks() as callbacks:
+                AuditLog.record_many(self.entries())
+            self.assertEqual(audit_buffer.add.call_count, 0)
+            callbacks[0]()
+        self.assertEqual([call.args[0].record_id for call in audit_buffer.add.call_args_list], [1, 2])
+        self.assertFalse(AuditLog.objects.filter(account=self.account).exists())
+
+
+@override_settings(AUDIT_CHANGES_ENABLED=True, AUDIT_BUFFER_ENABLED=False)
+class ChangeCaptureTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+
+    def test_diff_of_loaded_field(self):
+        material = Material.objects.get(pk=make_material(self.account, name='Antes').pk)
+        material.name = 'Después'
+        self.assertEqual(diff(material), {'name': {'old': 'Antes', 'new': 'Después'}})
+
+    def test_diff_includes_assigned_deferred_field(self):
+        material = Material.objects.defer('description').get(pk=make_material(self.account).pk)
+        material.description = 'Nueva'
+        self.assertEqual(diff(material), {'description': {'new': 'Nueva'}})
+
+    def test_diff_ignores_unassigned_deferred_field(self):
+        material = Material.objects.defer('description').get(pk=make_material(self.account).pk)
+        self.assertEqual(diff(material), {})
+
+    def test_queryset_update_records_only_fields(self):
+        material = make_material(self.account)
+        Material.objects.filter(pk=material.pk).update(name='En bloque')
+
+        entry = AuditLog.objects.get(table_name='materials', description='1 registros actualizados en bloque')
+        self.assertEqual(entry.changes, {'name': {'new': 'En bloque'}})
+
+    def test_overdue_sweep_records_only_status(self):
+        user = make_user(self.account)
+        loan = Loan.objects.create(
+            account=self.account, borrower=user, issued_by=user,
+            material=make_material(self.account, quantity=1),
+            expected_return_date=timezone.now().date() + timedelta(days=1),
+        )
+        today = timezone.now().date() + timedelta(days=3)
+
+        self.assertEqual(sweep_overdue(today), {self.account.pk: 1})
+
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'overdue')
+        entry = AuditLog.objects.get(account=self.account, description__contains='préstamos vencidos')
+        self.assertEqual(entry.changes, {'status': {'old': 'active', 'new': 'overdue'}})
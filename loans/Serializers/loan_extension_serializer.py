@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from loans.models import LoanExtension
 from accounts.Serializers.user_serializer import UserSerializer
+from pack_a_stock_api.sparse_fields import SparseFieldsSerializerMixin
 
 
-class LoanExtensionSerializer(serializers.ModelSerializer):
+class LoanExtensionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     requested_by_detail = UserSerializer(source='requested_by', read_only=True)
     reviewed_by_detail = UserSerializer(source='reviewed_by', read_only=True)
     
@@ -19,6 +20,7 @@ class LoanExtensionSerializer(serializers.ModelSerializer):
             'id', 'requested_at', 'reviewed_by', 'reviewed_at',
             'created_at', 'updated_at'
         ]
+        expandable_fields = {'requested_by': 'requested_by_detail', 'reviewed_by': 'reviewed_by_detail'}
 
 
 class LoanExtensionCreateSerializer(serializers.ModelSerializer):
@@ -1,7 +1,11 @@
+from django.db import transaction
 from rest_framework import serializers
 from loans.models import LoanRequest, LoanRequestItem
+from loans.reservations import MAX_MATERIALS
 from accounts.Serializers.user_serializer import UserSerializer
+from materials.models import Material
 from materials.Serializers.material_serializer import MaterialMinimalSerializer
+from pack_a_stock_api.sparse_fields import SparseFieldsSerializerMixin
 
 
 class LoanRequestItemSerializer(serializers.ModelSerializer):
@@ -13,7 +17,7 @@ class LoanRequestItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class LoanRequestSerializer(serializers.ModelSerializer):
+class LoanRequestSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     requester_detail = UserSerializer(source='requester', read_only=True)
     reviewed_by_detail = UserSerializer(source='reviewed_by', read_only=True)
     items = LoanRequestItemSerializer(many=True, read_only=True)
@@ -30,12 +34,37 @@ class LoanRequestSerializer(serializers.ModelSerializer):
             'id', 'requested_date', 'reviewed_by', 'reviewed_at', 
             'created_at', 'updated_at'
         ]
+        expandable_fields = {'requester': 'requester_detail', 'reviewed_by': 'reviewed_by_detail'}
+
+
+class LoanRequestItemCompactSerializer(LoanRequestItemSerializer):
+    material_detail = None
+    
+    class Meta(LoanRequestItemSerializer.Meta):
+        fields = ['id', 'material', 'quantity_requested', 'created_at']
+
+
+class LoanRequestCompactSerializer(LoanRequestSerializer):
+    """Fila compacta: relaciones como ID (ver pack_a_stock_api.compact)"""
+    requester_detail = None
+    reviewed_by_detail = None
+    items = LoanRequestItemCompactSerializer(many=True, read_only=True)
+    
+    class Meta(LoanRequestSerializer.Meta):
+        fields = [name for name in LoanRequestSerializer.Meta.fields if not name.endswith('_detail')]
+        expandable_fields = {}
+
+
+class LoanRequestItemInputSerializer(serializers.Serializer):
+    material_id = serializers.IntegerField()
+    quantity_requested = serializers.IntegerField(min_value=1, default=1)
 
 
 class LoanRequestCreateSerializer(serializers.ModelSerializer):
     items = serializers.ListField(
-        child=serializers.DictField(),
-        write_only=True
+        child=LoanRequestItemInputSerializer(),
+        write_only=True,
+        max_length=MAX_MATERIALS
     )
     
     class Meta:
@@ -44,16 +73,68 @@ class LoanRequestCreateSerializer(serializers.ModelSerializer):
             'desired_pickup_date', 'desired_return_date', 'purpose', 'items'
         ]
     
+    def validate_items(self, items):
+        """
+        Valida todos los items con una consulta: materiales de la cuenta del
+        solicitante, sin repetir, y stock suficiente para los consumibles
+        (la misma regla que LoanRequestItem.clean).
+        """
+        account_id = self.context['request'].user.account_id
+        materials = {
+            row['id']: row
+            for row in Material.objects.filter(
+                account_id=account_id, pk__in=[item['material_id'] for item in items]
+            ).values('id', 'name', 'available_quantity', 'category__is_consumable')
+        }
+        
+        errors = {}
+        seen = set()
+        for index, item in enumerate(items):
+            material = materials.get(item['material_id'])
+            if material is None:
+                errors[index] = ['Material no encontrado']
+            elif item['material_id'] in seen:
+                errors[index] = [f"{material['name']} está repetido en la solicitud"]
+            elif material['category__is_consumable'] and item['quantity_requested'] > material['available_quantity']:
+                errors[index] = [
+                    f"Stock insuficiente para {material['name']}. "
+                    f"Disponible: {material['available_quantity']}, Solicitado: {item['quantity_requested']}"
+                ]
+            seen.add(item['material_id'])
+        if errors:
+            raise serializers.ValidationError(errors)
+        return items
+    
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        loan_request = LoanRequest.objects.create(**validated_data)
-        
-        # Crear items
-        for item_data in items_data:
-            LoanRequestItem.objects.create(
-                loan_request=loan_request,
-                material_id=item_data['material_id'],
-                quantity_requested=item_data.get('quantity_requested', 1)
-            )
+        with transaction.atomic():
+            loan_request = LoanRequest.objects.create(**validated_data)
+            
+            # Items ya validados en validate_items; bulk_create no emite
+            # señales, la capacidad se invalida al crear la solicitud
+            LoanRequestItem.objects.bulk_create([
+                LoanRequestItem(
+                    loan_request=loan_request,
+                    material_id=item_data['material_id'],
+                    quantity_requested=item_data['quantity_requested']
+                )
+                for item_data in items_data
+            ])
         
         return loan_request
+
+
+class LoanAvailabilitySerializer(serializers.Serializer):
+    materials = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_MATERIALS
+    )
+    start = serializers.DateField()
+    end = serializers.DateField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    
+    def validate(self, data):
+        if data['end'] < data['start']:
+            raise serializers.ValidationError({'end': ['Debe ser posterior o igual a start']})
+        return data
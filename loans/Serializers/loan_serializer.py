@@ -1,17 +1,34 @@
+from django.urls import reverse
 from rest_framework import serializers
+from loans.issuance import IssuanceError, issue_loan
 from loans.models import Loan
+from loans.signatures import check_signature, decode_signature
 from accounts.Serializers.user_serializer import UserSerializer
 from materials.Serializers.material_serializer import MaterialMinimalSerializer
+from pack_a_stock_api.sparse_fields import SparseFieldsSerializerMixin
 
 
-class LoanSerializer(serializers.ModelSerializer):
+def validate_signature(value):
+    try:
+        check_signature(decode_signature(value))
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+    return value
+
+
+class LoanSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     borrower_detail = UserSerializer(source='borrower', read_only=True)
     issued_by_detail = UserSerializer(source='issued_by', read_only=True)
     returned_to_detail = UserSerializer(source='returned_to', read_only=True)
     material_detail = MaterialMinimalSerializer(source='material', read_only=True)
+    # Calculados en SQL en los listados (ver loans.timing)
     is_overdue = serializers.ReadOnlyField()
+    days_overdue = serializers.ReadOnlyField()
     days_until_return = serializers.ReadOnlyField()
     is_fully_returned = serializers.ReadOnlyField()
+    # Referencias: la imagen se pide aparte (ver loans.signatures)
+    pickup_signature = serializers.SerializerMethodField()
+    return_signature = serializers.SerializerMethodField()
     
     class Meta:
         model = Loan
@@ -23,16 +40,60 @@ class LoanSerializer(serializers.ModelSerializer):
             'actual_return_date', 'facial_auth_verified', 'facial_auth_at',
             'pickup_signature', 'return_signature', 'condition_on_pickup',
             'condition_on_return', 'damage_notes', 'status', 'is_overdue',
-            'days_until_return', 'is_fully_returned', 'created_at', 'updated_at'
+            'days_overdue', 'days_until_return', 'is_fully_returned',
+            'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'issued_at', 'actual_return_date', 'facial_auth_at',
-            'is_overdue', 'days_until_return', 'is_fully_returned',
+            'is_overdue', 'days_overdue', 'days_until_return', 'is_fully_returned',
             'created_at', 'updated_at', 'is_consumable_loan'
         ]
+        expandable_fields = {
+            'borrower': 'borrower_detail',
+            'issued_by': 'issued_by_detail',
+            'returned_to': 'returned_to_detail',
+            'material': 'material_detail',
+        }
+        field_dependencies = {
+            'is_overdue': ['account_id', 'is_consumable_loan', 'status', 'expected_return_date'],
+            'days_overdue': ['account_id', 'is_consumable_loan', 'status', 'expected_return_date'],
+            'days_until_return': ['account_id', 'is_consumable_loan', 'expected_return_date'],
+            'is_fully_returned': ['quantity_returned', 'quantity_loaned'],
+            'pickup_signature': ['pickup_signature_id'],
+            'return_signature': ['return_signature_id'],
+        }
+    
+    def _signature_url(self, obj, kind):
+        if not getattr(obj, f'{kind}_signature_id'):
+            return None
+        url = reverse('loan-signature', kwargs={'pk': obj.pk, 'kind': kind})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_pickup_signature(self, obj):
+        return self._signature_url(obj, 'pickup')
+    
+    def get_return_signature(self, obj):
+        return self._signature_url(obj, 'return')
+
+
+class LoanCompactSerializer(LoanSerializer):
+    """Fila compacta: relaciones como ID (ver pack_a_stock_api.compact)"""
+    borrower_detail = None
+    issued_by_detail = None
+    returned_to_detail = None
+    material_detail = None
+    
+    class Meta(LoanSerializer.Meta):
+        fields = [name for name in LoanSerializer.Meta.fields if not name.endswith('_detail')]
+        expandable_fields = {}
 
 
 class LoanCreateSerializer(serializers.ModelSerializer):
+    pickup_signature = serializers.CharField(
+        write_only=True, required=False, allow_blank=True, validators=[validate_signature]
+    )
+    
     class Meta:
         model = Loan
         fields = [
@@ -40,10 +101,35 @@ class LoanCreateSerializer(serializers.ModelSerializer):
             'expected_return_date', 'pickup_signature', 'condition_on_pickup'
         ]
 
+    def create(self, validated_data):
+        # El material se valida bloqueado; sin unidades el préstamo no se registra
+        try:
+            return issue_loan(
+                validated_data.pop('account').id,
+                validated_data.pop('issued_by'),
+                validated_data.pop('material').pk,
+                validated_data.pop('quantity_loaned'),
+                validated_data.pop('pickup_signature', None),
+                **validated_data
+            )
+        except IssuanceError as e:
+            raise serializers.ValidationError({'material': [str(e)]})
+        except ValueError as e:
+            raise serializers.ValidationError({'quantity_loaned': [str(e)]})
+
+
+class LoanFromRequestSerializer(serializers.Serializer):
+    loan_request = serializers.IntegerField()
+    pickup_signature = serializers.CharField(required=False, allow_blank=True, validators=[validate_signature])
+    condition_on_pickup = serializers.ChoiceField(
+        choices=['excellent', 'good', 'fair', 'poor', 'damaged'],
+        default='good'
+    )
+
 
 class LoanReturnSerializer(serializers.Serializer):
     condition_on_return = serializers.ChoiceField(
         choices=['excellent', 'good', 'fair', 'poor', 'damaged']
     )
     damage_notes = serializers.CharField(required=False, allow_blank=True)
-    return_signature = serializers.CharField(required=False, allow_blank=True)
+    return_signature = serializers.CharField(required=False, allow_blank=True, validators=[validate_signature])
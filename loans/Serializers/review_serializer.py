@@ -0,0 +1,12 @@
+from rest_framework import serializers
+from loans.review import DECISIONS, MAX_REVIEW_IDS
+
+
+class BulkReviewSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_REVIEW_IDS
+    )
+    decision = serializers.ChoiceField(choices=list(DECISIONS))
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
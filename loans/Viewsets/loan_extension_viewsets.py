@@ -2,23 +2,37 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from loans.models import LoanExtension
+from loans.models import ArchivedLoanExtension, LoanExtension
+from loans.review import review_extensions
+from pack_a_stock_api.query_plans import FetchPlan, FetchPlanMixin
+from pack_a_stock_api.sparse_fields import SparseFieldsMixin
+from pack_a_stock_api.tiers import TieredReadMixin
 from loans.Serializers.loan_extension_serializer import (
     LoanExtensionSerializer,
     LoanExtensionCreateSerializer
 )
+from loans.Serializers.review_serializer import BulkReviewSerializer
 
 
-class LoanExtensionViewSet(viewsets.ModelViewSet):
+class LoanExtensionViewSet(TieredReadMixin, SparseFieldsMixin, FetchPlanMixin, viewsets.ModelViewSet):
     queryset = LoanExtension.objects.all()
     serializer_class = LoanExtensionSerializer
     permission_classes = [IsAuthenticated]
     filterset_fields = ['status', 'loan']
     ordering_fields = ['requested_at', 'status']
+    fetch_plans = {
+        'default': FetchPlan(select=['requested_by__account', 'reviewed_by__account']),
+        'bulk_review': FetchPlan(),
+    }
+    query_budgets = {'list': 2, 'retrieve': 1, 'pending': 1}
+    # Extensiones de préstamos archivados con ?history=true (ver loans.archive)
+    archive_model = ArchivedLoanExtension
     
     def get_queryset(self):
-        user = self.request.user
-        return LoanExtension.objects.filter(loan__account=user.account)
+        return self.plan_queryset(self.scope_queryset(LoanExtension.objects.all()))
+    
+    def scope_queryset(self, queryset):
+        return queryset.filter(account_id=self.request.user.account_id)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -58,6 +72,22 @@ class LoanExtensionViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def bulk_review(self, request):
+        """
+        Aprobar o rechazar varias extensiones pendientes:
+        {"ids": [...], "decision": "approve"|"reject", "notes": ""}; máximo 500.
+        """
+        serializer = BulkReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        results = review_extensions(
+            self.get_queryset(), data['ids'], data['decision'], request.user, data['notes']
+        )
+        reviewed = sum('error' not in result for result in results)
+        return Response({'reviewed': reviewed, 'results': results})
+    
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Obtener extensiones pendientes"""
@@ -2,24 +2,65 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from loans.models import LoanRequest
+from django.db.models import Prefetch
+from loans.models import ArchivedLoanRequest, ArchivedLoanRequestItem, LoanRequest, LoanRequestItem
+from loans.reservations import free_capacity
+from loans.review import review_requests
+from accounts.models import Account, User
+from accounts.Serializers.account_serializer import AccountSerializer
+from accounts.Serializers.user_serializer import UserCompactSerializer
+from materials.models import Material
+from materials.Serializers.material_serializer import MaterialMinimalSerializer
+from pack_a_stock_api.compact import CompactListMixin, Include
+from pack_a_stock_api.query_plans import FetchPlan, FetchPlanMixin
+from pack_a_stock_api.sparse_fields import SparseFieldsMixin
+from pack_a_stock_api.tiers import TieredReadMixin
 from loans.Serializers.loan_request_serializer import (
+    LoanAvailabilitySerializer,
     LoanRequestSerializer,
+    LoanRequestCompactSerializer,
     LoanRequestCreateSerializer
 )
+from loans.Serializers.review_serializer import BulkReviewSerializer
 
 
-class LoanRequestViewSet(viewsets.ModelViewSet):
+class LoanRequestViewSet(TieredReadMixin, CompactListMixin, SparseFieldsMixin, FetchPlanMixin, viewsets.ModelViewSet):
     queryset = LoanRequest.objects.all()
     serializer_class = LoanRequestSerializer
     permission_classes = [IsAuthenticated]
     filterset_fields = ['status', 'requester', 'desired_pickup_date']
     search_fields = ['purpose', 'requester__full_name']
     ordering_fields = ['requested_date', 'desired_pickup_date', 'status']
+    fetch_plans = {
+        'default': FetchPlan(
+            select=['requester__account', 'reviewed_by__account'],
+            prefetch=[Prefetch(
+                'items',
+                queryset=LoanRequestItem.objects.select_related('material__category', 'material__location')
+            )]
+        ),
+        'compact': FetchPlan(prefetch=['items']),
+        'bulk_review': FetchPlan(),
+    }
+    compact_serializer_class = LoanRequestCompactSerializer
+    compact_includes = [
+        Include('users', User.objects.all(), UserCompactSerializer, ['requester', 'reviewed_by']),
+        Include('accounts', Account.objects.all(), AccountSerializer, ['account', 'users.account']),
+        Include(
+            'materials', Material.objects.select_related('category', 'location'),
+            MaterialMinimalSerializer, ['items.material']
+        ),
+    ]
+    query_budgets = {'list': 3, 'retrieve': 2, 'pending': 2, 'my_requests': 2}
+    # Solicitudes archivadas con ?history=true (ver loans.archive)
+    archive_model = ArchivedLoanRequest
     
     def get_queryset(self):
+        return self.plan_queryset(self.scope_queryset(LoanRequest.objects.all()))
+    
+    def scope_queryset(self, queryset):
         user = self.request.user
-        queryset = LoanRequest.objects.filter(account=user.account)
+        queryset = queryset.filter(account_id=user.account_id)
         
         # Si es empleado, solo ver sus propias solicitudes
         if user.user_type == 'employee':
@@ -27,6 +68,19 @@ class LoanRequestViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def attach_archived(self, instances):
+        """Items de las solicitudes archivadas, desde su tabla de archivo"""
+        if not instances:
+            return
+        archived_items = ArchivedLoanRequestItem.objects.filter(
+            loan_request__in=[obj.pk for obj in instances]
+        ).select_related('material__category', 'material__location')
+        items = {}
+        for item in archived_items:
+            items.setdefault(item.loan_request_id, []).append(item)
+        for obj in instances:
+            obj.__dict__.setdefault('_prefetched_objects_cache', {})['items'] = items.get(obj.pk, [])
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return LoanRequestCreateSerializer
@@ -66,6 +120,22 @@ class LoanRequestViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def bulk_review(self, request):
+        """
+        Aprobar o rechazar varias solicitudes pendientes:
+        {"ids": [...], "decision": "approve"|"reject", "notes": ""}; máximo 500.
+        """
+        serializer = BulkReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        results = review_requests(
+            self.get_queryset(), data['ids'], data['decision'], request.user, data['notes']
+        )
+        reviewed = sum('error' not in result for result in results)
+        return Response({'reviewed': reviewed, 'results': results})
+    
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Obtener solicitudes pendientes"""
@@ -79,3 +149,31 @@ class LoanRequestViewSet(viewsets.ModelViewSet):
         my_requests = self.get_queryset().filter(requester=request.user)
         serializer = self.get_serializer(my_requests, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get', 'post'])
+    def availability(self, request):
+        """
+        Capacidad libre de materiales en un rango de fechas, descontando
+        préstamos activos y solicitudes aprobadas. GET ?materials=1,2&start=&end=
+        o POST {"materials": [...], "start", "end", "quantity"}; máximo 200.
+        """
+        if request.method == 'GET':
+            data = request.query_params.dict()
+            data['materials'] = [
+                material for material in request.query_params.get('materials', '').split(',') if material
+            ]
+        else:
+            data = request.data
+        serializer = LoanAvailabilitySerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        capacity = free_capacity(request.user.account_id, data['materials'], data['start'], data['end'])
+        results = []
+        for material_id in dict.fromkeys(data['materials']):
+            entry = capacity.get(material_id)
+            if entry is None:
+                results.append({'material': material_id, 'error': 'Material no encontrado'})
+            else:
+                results.append({**entry, 'available': entry['free'] >= data['quantity']})
+        return Response({'start': data['start'], 'end': data['end'], 'results': results})
@@ -2,33 +2,87 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.filters import SearchFilter
+from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from loans.models import Loan
+from loans.issuance import IssuanceError, issue_request
+from loans.models import ArchivedLoan, Loan, LoanRequest, LoanSignature
+from loans.signatures import prepare_signature, save_signature
+from loans.timing import LoanOrderingFilter, LoanTimingFilter, with_timing
+from accounts.local_time import local_date
+from accounts.models import Account, User
+from accounts.Serializers.account_serializer import AccountSerializer
+from accounts.Serializers.user_serializer import UserCompactSerializer
+from materials.models import Material
+from materials.Serializers.material_serializer import MaterialMinimalSerializer
+from pack_a_stock_api.compact import CompactListMixin, Include
+from pack_a_stock_api.query_plans import FetchPlan, FetchPlanMixin
+from pack_a_stock_api.sparse_fields import SparseFieldsMixin
+from pack_a_stock_api.tiers import TieredReadMixin
 from loans.Serializers.loan_serializer import (
     LoanSerializer,
+    LoanCompactSerializer,
     LoanCreateSerializer,
+    LoanFromRequestSerializer,
     LoanReturnSerializer
 )
 
 
-class LoanViewSet(viewsets.ModelViewSet):
+class LoanViewSet(TieredReadMixin, CompactListMixin, SparseFieldsMixin, FetchPlanMixin, viewsets.ModelViewSet):
     queryset = Loan.objects.all()
     serializer_class = LoanSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, LoanTimingFilter, SearchFilter, LoanOrderingFilter]
     filterset_fields = ['status', 'borrower', 'material', 'is_consumable_loan']
     search_fields = ['borrower__full_name', 'material__name']
-    ordering_fields = ['issued_at', 'expected_return_date', 'status']
+    ordering_fields = ['issued_at', 'expected_return_date', 'status', 'days_overdue', 'days_until_return']
+    fetch_plans = {
+        'default': FetchPlan(select=[
+            'borrower__account', 'issued_by__account', 'returned_to__account',
+            'material__category', 'material__location'
+        ]),
+        'signature': FetchPlan(only=['id', 'account', 'borrower', 'pickup_signature', 'return_signature']),
+    }
+    compact_serializer_class = LoanCompactSerializer
+    compact_includes = [
+        Include('users', User.objects.all(), UserCompactSerializer, ['borrower', 'issued_by', 'returned_to']),
+        Include('accounts', Account.objects.all(), AccountSerializer, ['account', 'users.account']),
+        Include(
+            'materials', Material.objects.select_related('category', 'location'),
+            MaterialMinimalSerializer, ['material']
+        ),
+    ]
+    query_budgets = {'list': 2, 'retrieve': 1, 'active': 1, 'overdue': 1, 'my_loans': 1}
+    # Acciones que leen is_overdue/days_overdue/days_until_return anotados
+    timed_actions = ('list', 'retrieve', 'active', 'overdue', 'my_loans')
+    # Préstamos archivados con ?history=true (ver loans.archive)
+    archive_model = ArchivedLoan
+    archive_actions = ('signature',)
     
     def get_queryset(self):
+        return self.plan_queryset(self.scope_queryset(Loan.objects.all()))
+    
+    def scope_queryset(self, queryset):
         user = self.request.user
-        queryset = Loan.objects.filter(account=user.account)
+        queryset = queryset.filter(account_id=user.account_id)
         
         # Si es empleado, solo ver sus propios préstamos
         if user.user_type == 'employee':
             queryset = queryset.filter(borrower=user)
         
+        if self.action in self.timed_actions:
+            queryset = with_timing(queryset, self.get_local_date())
         return queryset
     
+    def get_local_date(self):
+        """Fecha local de la cuenta del usuario, una vez por request"""
+        if not hasattr(self, '_local_date'):
+            self._local_date = local_date(self.request.user.account_id)
+        return self._local_date
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return LoanCreateSerializer
@@ -38,6 +92,30 @@ class LoanViewSet(viewsets.ModelViewSet):
         account = self.request.user.account
         serializer.save(account=account, issued_by=self.request.user)
     
+    @action(detail=False, methods=['post'], url_path='from-request')
+    def from_request(self, request):
+        """Entregar en una operación todos los materiales de una solicitud aprobada"""
+        serializer = LoanFromRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        loan_request = get_object_or_404(
+            LoanRequest, pk=data['loan_request'], account_id=request.user.account_id
+        )
+        
+        try:
+            loans = issue_request(
+                loan_request,
+                inventarista=request.user,
+                pickup_signature=data.get('pickup_signature') or None,
+                condition_on_pickup=data['condition_on_pickup']
+            )
+        except IssuanceError as e:
+            return Response({'error': str(e), 'items': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        loans = self.get_queryset().filter(pk__in=[loan.pk for loan in loans])
+        serializer = LoanSerializer(loans, many=True, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['post'])
     def return_loan(self, request, pk=None):
         """Registrar devolución de préstamo"""
@@ -45,13 +123,16 @@ class LoanViewSet(viewsets.ModelViewSet):
         serializer = LoanReturnSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
+        # La firma se comprime fuera de la transacción
+        signature = prepare_signature(serializer.validated_data.get('return_signature'))
         try:
-            loan.return_loan(
-                inventarista=request.user,
-                condition=serializer.validated_data['condition_on_return'],
-                damage_notes=serializer.validated_data.get('damage_notes', ''),
-                signature=serializer.validated_data.get('return_signature', '')
-            )
+            with transaction.atomic():
+                loan.return_loan(
+                    inventarista=request.user,
+                    condition=serializer.validated_data['condition_on_return'],
+                    damage_notes=serializer.validated_data.get('damage_notes', ''),
+                    signature=save_signature(request.user.account_id, signature)
+                )
             return Response({
                 'status': 'success',
                 'message': 'Préstamo devuelto exitosamente'
@@ -59,6 +140,24 @@ class LoanViewSet(viewsets.ModelViewSet):
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'], url_path=r'signature/(?P<kind>pickup|return)', url_name='signature')
+    def signature(self, request, pk=None, kind=None):
+        """Imagen de la firma de entrega o devolución"""
+        loan = self.get_object()
+        signature_id = getattr(loan, f'{kind}_signature_id')
+        if not signature_id:
+            return Response({'error': 'El préstamo no tiene esta firma'}, status=status.HTTP_404_NOT_FOUND)
+        
+        signature = LoanSignature.objects.get(pk=signature_id)
+        response = HttpResponse(bytes(signature.data), content_type=signature.content_type)
+        # Una firma no cambia: el cliente puede guardarla
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+    
+    def perform_content_negotiation(self, request, force=False):
+        # La firma es binaria: se responde sin importar el Accept
+        return super().perform_content_negotiation(request, force=force or self.action == 'signature')
+    
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Obtener préstamos activos"""
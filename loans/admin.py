@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import LoanRequest, LoanRequestItem, Loan, LoanExtension
+from .review import review_requests
 
 
 class LoanRequestItemInline(admin.TabularInline):
@@ -47,18 +48,18 @@ class LoanRequestAdmin(admin.ModelAdmin):
     actions = ['approve_requests', 'reject_requests']
     
     def approve_requests(self, request, queryset):
-        count = 0
-        for loan_request in queryset.filter(status='pending'):
-            loan_request.approve(request.user, 'Aprobado desde admin')
-            count += 1
+        results = review_requests(
+            queryset, queryset.values_list('pk', flat=True), 'approve', request.user, 'Aprobado desde admin'
+        )
+        count = sum('error' not in result for result in results)
         self.message_user(request, f'{count} solicitudes aprobadas')
     approve_requests.short_description = 'Aprobar solicitudes seleccionadas'
     
     def reject_requests(self, request, queryset):
-        count = 0
-        for loan_request in queryset.filter(status='pending'):
-            loan_request.reject(request.user, 'Rechazado desde admin')
-            count += 1
+        results = review_requests(
+            queryset, queryset.values_list('pk', flat=True), 'reject', request.user, 'Rechazado desde admin'
+        )
+        count = sum('error' not in result for result in results)
         self.message_user(request, f'{count} solicitudes rechazadas')
     reject_requests.short_description = 'Rechazar solicitudes seleccionadas'
 
@@ -91,6 +92,8 @@ class LoanAdmin(admin.ModelAdmin):
         'issued_at', 'actual_return_date', 'facial_auth_at',
         'created_at', 'updated_at', 'is_consumable_loan'
     ]
+    # Las firmas se cargan por ID, sin listar la tabla de firmas
+    raw_id_fields = ['pickup_signature', 'return_signature']
     
     fieldsets = (
         ('Información Básica', {
@@ -0,0 +1,109 @@
+"""
+Archivo de préstamos y solicitudes cerrados.
+
+Los préstamos devueltos o extraviados y las solicitudes rechazadas,
+canceladas o completadas que llevan más de LOAN_ARCHIVE_AFTER_DAYS días sin
+cambios pasan por lotes a las tablas de archivo, con sus extensiones e
+items, conservando sus ID. Así las tablas e índices que usan las consultas
+de trabajo activo no crecen con el historial. Cada lote es una transacción:
+copia con bulk_create y borra de la tabla activa. Una solicitud se archiva
+cuando ya no quedan préstamos activos que la referencien.
+
+Se ejecuta con el comando archive_loans y como tarea periódica
+(loans.tasks.archive_closed). La API lee ambos niveles con ?history=true
+(ver pack_a_stock_api.tiers).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from loans.models import (
+    ArchivedLoan, ArchivedLoanExtension, ArchivedLoanRequest, ArchivedLoanRequestItem,
+    Loan, LoanExtension, LoanRequest, LoanRequestItem
+)
+
+CLOSED_LOAN_STATUSES = ('returned', 'lost')
+CLOSED_REQUEST_STATUSES = ('rejected', 'cancelled', 'completed')
+
+
+def archive_cutoff(days=None):
+    """Fecha antes de la cual un registro cerrado se archiva"""
+    if days is None:
+        days = settings.LOAN_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def closed_loans(cutoff):
+    """Préstamos cerrados sin cambios desde `cutoff`"""
+    return Loan.objects.filter(status__in=CLOSED_LOAN_STATUSES, updated_at__lt=cutoff)
+
+
+def closed_requests(cutoff):
+    """Solicitudes cerradas sin cambios desde `cutoff` y sin préstamos activos"""
+    return LoanRequest.objects.filter(
+        status__in=CLOSED_REQUEST_STATUSES, updated_at__lt=cutoff
+    ).exclude(Exists(Loan.objects.filter(loan_request=OuterRef('pk'))))
+
+
+def _copy(model, instance):
+    """Instancia de archivo `model` con las columnas de `instance`"""
+    return model(**{field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields})
+
+
+def _archive_loan_batch(cutoff, batch_size):
+    """Archiva un lote de préstamos con sus extensiones; retorna cuántos movió"""
+    with transaction.atomic():
+        # Otro proceso puede estar archivando: se saltan las filas bloqueadas
+        loans = list(
+            closed_loans(cutoff).select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+        )
+        if not loans:
+            return 0
+        extensions = LoanExtension.objects.filter(loan__in=loans)
+        ArchivedLoan.objects.bulk_create([_copy(ArchivedLoan, loan) for loan in loans])
+        ArchivedLoanExtension.objects.bulk_create([
+            _copy(ArchivedLoanExtension, extension) for extension in extensions
+        ])
+        # Las extensiones se borran en cascada
+        Loan.objects.filter(pk__in=[loan.pk for loan in loans]).delete()
+    return len(loans)
+
+
+def _archive_request_batch(cutoff, batch_size):
+    """Archiva un lote de solicitudes con sus items; retorna cuántas movió"""
+    with transaction.atomic():
+        requests = list(
+            closed_requests(cutoff).select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+        )
+        if not requests:
+            return 0
+        items = LoanRequestItem.objects.filter(loan_request__in=requests)
+        ArchivedLoanRequest.objects.bulk_create([_copy(ArchivedLoanRequest, request) for request in requests])
+        ArchivedLoanRequestItem.objects.bulk_create([_copy(ArchivedLoanRequestItem, item) for item in items])
+        LoanRequest.objects.filter(pk__in=[request.pk for request in requests]).delete()
+    return len(requests)
+
+
+def _drain(archive_batch, cutoff, batch_size):
+    moved = 0
+    while True:
+        count = archive_batch(cutoff, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+def archive_closed(days=None, batch_size=None):
+    """
+    Archiva los préstamos y luego las solicitudes cerrados hace más de
+    `days` días; retorna {'loans': movidos, 'requests': movidas}.
+    """
+    cutoff = archive_cutoff(days)
+    batch_size = batch_size or settings.LOAN_ARCHIVE_BATCH_SIZE
+    # Primero los préstamos: liberan sus solicitudes
+    return {
+        'loans': _drain(_archive_loan_batch, cutoff, batch_size),
+        'requests': _drain(_archive_request_batch, cutoff, batch_size),
+    }
@@ -0,0 +1,47 @@
+"""
+Conciliación de la disponibilidad de materiales prestables.
+
+Loan.save mantiene `available_quantity` con deltas por transición de estado
+(ver Loan.update_material_availability). Esta conciliación periódica
+(comando reconcile_availability y tarea loans.tasks.reconcile_availability)
+detecta materiales cuya disponibilidad no es la cantidad total menos las
+unidades en préstamos activos o vencidos, y los corrige con un movimiento.
+"""
+from django.db.models import Sum
+from loans.models import Loan, recount_material_availability
+from materials.models import Material
+from materials.stock import BLOCKED_STATUSES
+
+
+def expected_available(quantity, status, loaned):
+    if status in BLOCKED_STATUSES:
+        return 0
+    return max(quantity - loaned, 0)
+
+
+def find_drift(account_id=None):
+    """Genera (material_id, disponible, esperado) de los materiales desfasados"""
+    materials = Material.objects.filter(category__is_consumable=False)
+    loans = Loan.objects.filter(status__in=Loan.HOLDING_STATUSES, is_consumable_loan=False)
+    if account_id:
+        materials = materials.filter(account_id=account_id)
+        loans = loans.filter(account_id=account_id)
+
+    loaned = dict(
+        loans.values('material_id').annotate(total=Sum('quantity_loaned')).order_by()
+        .values_list('material_id', 'total')
+    )
+    rows = materials.values_list('id', 'quantity', 'available_quantity', 'status')
+    for material_id, quantity, available, status in rows.iterator(chunk_size=2000):
+        expected = expected_available(quantity, status, loaned.get(material_id, 0))
+        if available != expected:
+            yield material_id, available, expected
+
+
+def reconcile(account_id=None, fix=True):
+    """Corrige los materiales desfasados; retorna la lista de diferencias"""
+    drift = list(find_drift(account_id))
+    if fix:
+        for material in Material.objects.filter(pk__in=[row[0] for row in drift]):
+            recount_material_availability(material, reference='reconcile')
+    return drift
@@ -0,0 +1,155 @@
+"""
+Entrega de préstamos.
+
+issue_request crea todos los préstamos de una solicitud aprobada en una
+transacción: bloquea la solicitud y una sola vez cada material (en orden de
+ID, ver materials.stock.lock_materials), valida los saldos bloqueados y
+escribe los préstamos, los saldos y los movimientos con una sentencia cada
+uno; la auditoría se registra junta (AuditLog.record_many). Los consumibles
+se consumen y los demás se prestan.
+
+issue_loan entrega un préstamo individual con el mismo bloqueo del material.
+Ambas se repiten ante interbloqueos (ver materials.stock.with_retries).
+"""
+from django.db import transaction
+from accounts.local_time import local_date
+from audit.models import AuditLog
+from loans.models import Loan, LoanRequest
+from loans.signatures import prepare_signature, save_signature
+from materials import stock
+from materials.models import StockMovement
+
+
+class IssuanceError(ValueError):
+    """La solicitud no se puede entregar; `errors` trae el motivo por material"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+def unavailable_reason(material):
+    """Motivo por el que el material (bloqueado) no se puede entregar, o None"""
+    if material is None:
+        return 'Material no encontrado'
+    if not material.is_consumable and not material.can_be_loaned:
+        return f'{material.name} no está disponible para préstamo'
+    return None
+
+
+def issue_loan(account_id, inventarista, material_id, quantity_loaned, pickup_signature=None, **fields):
+    """
+    Entrega un préstamo individual. El material se bloquea antes de validar
+    que se puede prestar, así dos entregas simultáneas de la última unidad
+    no pasan ambas la validación; la transacción se repite ante
+    interbloqueos (ver stock.with_retries). Retorna el préstamo creado.
+    """
+    # La firma se comprime antes de bloquear el material
+    signature = prepare_signature(pickup_signature)
+
+    def attempt():
+        with transaction.atomic():
+            material = stock.lock_materials(account_id, [material_id]).get(material_id)
+            reason = unavailable_reason(material)
+            if reason:
+                raise IssuanceError(reason, {material_id: reason})
+            return Loan.objects.create(
+                account_id=account_id,
+                issued_by=inventarista,
+                material=material,
+                quantity_loaned=quantity_loaned,
+                pickup_signature=save_signature(account_id, signature),
+                **fields
+            )
+    return stock.with_retries(attempt)
+
+
+def issue_request(loan_request, inventarista, pickup_signature=None, condition_on_pickup='good'):
+    """Entrega todos los items de una solicitud aprobada; retorna los préstamos creados"""
+    # La firma se comprime antes de bloquear la solicitud y los materiales
+    signature = prepare_signature(pickup_signature)
+    return stock.with_retries(
+        lambda: _issue_request(loan_request, inventarista, signature, condition_on_pickup)
+    )
+
+
+def _issue_request(loan_request, inventarista, prepared_signature, condition_on_pickup):
+    with transaction.atomic():
+        loan_request = LoanRequest.objects.select_for_update().get(pk=loan_request.pk)
+        if loan_request.status != 'approved':
+            raise IssuanceError('Solo se pueden entregar solicitudes aprobadas')
+        items = list(loan_request.items.all())
+        if not items:
+            raise IssuanceError('La solicitud no tiene materiales')
+
+        materials = stock.lock_materials(loan_request.account_id, [item.material_id for item in items])
+        errors = {}
+        for item in items:
+            material = materials.get(item.material_id)
+            reason = unavailable_reason(material)
+            if reason:
+                errors[item.material_id] = reason
+            elif material.available_quantity < item.quantity_requested:
+                errors[item.material_id] = (
+                    f"Stock insuficiente para {material.name}. "
+                    f"Disponible: {material.available_quantity}, Solicitado: {item.quantity_requested}"
+                )
+        if errors:
+            raise IssuanceError('No se pudo entregar la solicitud', errors)
+
+        # Una sola firma para todos los préstamos de la entrega
+        signature = save_signature(loan_request.account_id, prepared_signature)
+        today = local_date(loan_request.account_id)
+        return_date = loan_request.desired_return_date
+        loans = []
+        for item in items:
+            consumable = materials[item.material_id].is_consumable
+            if consumable:
+                status = 'returned'
+            elif return_date < today:
+                status = 'overdue'
+            else:
+                status = 'active'
+            loans.append(Loan(
+                account_id=loan_request.account_id,
+                loan_request=loan_request,
+                borrower_id=loan_request.requester_id,
+                issued_by=inventarista,
+                material=materials[item.material_id],
+                quantity_loaned=item.quantity_requested,
+                quantity_returned=item.quantity_requested if consumable else 0,
+                is_consumable_loan=consumable,
+                expected_return_date=None if consumable else return_date,
+                pickup_signature=signature,
+                condition_on_pickup=condition_on_pickup,
+                status=status,
+            ))
+        loans = Loan.objects.bulk_create(loans)
+
+        entries = []
+        for loan in loans:
+            units = loan.quantity_loaned
+            if loan.is_consumable_loan:
+                entries.append((loan.material, StockMovement.CONSUME, -units, -units, f'loan:{loan.pk}'))
+            else:
+                entries.append((loan.material, StockMovement.ISSUE, 0, -units, f'loan:{loan.pk}'))
+        stock.apply_locked(loan_request.account_id, entries, user=inventarista)
+
+        loan_request.status = 'completed'
+        loan_request.save(update_fields=['status', 'updated_at'])
+
+        AuditLog.record_many([
+            AuditLog(
+                account_id=loan_request.account_id,
+                user=inventarista,
+                action='loan_issue',
+                table_name='loans',
+                record_id=loan.pk,
+                changes={'status': {'old': None, 'new': loan.status}},
+                description=f'Préstamo #{loan.pk} emitido (solicitud #{loan_request.pk})'
+            )
+            for loan in loans
+        ])
+    for loan in loans:
+        loan._loaded_holding = (loan.material_id, loan.held_units())
+    return loans
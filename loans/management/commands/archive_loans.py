@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from loans.archive import archive_closed, archive_cutoff, closed_loans, closed_requests
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a las tablas de archivo los préstamos y solicitudes cerrados '
+        'hace más de LOAN_ARCHIVE_AFTER_DAYS días, por lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help=f'Antigüedad mínima (por defecto {settings.LOAN_ARCHIVE_AFTER_DAYS})')
+        parser.add_argument('--batch-size', type=int, help=f'Filas por transacción (por defecto {settings.LOAN_ARCHIVE_BATCH_SIZE})')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar lo que se archivaría')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days no puede ser negativo')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor que cero')
+
+        if options['dry_run']:
+            cutoff = archive_cutoff(options['days'])
+            self.stdout.write(
+                f'Se archivarían {closed_loans(cutoff).count()} préstamos y '
+                f'{closed_requests(cutoff).count()} solicitudes cerrados antes de {cutoff:%Y-%m-%d %H:%M}'
+            )
+            return
+
+        moved = archive_closed(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved['loans']} préstamos y {moved['requests']} solicitudes archivados"
+        ))
@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from accounts.models import Account
+from loans.models import Loan, recount_material_availability
+from materials.models import Category, Material
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide consultas y tiempo de Loan.save para materiales con muchos '
+        'préstamos históricos. --recount agrega el recálculo con SUM que se '
+        'hacía en cada guardado, para comparar; --no-audit-changes desactiva la '
+        'captura de cambios (audit.changes). Todo se revierte al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, required=True)
+        parser.add_argument('--history', default='0,1000,10000',
+                            help='Préstamos históricos por material (lista separada por comas)')
+        parser.add_argument('--saves', type=int, default=50, help='Guardados medidos por caso')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recalcular la disponibilidad con SUM en cada guardado')
+        parser.add_argument('--no-audit-changes', action='store_true',
+                            help='Medir sin la captura de cambios de la auditoría')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Cuenta #{options['account']} no encontrada")
+        user = account.users.first()
+        if user is None:
+            raise CommandError('La cuenta no tiene usuarios')
+
+        self.stdout.write(f"{'históricos':>10} {'caso':<22} {'consultas':>9} {'ms/guardado':>12}")
+        for history in [int(size) for size in options['history'].split(',')]:
+            try:
+                with override_settings(AUDIT_CHANGES_ENABLED=not options['no_audit_changes']), transaction.atomic():
+                    for case, queries, elapsed in self._run(account, user, history, options):
+                        self.stdout.write(f'{history:>10} {case:<22} {queries:>9.1f} {elapsed:>12.2f}')
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _run(self, account, user, history, options):
+        category = Category.objects.create(account=account, name='Benchmark préstamos', is_consumable=False)
+        material = Material.objects.create(
+            account=account, category=category, name='Benchmark préstamos',
+            sku=f'BENCH-LOAN-{account.pk}', quantity=10 ** 6, available_quantity=10 ** 6
+        )
+        past = timezone.now() - timedelta(days=30)
+        Loan.objects.bulk_create([
+            Loan(
+                account=account, borrower=user, issued_by=user, material=material,
+                status='returned', actual_return_date=past, quantity_returned=1
+            )
+            for _ in range(history)
+        ], batch_size=2000)
+        loan = Loan.objects.create(
+            account=account, borrower=user, issued_by=user, material=material,
+            expected_return_date=timezone.now().date() + timedelta(days=7)
+        )
+        loan = Loan.objects.get(pk=loan.pk)
+
+        def verify():
+            loan.facial_auth_verified = not loan.facial_auth_verified
+            loan.save()
+
+        def toggle():
+            loan.status = 'returned' if loan.status == 'active' else 'active'
+            loan.save()
+
+        for case, step in (('sin cambio de estado', verify), ('cambio de estado', toggle)):
+            yield (case, *self._measure(step, material, options))
+
+    def _measure(self, step, material, options):
+        def run():
+            step()
+            if options['recount']:
+                recount_material_availability(material)
+
+        total_queries = 0
+        started = time.perf_counter()
+        for _ in range(options['saves']):
+            with CaptureQueriesContext(connection) as context:
+                run()
+            total_queries += len(context.captured_queries)
+        elapsed = (time.perf_counter() - started) * 1000
+        return total_queries / options['saves'], elapsed / options['saves']
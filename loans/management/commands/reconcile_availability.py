@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from loans.availability import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Detecta materiales cuya disponibilidad no coincide con la cantidad '
+        'total menos las unidades en préstamos activos, y la corrige.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, help='Solo materiales de esta cuenta')
+        parser.add_argument('--dry-run', action='store_true', help='Solo reportar diferencias')
+
+    def handle(self, *args, **options):
+        drift = reconcile(options['account'], fix=not options['dry_run'])
+        for material_id, available, expected in drift:
+            self.stdout.write(f'Material #{material_id}: disponible {available}, esperado {expected}')
+
+        action = 'encontrados' if options['dry_run'] else 'corregidos'
+        self.stdout.write(self.style.SUCCESS(f'{len(drift)} materiales con diferencias ({action})'))
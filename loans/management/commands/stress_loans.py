@@ -0,0 +1,203 @@
+import multiprocessing
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.db.models import Sum
+from django.utils import timezone
+from accounts.models import Account, User
+from loans.availability import expected_available
+from loans.issuance import issue_loan
+from loans.models import Loan
+from materials.models import Category, Material, StockMovement
+
+
+def _worker(account_id, user, material_ids, ops, seed):
+    """Entrega, devuelve y consume al azar; retorna los contadores del hilo"""
+    rng = random.Random(seed)
+    materials = list(Material.objects.filter(pk__in=material_ids).select_related('category'))
+    equipment = [material.pk for material in materials if not material.is_consumable]
+    consumables = [material.pk for material in materials if material.is_consumable]
+    due = timezone.now().date() + timedelta(days=7)
+    held = []
+    counters = Counter()
+    try:
+        for _ in range(ops):
+            roll = rng.random()
+            try:
+                if held and roll < 0.4:
+                    loan = Loan.objects.select_related('material__category').get(
+                        pk=held.pop(rng.randrange(len(held)))
+                    )
+                    loan.return_loan(user, 'good')
+                    kind = 'returned'
+                elif consumables and roll < 0.6:
+                    issue_loan(account_id, user, rng.choice(consumables), rng.randint(1, 2), borrower=user)
+                    kind = 'consumed'
+                else:
+                    loan = issue_loan(
+                        account_id, user, rng.choice(equipment), 1,
+                        borrower=user, expected_return_date=due
+                    )
+                    held.append(loan.pk)
+                    kind = 'issued'
+            except ValueError:
+                counters['rejected'] += 1
+                continue
+            except DatabaseError:
+                counters['errors'] += 1
+                continue
+            counters[kind] += 1
+    finally:
+        connection.close()
+    return counters
+
+
+def _run_threads(account_id, user_id, material_ids, threads, ops, seed):
+    """Corre `threads` hilos en este proceso; retorna los contadores sumados"""
+    user = User.objects.get(pk=user_id)
+    connection.close()
+    totals = Counter()
+    lock = threading.Lock()
+
+    def run(index):
+        counters = _worker(account_id, user, material_ids, ops, seed * 1000 + index)
+        with lock:
+            totals.update(counters)
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga concurrente de préstamos. Varios procesos con varios '
+        'hilos cada uno entregan, devuelven y consumen unidades de pocos '
+        'materiales (con pocas unidades, para disputar la última) y al final '
+        'se verifican los invariantes: disponibilidad igual a la cantidad menos '
+        'lo prestado, saldos dentro de rango y ledger igual a los saldos. '
+        'Usar con PostgreSQL: SQLite serializa las escrituras.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, required=True)
+        parser.add_argument('--materials', type=int, default=4)
+        parser.add_argument('--units', type=int, default=5, help='Unidades iniciales por material')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=8, help='Hilos por proceso')
+        parser.add_argument('--ops', type=int, default=200, help='Operaciones por hilo')
+        parser.add_argument('--keep', action='store_true', help='No eliminar los materiales de prueba')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Cuenta #{options['account']} no encontrada")
+        user = account.users.first()
+        if user is None:
+            raise CommandError('La cuenta no tiene usuarios')
+
+        materials = self._setup(account, options['materials'], options['units'])
+        material_ids = [material.pk for material in materials]
+        args = (account.pk, user.pk, material_ids, options['threads'], options['ops'])
+
+        started = time.perf_counter()
+        if options['processes'] > 1:
+            # Los procesos hijos no deben heredar conexiones abiertas
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(options['processes'], mp_context=context) as executor:
+                results = list(executor.map(
+                    _run_threads, *zip(*[args + (seed,) for seed in range(options['processes'])])
+                ))
+            counters = sum(results, Counter())
+        else:
+            counters = _run_threads(*args, 0)
+        elapsed = time.perf_counter() - started
+
+        applied = counters['issued'] + counters['returned'] + counters['consumed']
+        total = applied + counters['rejected'] + counters['errors']
+        self.stdout.write(
+            f"{total} operaciones en {elapsed:.2f}s ({total / elapsed:.0f} ops/s, "
+            f"{options['processes']} procesos x {options['threads']} hilos): "
+            f"{counters['issued']} entregas, {counters['returned']} devoluciones, "
+            f"{counters['consumed']} consumos, {counters['rejected']} rechazadas por disponibilidad, "
+            f"{counters['errors']} conflictos de BD sin resolver"
+        )
+
+        violations = self._verify(material_ids, options['units'])
+        if not options['keep']:
+            self._cleanup(account)
+        if violations:
+            raise CommandError(f'{violations} materiales violan los invariantes')
+        self.stdout.write(self.style.SUCCESS('Invariantes verificados'))
+
+    def _setup(self, account, count, units):
+        consumables, _ = Category.objects.get_or_create(
+            account=account, name='Stress préstamos (consumibles)', defaults={'is_consumable': True}
+        )
+        equipment, _ = Category.objects.get_or_create(
+            account=account, name='Stress préstamos (equipos)', defaults={'is_consumable': False}
+        )
+        return [
+            Material.objects.create(
+                account=account,
+                category=consumables if i % 2 else equipment,
+                name=f'Stress préstamo {i}',
+                sku=f'STRESS-LOAN-{account.pk}-{i:04d}',
+                quantity=units,
+                available_quantity=units,
+            )
+            for i in range(count)
+        ]
+
+    def _verify(self, material_ids, units):
+        """Imprime el estado de cada material; retorna cuántos violan invariantes"""
+        loaned = dict(
+            Loan.objects.filter(
+                material_id__in=material_ids, status__in=Loan.HOLDING_STATUSES, is_consumable_loan=False
+            ).values('material_id').annotate(total=Sum('quantity_loaned')).order_by()
+            .values_list('material_id', 'total')
+        )
+        consumed = dict(
+            Loan.objects.filter(material_id__in=material_ids, is_consumable_loan=True)
+            .values('material_id').annotate(total=Sum('quantity_loaned')).order_by()
+            .values_list('material_id', 'total')
+        )
+        ledger = {
+            row['material_id']: (row['quantity'], row['available'])
+            for row in StockMovement.objects.filter(material_id__in=material_ids).values('material_id').annotate(
+                quantity=Sum('quantity_delta'), available=Sum('available_delta')
+            ).order_by()
+        }
+
+        violations = 0
+        for material in Material.objects.filter(pk__in=material_ids).select_related('category').order_by('pk'):
+            actual = (material.quantity, material.available_quantity)
+            if material.is_consumable:
+                quantity = units - consumed.get(material.pk, 0)
+                wanted = (quantity, quantity)
+            else:
+                wanted = (units, expected_available(units, material.status, loaned.get(material.pk, 0)))
+            line = (
+                f'{material.sku}: esperado {wanted[0]}/{wanted[1]}, actual {actual[0]}/{actual[1]}, '
+                f'ledger {ledger[material.pk][0]}/{ledger[material.pk][1]}'
+            )
+            if actual != wanted or ledger[material.pk] != actual or not 0 <= actual[1] <= actual[0]:
+                violations += 1
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        return violations
+
+    def _cleanup(self, account):
+        Material.objects.filter(account=account, sku__startswith=f'STRESS-LOAN-{account.pk}-').delete()
+        Category.objects.filter(account=account, name__startswith='Stress préstamos (').delete()
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from loans.overdue import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = 'Marca como vencidos los préstamos activos cuya fecha de retorno ya pasó.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Fecha de corte (YYYY-MM-DD); por defecto hoy en cada cuenta')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date debe tener el formato YYYY-MM-DD')
+
+        swept = sweep_overdue(today)
+        for account_id, count in swept.items():
+            self.stdout.write(f'Cuenta #{account_id}: {count} préstamos vencidos')
+        self.stdout.write(self.style.SUCCESS(f'{sum(swept.values())} préstamos marcados como vencidos'))
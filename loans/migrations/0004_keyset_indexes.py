@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('loans', '0003_loanextension_account'),
+        ('materials', '0007_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['account', 'issued_at', 'id'], name='loans_loan_account_e77053_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['account', 'expected_return_date', 'id'], name='loans_loan_account_7b0212_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanextension',
+            index=models.Index(fields=['account', 'requested_at', 'id'], name='loans_loane_account_27bf5a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanrequest',
+            index=models.Index(fields=['account', 'requested_date', 'id'], name='loans_loanr_account_87d6df_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 09:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('loans', '0004_keyset_indexes'),
+        ('materials', '0007_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['account', 'expected_return_date'], name='loan_active_due_idx'),
+        ),
+    ]
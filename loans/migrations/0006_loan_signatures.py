@@ -0,0 +1,102 @@
+# Generated by Django 5.0 on 2026-10-18 09:40
+
+import base64
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_signatures(apps, schema_editor):
+    """Comprime las firmas en base64 de cada préstamo a LoanSignature"""
+    from loans.signatures import compress_signature, decode_signature
+
+    Loan = apps.get_model('loans', 'Loan')
+    LoanSignature = apps.get_model('loans', 'LoanSignature')
+
+    loans = Loan.objects.exclude(
+        models.Q(pickup_signature__isnull=True) | models.Q(pickup_signature=''),
+        models.Q(return_signature__isnull=True) | models.Q(return_signature=''),
+    ).values_list('id', 'account_id', 'pickup_signature', 'return_signature')
+    for loan_id, account_id, pickup, returned in loans.iterator(chunk_size=500):
+        refs = {}
+        for field, value in (('pickup_signature_ref', pickup), ('return_signature_ref', returned)):
+            if not value:
+                continue
+            try:
+                raw = decode_signature(value)
+            except ValueError:
+                # Texto que no es base64: se conserva tal cual
+                raw = value.encode()
+            data, content_type = compress_signature(raw)
+            refs[field] = LoanSignature.objects.create(
+                account_id=account_id, data=data, content_type=content_type, size=len(data)
+            )
+        Loan.objects.filter(pk=loan_id).update(**refs)
+
+
+def restore_signatures(apps, schema_editor):
+    Loan = apps.get_model('loans', 'Loan')
+    loans = Loan.objects.filter(
+        models.Q(pickup_signature_ref__isnull=False) | models.Q(return_signature_ref__isnull=False)
+    ).select_related('pickup_signature_ref', 'return_signature_ref')
+    for loan in loans.iterator(chunk_size=500):
+        for ref, field in (('pickup_signature_ref', 'pickup_signature'), ('return_signature_ref', 'return_signature')):
+            signature = getattr(loan, ref)
+            if signature is not None:
+                setattr(loan, field, base64.b64encode(bytes(signature.data)).decode())
+        loan.save(update_fields=['pickup_signature', 'return_signature'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('loans', '0005_overdue_sweep_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_type', models.CharField(default='image/webp', max_length=50)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0, help_text='Tamaño en bytes de la firma almacenada')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_signatures', to='accounts.account')),
+            ],
+            options={
+                'verbose_name': 'Firma de Préstamo',
+                'verbose_name_plural': 'Firmas de Préstamo',
+            },
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='pickup_signature_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='loans.loansignature'),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='return_signature_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='loans.loansignature'),
+        ),
+        migrations.RunPython(move_signatures, restore_signatures),
+        migrations.RemoveField(
+            model_name='loan',
+            name='pickup_signature',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='return_signature',
+        ),
+        migrations.RenameField(
+            model_name='loan',
+            old_name='pickup_signature_ref',
+            new_name='pickup_signature',
+        ),
+        migrations.RenameField(
+            model_name='loan',
+            old_name='return_signature_ref',
+            new_name='return_signature',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_loan_signatures'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='loan',
+            name='loan_active_due_idx',
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status__in', ['active', 'overdue'])), fields=['account', 'expected_return_date', 'id'], name='loan_holding_due_idx'),
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 5.0 on 2026-10-18 09:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_account_time_zone'),
+        ('loans', '0007_loan_holding_due_index'),
+        ('materials', '0007_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('loan_request_id', models.BigIntegerField(blank=True, null=True)),
+                ('quantity_loaned', models.IntegerField()),
+                ('quantity_returned', models.IntegerField()),
+                ('is_consumable_loan', models.BooleanField()),
+                ('issued_at', models.DateTimeField()),
+                ('expected_return_date', models.DateField(blank=True, null=True)),
+                ('actual_return_date', models.DateTimeField(blank=True, null=True)),
+                ('facial_auth_verified', models.BooleanField()),
+                ('facial_auth_at', models.DateTimeField(blank=True, null=True)),
+                ('condition_on_pickup', models.CharField(choices=[('excellent', 'Excelente'), ('good', 'Bueno'), ('fair', 'Regular'), ('poor', 'Malo'), ('damaged', 'Dañado')], max_length=50)),
+                ('condition_on_return', models.CharField(blank=True, choices=[('excellent', 'Excelente'), ('good', 'Bueno'), ('fair', 'Regular'), ('poor', 'Malo'), ('damaged', 'Dañado')], max_length=50, null=True)),
+                ('damage_notes', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'Activo'), ('returned', 'Devuelto'), ('overdue', 'Vencido'), ('lost', 'Extraviado')], max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.account')),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('issued_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='materials.material')),
+                ('pickup_signature', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='loans.loansignature')),
+                ('return_signature', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='loans.loansignature')),
+                ('returned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Préstamo archivado',
+                'verbose_name_plural': 'Préstamos archivados',
+                'ordering': ['-issued_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoanExtension',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('requested_at', models.DateTimeField()),
+                ('new_return_date', models.DateField()),
+                ('reason', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('approved', 'Aprobada'), ('rejected', 'Rechazada')], max_length=50)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('review_notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.account')),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extensions', to='loans.archivedloan')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Extensión de Préstamo archivada',
+                'verbose_name_plural': 'Extensiones de Préstamo archivadas',
+                'ordering': ['-requested_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoanRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('requested_date', models.DateTimeField()),
+                ('desired_pickup_date', models.DateField()),
+                ('desired_return_date', models.DateField()),
+                ('purpose', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('approved', 'Aprobada'), ('rejected', 'Rechazada'), ('cancelled', 'Cancelada'), ('completed', 'Completada')], max_length=50)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('review_notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.account')),
+                ('requester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Solicitud de Préstamo archivada',
+                'verbose_name_plural': 'Solicitudes de Préstamo archivadas',
+                'ordering': ['-requested_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoanRequestItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity_requested', models.IntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('loan_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='loans.archivedloanrequest')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='materials.material')),
+            ],
+            options={
+                'verbose_name': 'Item de Solicitud archivado',
+                'verbose_name_plural': 'Items de Solicitud archivados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedloan',
+            index=models.Index(fields=['account', 'issued_at', 'id'], name='loans_archi_account_d0954f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloan',
+            index=models.Index(fields=['borrower', 'issued_at'], name='loans_archi_borrowe_012412_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloan',
+            index=models.Index(fields=['material', 'issued_at'], name='loans_archi_materia_ce9612_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloan',
+            index=models.Index(fields=['loan_request_id'], name='loans_archi_loan_re_160d2f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloanextension',
+            index=models.Index(fields=['account', 'requested_at', 'id'], name='loans_archi_account_ebc75f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloanrequest',
+            index=models.Index(fields=['account', 'requested_date', 'id'], name='loans_archi_account_d1c665_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloanrequest',
+            index=models.Index(fields=['requester', 'requested_date'], name='loans_archi_request_562f84_idx'),
+        ),
+    ]
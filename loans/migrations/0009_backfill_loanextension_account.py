@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_account(apps, schema_editor):
+    """
+    La migración 0003 dejó todas las extensiones existentes en la cuenta 1;
+    la cuenta correcta es la del préstamo (también en las ya archivadas).
+    """
+    for extension_model, loan_model in (
+        ('LoanExtension', 'Loan'),
+        ('ArchivedLoanExtension', 'ArchivedLoan'),
+    ):
+        LoanExtension = apps.get_model('loans', extension_model)
+        Loan = apps.get_model('loans', loan_model)
+        LoanExtension.objects.exclude(account_id=F('loan__account_id')).update(
+            account_id=Subquery(Loan.objects.filter(pk=OuterRef('loan_id')).values('account_id')[:1])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_account, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from accounts.local_time import local_date
 from accounts.models import Account, User
+from audit.changes import AuditedModel
+from materials import stock
 from materials.models import Material
 
 
-class LoanRequest(models.Model):
+class LoanRequest(AuditedModel):
     """Solicitudes de préstamo de materiales"""
     
     STATUS_CHOICES = [
@@ -42,6 +45,9 @@ class LoanRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Captura de cambios (audit.changes)
+    audit_table = 'loan_requests'
+
     class Meta:
         verbose_name = 'Solicitud de Préstamo'
         verbose_name_plural = 'Solicitudes de Préstamo'
@@ -51,6 +57,8 @@ class LoanRequest(models.Model):
             models.Index(fields=['requester', 'status']),
             models.Index(fields=['desired_pickup_date']),
             models.Index(fields=['status']),
+            # Paginación por llave (orden, id), ver pack_a_stock_api.pagination
+            models.Index(fields=['account', 'requested_date', 'id']),
         ]
 
     def __str__(self):
@@ -110,7 +118,25 @@ class LoanRequestItem(models.Model):
         super().save(*args, **kwargs)
 
 
-class Loan(models.Model):
+class LoanSignature(models.Model):
+    """Firma digital de un préstamo, comprimida (ver loans.signatures)"""
+    
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='loan_signatures')
+    content_type = models.CharField(max_length=50, default='image/webp')
+    data = models.BinaryField()
+    size = models.PositiveIntegerField(default=0, help_text="Tamaño en bytes de la firma almacenada")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Firma de Préstamo'
+        verbose_name_plural = 'Firmas de Préstamo'
+
+    def __str__(self):
+        return f"Firma #{self.id} ({self.content_type}, {self.size} bytes)"
+
+
+class Loan(AuditedModel):
     """Préstamos activos de materiales"""
     
     STATUS_CHOICES = [
@@ -174,9 +200,21 @@ class Loan(models.Model):
     facial_auth_verified = models.BooleanField(default=False)
     facial_auth_at = models.DateTimeField(null=True, blank=True)
     
-    # Firmas digitales
-    pickup_signature = models.TextField(blank=True, null=True, help_text="Firma digital en base64")
-    return_signature = models.TextField(blank=True, null=True, help_text="Firma digital en base64")
+    # Firmas digitales (en su propia tabla, solo se cargan al pedirlas)
+    pickup_signature = models.ForeignKey(
+        LoanSignature,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    return_signature = models.ForeignKey(
+        LoanSignature,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
     
     # Condiciones del material
     condition_on_pickup = models.CharField(max_length=50, choices=CONDITION_CHOICES, default='good')
@@ -189,6 +227,9 @@ class Loan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Captura de cambios (audit.changes)
+    audit_table = 'loans'
+
     class Meta:
         verbose_name = 'Préstamo'
         verbose_name_plural = 'Préstamos'
@@ -200,60 +241,101 @@ class Loan(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['expected_return_date']),
             models.Index(fields=['loan_request']),
+            # Paginación por llave (orden, id), ver pack_a_stock_api.pagination
+            models.Index(fields=['account', 'issued_at', 'id']),
+            models.Index(fields=['account', 'expected_return_date', 'id']),
+            # Préstamos no devueltos por fecha de retorno: barrido de vencidos
+            # (loans.overdue) y filtros/orden por días vencidos (loans.timing)
+            models.Index(
+                fields=['account', 'expected_return_date', 'id'],
+                condition=models.Q(status__in=['active', 'overdue']),
+                name='loan_holding_due_idx'
+            ),
         ]
 
     def __str__(self):
         return f"Préstamo #{self.id} - {self.material.name} a {self.borrower.full_name}"
 
+    # Estados en los que las unidades están fuera del inventario
+    HOLDING_STATUSES = ('active', 'overdue')
+
+    # Valores anotados por loans.timing.with_timing
+    TIMING_CACHE = ('_is_overdue', '_days_overdue', '_days_until_return')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Unidades prestadas al leer: save() solo aplica la diferencia
+        loaded = instance.__dict__
+        if all(name in loaded for name in ('material_id', 'status', 'quantity_loaned', 'is_consumable_loan')):
+            instance._loaded_holding = (instance.material_id, instance.held_units())
+        return instance
+
+    def held_units(self):
+        """Unidades de este préstamo que descuentan la disponibilidad del material"""
+        if self.is_consumable_loan or self.status not in self.HOLDING_STATUSES:
+            return 0
+        return self.quantity_loaned
+
     def save(self, *args, **kwargs):
-        # Establecer is_consumable_loan basado en el material
-        if self.material:
+        if self._state.adding:
+            previous = (self.material_id, 0)
+        else:
+            previous = getattr(self, '_loaded_holding', None)
+
+        # Establecer is_consumable_loan basado en el material (solo si cambió)
+        if previous is None or previous[0] != self.material_id or self._state.adding:
             self.is_consumable_loan = self.material.is_consumable
             
-            # Si es consumible, no tiene fecha de retorno y marca como devuelto automáticamente
-            if self.is_consumable_loan:
-                self.expected_return_date = None
-                self.status = 'returned'  # Los consumibles se marcan como "entregados" inmediatamente
-                self.quantity_returned = self.quantity_loaned
-                
-                # Reducir stock del material permanentemente
-                self.material.consume(self.quantity_loaned)
+        # Si es consumible, no tiene fecha de retorno y marca como devuelto automáticamente
+        if self.is_consumable_loan:
+            self.expected_return_date = None
+            self.status = 'returned'  # Los consumibles se marcan como "entregados" inmediatamente
+            self.quantity_returned = self.quantity_loaned
         
         # Actualizar estado a vencido si pasó la fecha de retorno (solo no-consumibles)
         if not self.is_consumable_loan and self.status == 'active' and self.expected_return_date:
-            if self.expected_return_date < timezone.now().date():
+            if self.expected_return_date < local_date(self.account_id):
                 self.status = 'overdue'
+        # Los campos de tiempo anotados (loans.timing) ya no corresponden
+        for name in self.TIMING_CACHE:
+            self.__dict__.pop(name, None)
         
-        super().save(*args, **kwargs)
-        
-        # Actualizar cantidad disponible del material (solo no-consumibles)
-        if not self.is_consumable_loan:
-            self.update_material_availability()
+        with transaction.atomic():
+            # Reducir stock del material permanentemente (solo al entregar)
+            if self.is_consumable_loan and self._state.adding:
+                self.material.consume(self.quantity_loaned, user=self.issued_by)
+            
+            super().save(*args, **kwargs)
+            
+            # Actualizar cantidad disponible del material (solo no-consumibles)
+            self.update_material_availability(previous)
+        self._loaded_holding = (self.material_id, self.held_units())
 
-    def update_material_availability(self):
-        """Actualizar la cantidad disponible del material"""
-        material = self.material
-        
-        # Calcular cantidad total prestada activa
-        active_loans = Loan.objects.filter(
-            material=material,
-            status__in=['active', 'overdue']
-        ).aggregate(
-            total=models.Sum('quantity_loaned')
-        )['total'] or 0
-        
-        # Actualizar cantidad disponible
-        material.available_quantity = material.quantity - active_loans
-        
-        # Actualizar estado del material
-        if material.available_quantity <= 0:
-            material.status = 'on_loan'
-        elif material.status == 'on_loan' and material.available_quantity > 0:
-            material.status = 'available'
-        
-        material.save()
+    def update_material_availability(self, previous=None):
+        """
+        Aplica al material la diferencia de unidades prestadas respecto a
+        `previous` (material_id, unidades), sin recorrer los demás préstamos.
+        Guardados que no cambian estado ni cantidad no tocan el material.
+        Sin estado previo conocido recalcula con la suma de préstamos activos.
+        """
+        reference = f'loan:{self.pk}'
+        if previous is None or previous[0] != self.material_id:
+            if previous is not None and previous[1]:
+                recount_material_availability(Material.objects.get(pk=previous[0]), reference=reference)
+            if not self.is_consumable_loan:
+                recount_material_availability(self.material, reference=reference)
+            return
+
+        delta = self.held_units() - previous[1]
+        if delta > 0:
+            stock.issue(self.material, delta, reference=reference)
+        elif delta < 0 and self.material.status not in stock.BLOCKED_STATUSES:
+            # Un material dañado, retirado o en mantenimiento no recupera
+            # unidades disponibles (ver stock.clear_available)
+            stock.return_to_stock(self.material, -delta, reference=reference)
 
-    def return_loan(self, inventarista, condition, damage_notes='', signature=''):
+    def return_loan(self, inventarista, condition, damage_notes='', signature=None):
         """Registrar la devolución del préstamo (solo no-consumibles)"""
         if self.is_consumable_loan:
             raise ValueError("Los consumibles no se devuelven, se consumen al entregarlos")
@@ -263,40 +345,88 @@ class Loan(models.Model):
         self.returned_to = inventarista
         self.condition_on_return = condition
         self.damage_notes = damage_notes
-        self.return_signature = signature
+        self.return_signature = signature or None
         self.quantity_returned = self.quantity_loaned
+        # save() devuelve las unidades al inventario (update_material_availability)
         self.save()
         
-        # Devolver al inventario
-        self.material.return_material(self.quantity_loaned)
-        
         # Si está dañado, actualizar material
         if condition == 'damaged':
             self.material.status = 'damaged'
             self.material.save()
 
+    # Con el queryset anotado (loans.timing.with_timing) los campos de tiempo
+    # vienen calculados por la BD y las propiedades devuelven ese valor
+
     @property
     def is_overdue(self):
         """Verifica si el préstamo está vencido (solo no-consumibles)"""
+        if '_is_overdue' in self.__dict__:
+            return self._is_overdue
         if self.is_consumable_loan:
             return False
-        return self.status == 'active' and self.expected_return_date < timezone.now().date()
+        # Los vencidos ya barridos tienen status 'overdue' (ver loans.overdue)
+        if self.status == 'overdue':
+            return True
+        return (
+            self.status == 'active'
+            and self.expected_return_date is not None
+            and self.expected_return_date < local_date(self.account_id)
+        )
+
+    @is_overdue.setter
+    def is_overdue(self, value):
+        self._is_overdue = value
+
+    @property
+    def days_overdue(self):
+        """Días desde la fecha de retorno de un préstamo no devuelto (0 si no está vencido)"""
+        if '_days_overdue' in self.__dict__:
+            return self._days_overdue
+        if (self.is_consumable_loan or self.status not in self.HOLDING_STATUSES
+                or not self.expected_return_date):
+            return 0
+        return max((local_date(self.account_id) - self.expected_return_date).days, 0)
+
+    @days_overdue.setter
+    def days_overdue(self, value):
+        self._days_overdue = value
 
     @property
     def days_until_return(self):
         """Días hasta la fecha de retorno (negativo si está vencido)"""
+        if '_days_until_return' in self.__dict__:
+            return self._days_until_return
         if self.is_consumable_loan or not self.expected_return_date:
             return 0
-        delta = self.expected_return_date - timezone.now().date()
+        delta = self.expected_return_date - local_date(self.account_id)
         return delta.days
 
+    @days_until_return.setter
+    def days_until_return(self, value):
+        self._days_until_return = value
+
     @property
     def is_fully_returned(self):
         """Verifica si se devolvió toda la cantidad prestada"""
         return self.quantity_returned >= self.quantity_loaned
 
 
-class LoanExtension(models.Model):
+def loaned_units(material_id):
+    """Unidades prestadas del material según sus préstamos activos o vencidos"""
+    return Loan.objects.filter(
+        material_id=material_id,
+        status__in=Loan.HOLDING_STATUSES,
+        is_consumable_loan=False
+    ).aggregate(total=models.Sum('quantity_loaned'))['total'] or 0
+
+
+def recount_material_availability(material, **kwargs):
+    """Recalcula la disponibilidad del material con la suma de sus préstamos"""
+    return stock.sync_loaned(material, lambda: loaned_units(material.pk), **kwargs)
+
+
+class LoanExtension(AuditedModel):
     """Extensiones/Prórrogas de préstamos"""
     
     STATUS_CHOICES = [
@@ -330,6 +460,9 @@ class LoanExtension(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Captura de cambios (audit.changes)
+    audit_table = 'loan_extensions'
+
     class Meta:
         verbose_name = 'Extensión de Préstamo'
         verbose_name_plural = 'Extensiones de Préstamo'
@@ -337,6 +470,8 @@ class LoanExtension(models.Model):
         indexes = [
             models.Index(fields=['loan', 'status']),
             models.Index(fields=['status']),
+            # Paginación por llave (orden, id), ver pack_a_stock_api.pagination
+            models.Index(fields=['account', 'requested_at', 'id']),
         ]
 
     def __str__(self):
@@ -370,3 +505,133 @@ class LoanExtension(models.Model):
         self.review_notes = notes
         self.save()
 
+
+
+# Archivo: préstamos, solicitudes y extensiones cerrados (ver loans.archive).
+# Mismas columnas que las tablas activas y mismos ID; las fechas se copian
+# tal cual (sin auto_now).
+
+class ArchivedLoanRequest(models.Model):
+    """Solicitudes de préstamo archivadas"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='+')
+    requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    requested_date = models.DateTimeField()
+    desired_pickup_date = models.DateField()
+    desired_return_date = models.DateField()
+    purpose = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=50, choices=LoanRequest.STATUS_CHOICES)
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    review_notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Solicitud de Préstamo archivada'
+        verbose_name_plural = 'Solicitudes de Préstamo archivadas'
+        ordering = ['-requested_date']
+        indexes = [
+            models.Index(fields=['account', 'requested_date', 'id']),
+            models.Index(fields=['requester', 'requested_date']),
+        ]
+
+    def __str__(self):
+        return f"Solicitud archivada #{self.id} ({self.get_status_display()})"
+
+
+class ArchivedLoanRequestItem(models.Model):
+    """Items de las solicitudes archivadas"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    loan_request = models.ForeignKey(ArchivedLoanRequest, on_delete=models.CASCADE, related_name='items')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='+')
+    quantity_requested = models.IntegerField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Item de Solicitud archivado'
+        verbose_name_plural = 'Items de Solicitud archivados'
+
+    def __str__(self):
+        return f"Material #{self.material_id} x{self.quantity_requested} - Solicitud #{self.loan_request_id}"
+
+
+class ArchivedLoan(models.Model):
+    """Préstamos archivados"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='+')
+    # La solicitud puede estar activa o archivada: solo se guarda su ID
+    loan_request_id = models.BigIntegerField(null=True, blank=True)
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    issued_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    returned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='+')
+    quantity_loaned = models.IntegerField()
+    quantity_returned = models.IntegerField()
+    is_consumable_loan = models.BooleanField()
+    issued_at = models.DateTimeField()
+    expected_return_date = models.DateField(null=True, blank=True)
+    actual_return_date = models.DateTimeField(null=True, blank=True)
+    facial_auth_verified = models.BooleanField()
+    facial_auth_at = models.DateTimeField(null=True, blank=True)
+    pickup_signature = models.ForeignKey(
+        LoanSignature, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    return_signature = models.ForeignKey(
+        LoanSignature, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    condition_on_pickup = models.CharField(max_length=50, choices=Loan.CONDITION_CHOICES)
+    condition_on_return = models.CharField(max_length=50, choices=Loan.CONDITION_CHOICES, null=True, blank=True)
+    damage_notes = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=50, choices=Loan.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Préstamo archivado'
+        verbose_name_plural = 'Préstamos archivados'
+        ordering = ['-issued_at']
+        indexes = [
+            models.Index(fields=['account', 'issued_at', 'id']),
+            models.Index(fields=['borrower', 'issued_at']),
+            models.Index(fields=['material', 'issued_at']),
+            models.Index(fields=['loan_request_id']),
+        ]
+
+    def __str__(self):
+        return f"Préstamo archivado #{self.id} ({self.get_status_display()})"
+
+
+class ArchivedLoanExtension(models.Model):
+    """Extensiones de los préstamos archivados"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='+')
+    loan = models.ForeignKey(ArchivedLoan, on_delete=models.CASCADE, related_name='extensions')
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    requested_at = models.DateTimeField()
+    new_return_date = models.DateField()
+    reason = models.TextField()
+    status = models.CharField(max_length=50, choices=LoanExtension.STATUS_CHOICES)
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    review_notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Extensión de Préstamo archivada'
+        verbose_name_plural = 'Extensiones de Préstamo archivadas'
+        ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['account', 'requested_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Extensión archivada #{self.id} - Préstamo #{self.loan_id}"
@@ -0,0 +1,55 @@
+"""
+Barrido de préstamos vencidos.
+
+Marca como `overdue` los préstamos activos cuya fecha de retorno ya pasó en
+la zona horaria de la cuenta, con un UPDATE por cuenta sobre el índice
+parcial de préstamos no devueltos (loan_holding_due_idx), y registra un
+evento de auditoría por cuenta (AuditLog.record_many). Se ejecuta con el
+comando sweep_overdue y como tarea periódica (loans.tasks.sweep_overdue).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from accounts.local_time import local_date
+from audit.changes import untracked
+from audit.models import AuditLog
+from loans.models import Loan
+
+
+def due_loans(today):
+    """Préstamos activos con fecha de retorno anterior a `today`"""
+    return Loan.objects.filter(status='active', expected_return_date__lt=today)
+
+
+def sweep_overdue(today=None):
+    """
+    Marca los préstamos vencidos; retorna {account_id: préstamos marcados}.
+    Sin `today` cada cuenta usa su fecha local.
+    """
+    now = timezone.now()
+    # Ninguna zona horaria va más de un día adelante de UTC
+    horizon = today or timezone.now().date() + timedelta(days=1)
+    swept = {}
+    dates = {}
+    # Se audita un evento por cuenta, no cada UPDATE
+    with transaction.atomic(), untracked():
+        accounts = due_loans(horizon).values_list('account_id', flat=True).distinct().order_by()
+        for account_id in list(accounts):
+            dates[account_id] = today or local_date(account_id)
+            count = due_loans(dates[account_id]).filter(account_id=account_id).update(
+                status='overdue', updated_at=now
+            )
+            if count:
+                swept[account_id] = count
+        AuditLog.record_many([
+            AuditLog(
+                account_id=account_id,
+                action='update',
+                table_name='loans',
+                changes={'status': {'old': 'active', 'new': 'overdue'}},
+                description=f'{count} préstamos vencidos al {dates[account_id].isoformat()}'
+            )
+            for account_id, count in swept.items()
+        ])
+    return swept
@@ -0,0 +1,142 @@
+"""
+Capacidad libre de materiales en un rango de fechas.
+
+Ocupan unidades los préstamos activos o vencidos (desde hoy hasta su fecha de
+retorno, o sin fin si ya pasó o no tiene) y los items de solicitudes
+aprobadas que aún no se entregan (de la fecha de recolección a la de
+retorno; los consumibles no regresan). Por material se ordenan los inicios y
+fines de cada ocupación y un barrido encuentra el máximo de unidades
+ocupadas a la vez dentro del rango: la capacidad libre es la cantidad total
+menos ese máximo.
+
+Los resultados se guardan en caché por cuenta con las versiones del catálogo
+y de RESERVATIONS, que cambia con cada transición de préstamos y
+solicitudes (ver loans.signals).
+"""
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from accounts.local_time import local_date
+from loans.models import Loan, LoanRequestItem
+from materials.cache import CATALOG, RESERVATIONS, get_version
+from materials.models import Material
+from materials.stock import BLOCKED_STATUSES
+
+MAX_MATERIALS = 200
+
+
+def _capacity(row):
+    """Unidades que el material puede comprometer en el rango"""
+    if not row['is_active'] or row['status'] in BLOCKED_STATUSES:
+        return 0
+    if row['category__is_consumable']:
+        # Los préstamos de consumibles ya descontaron su saldo
+        return row['available_quantity']
+    if not row['is_available_for_loan']:
+        return 0
+    return row['quantity']
+
+
+def _holds(account_id, material_ids, start, end, today):
+    """{material_id: [(inicio, fin o None, unidades)]} que se cruzan con el rango"""
+    holds = defaultdict(list)
+
+    loans = Loan.objects.filter(
+        account_id=account_id,
+        material_id__in=material_ids,
+        status__in=Loan.HOLDING_STATUSES,
+        is_consumable_loan=False
+    ).filter(
+        Q(expected_return_date__isnull=True) | Q(expected_return_date__gte=start)
+        | Q(expected_return_date__lt=today)
+    ).values_list('material_id', 'expected_return_date', 'quantity_loaned')
+    for material_id, return_date, units in loans:
+        if return_date is not None and return_date < today:
+            return_date = None  # Vencido: ocupa hasta que se devuelva
+        holds[material_id].append((today, return_date, units))
+
+    # Solicitudes aprobadas que no se han entregado
+    items = LoanRequestItem.objects.filter(
+        loan_request__account_id=account_id,
+        loan_request__status='approved',
+        loan_request__loans__isnull=True,
+        material_id__in=material_ids,
+        loan_request__desired_pickup_date__lte=end,
+    ).filter(
+        Q(material__category__is_consumable=True) | Q(loan_request__desired_return_date__gte=start)
+    ).values_list(
+        'material_id', 'loan_request__desired_pickup_date', 'loan_request__desired_return_date',
+        'quantity_requested', 'material__category__is_consumable'
+    )
+    for material_id, pickup, return_date, units, consumable in items:
+        holds[material_id].append((max(pickup, today), None if consumable else return_date, units))
+    return holds
+
+
+def peak_usage(holds, start, end):
+    """(máximo de unidades ocupadas a la vez en [start, end], primer día del máximo)"""
+    events = []
+    for hold_start, hold_end, units in holds:
+        first = max(hold_start, start)
+        last = end if hold_end is None else min(hold_end, end)
+        if first > last:
+            continue
+        events.append((first, units))
+        events.append((last + timedelta(days=1), -units))
+    # En el mismo día, las liberaciones antes que las ocupaciones
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    used = peak = 0
+    peak_day = None
+    for day, units in events:
+        used += units
+        if used > peak:
+            peak, peak_day = used, day
+    return peak, peak_day
+
+
+def _compute(account_id, material_ids, start, end, today):
+    rows = Material.objects.filter(account_id=account_id, pk__in=material_ids).values(
+        'id', 'quantity', 'available_quantity', 'status', 'is_active',
+        'is_available_for_loan', 'category__is_consumable'
+    )
+    holds = _holds(account_id, material_ids, start, end, today)
+    results = {}
+    for row in rows:
+        capacity = _capacity(row)
+        peak, peak_day = peak_usage(holds.get(row['id'], ()), start, end)
+        results[row['id']] = {
+            'material': row['id'],
+            'capacity': capacity,
+            'reserved': peak,
+            'free': max(capacity - peak, 0),
+            'busiest_date': peak_day,
+        }
+    return results
+
+
+def free_capacity(account_id, material_ids, start, end):
+    """
+    {material_id: {capacity, reserved, free, busiest_date}} para los
+    materiales de la cuenta en [start, end]; los que no existen se omiten.
+    """
+    material_ids = sorted(set(material_ids))
+    today = local_date(account_id)
+    start = max(start, today)
+    if end < start:
+        end = start
+    key = '|'.join(str(part) for part in (
+        get_version(CATALOG, account_id), get_version(RESERVATIONS, account_id),
+        today, start, end, ','.join(map(str, material_ids)),
+    ))
+    cache_key = f'loans:availability:{account_id}:' + hashlib.md5(key.encode()).hexdigest()
+
+    results = cache.get(cache_key)
+    if results is None:
+        results = _compute(account_id, material_ids, start, end, today)
+        cache.set(cache_key, results, timeout=settings.LOAN_AVAILABILITY_CACHE_TIMEOUT)
+    return results
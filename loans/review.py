@@ -0,0 +1,124 @@
+"""
+Revisión en bloque de solicitudes de préstamo y extensiones.
+
+Aprueba o rechaza varias solicitudes en una transacción: bloquea las filas
+pedidas (una consulta), aplica la transición a las pendientes con un UPDATE
+condicional (WHERE status='pending') y registra la auditoría de todas
+juntas (AuditLog.record_many). Al aprobar extensiones, la nueva fecha de
+retorno de los préstamos se escribe con otro UPDATE. Los UPDATE no emiten señales, así que la
+capacidad calculada se invalida aquí (ver loans.signals).
+"""
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from accounts.local_time import local_date
+from audit.changes import untracked
+from audit.models import AuditLog
+from loans.models import Loan, LoanExtension
+from loans.signals import bump_reservations
+
+MAX_REVIEW_IDS = 500
+
+DECISIONS = {'approve': 'approved', 'reject': 'rejected'}
+
+
+def _review(queryset, ids, decision, inventarista, notes, label):
+    """
+    Aplica la decisión a las filas pendientes de `queryset` con ID en `ids`.
+    Retorna (resultados por ID, filas revisadas {id: valores}).
+    """
+    new_status = DECISIONS[decision]
+    ids = list(dict.fromkeys(ids))
+    rows = {
+        row['id']: row
+        for row in queryset.select_for_update(of=('self',)).filter(pk__in=ids).values(
+            'id', 'account_id', 'status'
+        ).order_by('pk')
+    }
+    pending = [pk for pk in ids if pk in rows and rows[pk]['status'] == 'pending']
+    if pending:
+        queryset.model.objects.filter(pk__in=pending, status='pending').update(
+            status=new_status,
+            reviewed_by=inventarista,
+            reviewed_at=timezone.now(),
+            review_notes=notes,
+            updated_at=timezone.now(),
+        )
+
+    results = []
+    for pk in ids:
+        row = rows.get(pk)
+        if row is None:
+            results.append({'id': pk, 'error': f'{label} no encontrada'})
+        elif row['status'] != 'pending':
+            results.append({'id': pk, 'error': f"{label} en estado '{row['status']}', no está pendiente"})
+        else:
+            results.append({'id': pk, 'status': new_status})
+    return results, {pk: rows[pk] for pk in pending}
+
+
+def review_requests(queryset, ids, decision, inventarista, notes=''):
+    """
+    Aprueba ('approve') o rechaza ('reject') las solicitudes pendientes de
+    `queryset` con ID en `ids`. Retorna los resultados por ID.
+    """
+    # Cada revisión se audita abajo, no como UPDATE en bloque
+    with transaction.atomic(), untracked():
+        results, reviewed = _review(queryset, ids, decision, inventarista, notes, 'Solicitud')
+        AuditLog.record_many([
+            AuditLog(
+                account_id=row['account_id'],
+                user=inventarista,
+                action=decision,
+                table_name='loan_requests',
+                record_id=pk,
+                changes={'status': {'old': 'pending', 'new': DECISIONS[decision]}},
+                description=f'Solicitud #{pk} {"aprobada" if decision == "approve" else "rechazada"}'
+            )
+            for pk, row in reviewed.items()
+        ])
+        for account_id in {row['account_id'] for row in reviewed.values()}:
+            bump_reservations(account_id)
+    return results
+
+
+def review_extensions(queryset, ids, decision, inventarista, notes=''):
+    """
+    Aprueba o rechaza las extensiones pendientes de `queryset` con ID en
+    `ids`. Al aprobar, los préstamos toman la nueva fecha de retorno (la de
+    la última extensión si hay varias del mismo préstamo) y los vencidos
+    vuelven a activos si la nueva fecha no es anterior a la fecha local de
+    su cuenta. Retorna los resultados por ID.
+    """
+    # Cada revisión se audita abajo, no como UPDATE en bloque
+    with transaction.atomic(), untracked():
+        results, reviewed = _review(queryset, ids, decision, inventarista, notes, 'Extensión')
+        if reviewed and decision == 'approve':
+            extensions = LoanExtension.objects.filter(pk__in=reviewed)
+            latest = extensions.filter(loan=OuterRef('pk')).order_by('-pk')
+            new_date = Subquery(latest.values('new_return_date')[:1])
+            # Un UPDATE por cuenta: cada una compara con su propia fecha local
+            for account_id in sorted({row['account_id'] for row in reviewed.values()}):
+                reactivate = GreaterThanOrEqual(new_date, Value(local_date(account_id)))
+                Loan.objects.filter(account_id=account_id, pk__in=extensions.values('loan_id')).update(
+                    expected_return_date=new_date,
+                    status=Case(When(reactivate, status='overdue', then=Value('active')), default=F('status')),
+                    updated_at=timezone.now(),
+                )
+        AuditLog.record_many([
+            AuditLog(
+                account_id=row['account_id'],
+                user=inventarista,
+                action=f'extension_{DECISIONS[decision]}',
+                table_name='loan_extensions',
+                record_id=pk,
+                changes={'status': {'old': 'pending', 'new': DECISIONS[decision]}},
+                description=f'Extensión #{pk} {"aprobada" if decision == "approve" else "rechazada"}'
+            )
+            for pk, row in reviewed.items()
+        ])
+        if decision == 'approve':
+            for account_id in {row['account_id'] for row in reviewed.values()}:
+                bump_reservations(account_id)
+    return results
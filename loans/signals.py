@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from loans.archive import CLOSED_LOAN_STATUSES, CLOSED_REQUEST_STATUSES
+from loans.models import Loan, LoanRequest, LoanRequestItem
+from materials.cache import RESERVATIONS, bump_version
+
+
+def bump_reservations(account_id):
+    """Invalida la capacidad calculada de la cuenta al confirmar la transacción"""
+    transaction.on_commit(lambda: bump_version(RESERVATIONS, account_id))
+
+
+@receiver([post_save, post_delete], sender=Loan)
+@receiver([post_save, post_delete], sender=LoanRequest)
+def invalidate_reservations(sender, instance, signal, **kwargs):
+    """Préstamos y solicitudes cambian la capacidad libre (ver loans.reservations)"""
+    # Borrar un registro cerrado (p.ej. al archivarlo, loans.archive) no la cambia
+    if signal is post_delete and instance.status in CLOSED_LOAN_STATUSES + CLOSED_REQUEST_STATUSES:
+        return
+    bump_reservations(instance.account_id)
+
+
+@receiver([post_save, post_delete], sender=LoanRequestItem)
+def invalidate_item_reservations(sender, instance, origin=None, **kwargs):
+    # Al borrar la solicitud completa, su propia señal decide
+    if isinstance(origin, LoanRequest) or getattr(origin, 'model', None) is LoanRequest:
+        return
+    bump_reservations(instance.loan_request.account_id)
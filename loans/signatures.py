@@ -0,0 +1,85 @@
+"""
+Firmas digitales de préstamos.
+
+Los clientes envían la firma en base64 (o como data URL). Se guarda como
+binario en LoanSignature, recodificada como WebP sin pérdida cuando es una
+imagen (los trazos de una firma comprimen mucho mejor que el PNG en base64),
+y el préstamo solo guarda la referencia. La imagen se sirve en
+/api/loans/loans/<id>/signature/<pickup|return>/.
+
+La compresión es costosa (WebP method=6): las entregas la hacen con
+prepare_signature antes de bloquear materiales y solo guardan el resultado
+dentro de la transacción (save_signature).
+"""
+import base64
+import binascii
+from io import BytesIO
+
+from PIL import Image
+from loans.models import LoanSignature
+
+# Lado máximo de una firma en pixeles (WebP admite hasta 16383)
+MAX_SIGNATURE_SIDE = 4096
+
+
+def decode_signature(value):
+    """base64 o data URL -> bytes; ValueError si no es base64 válido"""
+    if value.startswith('data:'):
+        value = value.partition(',')[2]
+    try:
+        return base64.b64decode(value, validate=True)
+    except binascii.Error:
+        raise ValueError('La firma debe estar codificada en base64')
+
+
+def check_signature(raw):
+    """ValueError si los bytes son una imagen más grande que MAX_SIGNATURE_SIDE"""
+    try:
+        # Solo lee el encabezado, no decodifica la imagen
+        width, height = Image.open(BytesIO(raw)).size
+    except Image.DecompressionBombError:
+        raise ValueError('La imagen de la firma es demasiado grande')
+    except Exception:
+        # No es una imagen: se guarda tal cual
+        return
+    if max(width, height) > MAX_SIGNATURE_SIDE:
+        raise ValueError(
+            f'La imagen de la firma no puede medir más de {MAX_SIGNATURE_SIDE} pixeles por lado'
+        )
+
+
+def compress_signature(raw):
+    """(bytes, content_type) más compactos para la firma"""
+    try:
+        image = Image.open(BytesIO(raw))
+        image.load()
+    except Exception:
+        return raw, 'application/octet-stream'
+
+    output = BytesIO()
+    try:
+        image.save(output, format='WEBP', lossless=True, method=6)
+    except (OSError, ValueError):
+        # Tamaño o modo que el codificador WebP no admite
+        return raw, Image.MIME.get(image.format, 'application/octet-stream')
+    if output.tell() < len(raw):
+        return output.getvalue(), 'image/webp'
+    return raw, Image.MIME.get(image.format, 'application/octet-stream')
+
+
+def prepare_signature(value):
+    """(bytes, content_type) comprimidos de la firma en base64, o None si viene vacía"""
+    if not value:
+        return None
+    return compress_signature(decode_signature(value))
+
+
+def save_signature(account_id, prepared):
+    """Guarda una firma de prepare_signature y retorna el LoanSignature (o None)"""
+    if prepared is None:
+        return None
+    data, content_type = prepared
+    return LoanSignature.objects.create(
+        account_id=account_id, data=data, content_type=content_type, size=len(data)
+    )
+
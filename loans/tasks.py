@@ -0,0 +1,30 @@
+import logging
+
+from celery import shared_task
+from loans import archive, overdue
+from loans.availability import reconcile
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_availability():
+    """Conciliación periódica de disponibilidad (ver CELERY_BEAT_SCHEDULE)"""
+    drift = reconcile()
+    if drift:
+        logger.warning('Disponibilidad corregida en %d materiales: %s', len(drift), drift[:20])
+    return len(drift)
+
+
+@shared_task
+def sweep_overdue():
+    """Marca los préstamos vencidos (ver CELERY_BEAT_SCHEDULE)"""
+    swept = overdue.sweep_overdue()
+    return sum(swept.values())
+
+
+@shared_task
+def archive_closed():
+    """Archiva los préstamos y solicitudes cerrados (ver CELERY_BEAT_SCHEDULE)"""
+    moved = archive.archive_closed()
+    return sum(moved.values())
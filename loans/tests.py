@@ -1,3 +1,354 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from audit.changes import untracked
+from accounts.local_time import local_date
+from loans import availability
+from loans.issuance import IssuanceError, issue_loan
+from loans.models import Loan, LoanExtension, LoanSignature
+from loans.review import review_extensions
+from loans.Viewsets.loan_extension_viewsets import LoanExtensionViewSet
+from loans.Viewsets.loan_request_viewsets import LoanRequestViewSet
+from loans.Viewsets.loan_viewsets import LoanViewSet
+from materials import stock
+from materials.models import Material, StockMovement
+from pack_a_stock_api.testing import QueryBudgetTestCase, make_account, make_material, make_user
+
+
+class LoanRequestQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/loans/loan-requests/'
+    budgets = LoanRequestViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
+
+    def test_pending(self):
+        self.assertListBudget(f'{self.url}pending/', self.budgets['pending'])
+
+    def test_my_requests(self):
+        self.assertListBudget(f'{self.url}my_requests/', self.budgets['my_requests'])
+
+
+class LoanQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/loans/loans/'
+    budgets = LoanViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
+
+    def test_active(self):
+        self.assertListBudget(f'{self.url}active/', self.budgets['active'])
+
+    def test_overdue(self):
+        self.assertListBudget(f'{self.url}overdue/', self.budgets['overdue'])
+
+    def test_my_loans(self):
+        self.assertListBudget(f'{self.url}my_loans/', self.budgets['my_loans'])
+
+
+class LoanExtensionQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/loans/loan-extensions/'
+    budgets = LoanExtensionViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
+
+    def test_pending(self):
+        self.assertListBudget(f'{self.url}pending/', self.budgets['pending'])
+
+
+class LoanAvailabilityTests(TestCase):
+    """Loan.save aplica al material solo la diferencia de unidades prestadas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+        cls.user = make_user(cls.account)
+
+    def setUp(self):
+        self.material = make_material(self.account, quantity=5)
+
+    def lend(self, quantity=2):
+        return Loan.objects.create(
+            account=self.account,
+            borrower=self.user,
+            issued_by=self.user,
+            material=self.material,
+            quantity_loaned=quantity,
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+        )
+
+    def assertAvailable(self, expected):
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.available_quantity, expected)
+        ledger = self.material.movements.aggregate(total=Sum('available_delta'))['total']
+        self.assertEqual(ledger, expected)
+        self.assertEqual(list(availability.find_drift(self.account.pk)), [])
+
+    def test_issue_takes_units(self):
+        loan = self.lend(2)
+        self.assertAvailable(3)
+        movement = self.material.movements.get(kind=StockMovement.ISSUE)
+        self.assertEqual((movement.available_delta, movement.reference), (-2, f'loan:{loan.pk}'))
+
+    def test_active_to_returned_gives_units_back(self):
+        loan = self.lend(2)
+        loan.return_loan(self.user, 'good')
+        self.assertAvailable(5)
+
+    def test_active_to_lost_releases_units(self):
+        loan = Loan.objects.get(pk=self.lend(2).pk)
+        loan.status = 'lost'
+        loan.save()
+        self.assertAvailable(5)
+
+    def test_partial_return_applies_difference(self):
+        loan = Loan.objects.get(pk=self.lend(3).pk)
+        # Las unidades prestadas son quantity_loaned mientras siga activo
+        loan.quantity_returned = 1
+        loan.save()
+        self.assertAvailable(2)
+
+        loan.quantity_loaned = 2
+        loan.save()
+        self.assertAvailable(3)
+        self.assertEqual(self.material.movements.filter(kind=StockMovement.RETURN).count(), 1)
+
+    def test_overdue_keeps_units(self):
+        loan = Loan.objects.get(pk=self.lend(2).pk)
+        loan.status = 'overdue'
+        loan.save()
+        self.assertAvailable(3)
+
+    def test_signature_save_does_not_touch_material(self):
+        loan = Loan.objects.get(pk=self.lend(2).pk)
+        self.material.refresh_from_db()
+        updated_at = self.material.updated_at
+        movements = self.material.movements.count()
+
+        loan.pickup_signature = LoanSignature.objects.create(account=self.account, data=b'firma', size=5)
+        loan.facial_auth_verified = True
+        loan.save()
+
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.updated_at, updated_at)
+        self.assertEqual(self.material.movements.count(), movements)
+        self.assertAvailable(3)
+
+    def test_issue_beyond_available_fails(self):
+        self.lend(4)
+        with self.assertRaisesMessage(ValueError, 'Stock insuficiente'):
+            self.lend(2)
+        self.assertAvailable(1)
+
+
+class AvailabilityReconcileTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+        cls.user = make_user(cls.account)
+
+    def drift(self, material, available):
+        with untracked():
+            Material.objects.filter(pk=material.pk).update(available_quantity=available)
+
+    def test_find_drift_reports_out_of_sync_materials(self):
+        material = make_material(self.account, quantity=5)
+        Loan.objects.create(
+            account=self.account, borrower=self.user, issued_by=self.user,
+            material=material, quantity_loaned=2,
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+        )
+        self.drift(material, 5)
+
+        self.assertEqual(list(availability.find_drift(self.account.pk)), [(material.pk, 5, 3)])
+        self.assertEqual(list(availability.find_drift(make_account().pk)), [])
+
+    def test_blocked_materials_expect_zero(self):
+        material = make_material(self.account, quantity=5)
+        with untracked():
+            Material.objects.filter(pk=material.pk).update(status='maintenance')
+        self.assertEqual(list(availability.find_drift(self.account.pk)), [(material.pk, 5, 0)])
+
+    def test_consumables_are_ignored(self):
+        material = make_material(self.account, consumable=True, quantity=5)
+        self.drift(material, 1)
+        self.assertEqual(list(availability.find_drift(self.account.pk)), [])
+
+    def test_reconcile_fixes_with_a_movement(self):
+        material = make_material(self.account, quantity=5)
+        self.drift(material, 2)
+
+        self.assertEqual(availability.reconcile(self.account.pk, fix=False), [(material.pk, 2, 5)])
+        material.refresh_from_db()
+        self.assertEqual(material.available_quantity, 2)
+
+        self.assertEqual(availability.reconcile(self.account.pk), [(material.pk, 2, 5)])
+        material.refresh_from_db()
+        self.assertEqual(material.available_quantity, 5)
+        self.assertEqual(material.movements.get(reference='reconcile').available_delta, 3)
+        self.assertEqual(list(availability.find_drift(self.account.pk)), [])
+
+
+class ReviewExtensionsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+        cls.user = make_user(cls.account)
+
+    def overdue_loan(self):
+        loan = Loan.objects.create(
+            account=self.account, borrower=self.user, issued_by=self.user,
+            material=make_material(self.account, quantity=1),
+            expected_return_date=local_date(self.account.pk) - timedelta(days=5),
+        )
+        self.assertEqual(loan.status, 'overdue')
+        return loan
+
+    def extend(self, loan, days):
+        return LoanExtension.objects.create(
+            account=self.account, loan=loan, requested_by=self.user,
+            new_return_date=local_date(self.account.pk) + timedelta(days=days), reason='Prueba',
+        )
+
+    def approve(self, *extensions):
+        return review_extensions(
+            LoanExtension.objects.filter(account=self.account),
+            [extension.pk for extension in extensions], 'approve', self.user,
+        )
+
+    def test_future_date_reactivates_overdue_loan(self):
+        loan = self.overdue_loan()
+        extension = self.extend(loan, 3)
+
+        self.assertEqual(self.approve(extension), [{'id': extension.pk, 'status': 'approved'}])
+
+        loan.refresh_from_db()
+        self.assertEqual((loan.status, loan.expected_return_date), ('active', extension.new_return_date))
+
+    def test_today_counts_as_not_overdue(self):
+        loan = self.overdue_loan()
+        self.approve(self.extend(loan, 0))
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'active')
+
+    def test_date_still_in_the_past_keeps_overdue(self):
+        loan = self.overdue_loan()
+        extension = self.extend(loan, -1)
+
+        self.approve(extension)
+
+        loan.refresh_from_db()
+        self.assertEqual((loan.status, loan.expected_return_date), ('overdue', extension.new_return_date))
+
+    def test_latest_extension_of_a_loan_wins(self):
+        loan = self.overdue_loan()
+        self.approve(self.extend(loan, 4), self.extend(loan, -2))
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'overdue')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite serializa las escrituras')
+class ConcurrentIssueTests(TransactionTestCase):
+    """Dos kioscos entregan a la vez la última unidad de un material"""
+
+    def test_last_unit_is_issued_once(self):
+        account = make_account()
+        user = make_user(account)
+        material = make_material(account, quantity=1)
+        barrier = threading.Barrier(2)
+        outcomes = []
+        lock = threading.Lock()
+
+        def kiosk():
+            try:
+                barrier.wait()
+                try:
+                    issue_loan(
+                        account.pk, user, material.pk, 1, borrower=user,
+                        expected_return_date=local_date(account.pk) + timedelta(days=7),
+                    )
+                    outcome = 'issued'
+                except IssuanceError:
+                    outcome = 'rejected'
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append(outcome)
+
+        kiosks = [threading.Thread(target=kiosk) for _ in range(2)]
+        for thread in kiosks:
+            thread.start()
+        for thread in kiosks:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['issued', 'rejected'])
+        material.refresh_from_db()
+        self.assertEqual(material.available_quantity, 0)
+        self.assertEqual(Loan.objects.filter(material=material).count(), 1)
+        self.assertEqual(material.movements.aggregate(total=Sum('available_delta'))['total'], 0)
+
+
+@mock.patch('materials.stock.time.sleep')
+class WithRetriesTests(TransactionTestCase):
+
+    def failing(self, errors, result='ok'):
+        """Función que lanza `errors` en orden y después retorna `result`"""
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return result
+        return func, calls
+
+    def test_retries_until_success(self, sleep):
+        func, calls = self.failing([OperationalError('database is locked')] * 2)
+        self.assertEqual(stock.with_retries(func), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_gives_up_after_attempts(self, sleep):
+        func, calls = self.failing([OperationalError('database is locked')] * 5)
+        with self.assertRaises(OperationalError):
+            stock.with_retries(func, attempts=3)
+        self.assertEqual(len(calls), 3)
+
+    def test_retries_postgres_deadlock(self, sleep):
+        cause = Exception('deadlock detected')
+        cause.pgcode = '40P01'
+        deadlock = OperationalError('deadlock detected')
+        deadlock.__cause__ = cause
+        func, calls = self.failing([deadlock])
+        self.assertEqual(stock.with_retries(func), 'ok')
+        self.assertEqual(len(calls), 2)
+
+    def test_other_errors_are_not_retried(self, sleep):
+        func, calls = self.failing([OperationalError('no such table')])
+        with self.assertRaises(OperationalError):
+            stock.with_retries(func)
+        self.assertEqual(len(calls), 1)
+        sleep.assert_not_called()
+
+    def test_no_retry_inside_outer_transaction(self, sleep):
+        func, calls = self.failing([OperationalError('database is locked')])
+        with self.assertRaises(OperationalError), transaction.atomic():
+            stock.with_retries(func)
+        self.assertEqual(len(calls), 1)
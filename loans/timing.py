@@ -0,0 +1,162 @@
+"""
+Campos de tiempo de los préstamos calculados en SQL.
+
+is_overdue, days_overdue y days_until_return se anotan en el queryset
+(with_timing) con la fecha local de la cuenta (accounts.local_time), así la
+API puede filtrarlos y ordenarlos sin traer los préstamos:
+?is_overdue=true, ?days_overdue__gte=7, ?days_until_return__lte=3,
+?ordering=-days_overdue.
+
+Los filtros de días vencidos se traducen a rangos sobre expected_return_date
+para usar el índice parcial de préstamos no devueltos (loan_holding_due_idx).
+Entre préstamos vencidos, ordenar por días vencidos es ordenar por fecha de
+retorno, así la pantalla de vencidos (?is_overdue=true o
+?days_overdue__gte=N con ?ordering=-days_overdue) pagina sobre el índice y
+admite ?cursor=.
+"""
+from datetime import timedelta
+
+from django.db.models import BooleanField, Case, DateField, F, Func, IntegerField, Q, Value, When
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from loans.models import Loan
+
+LOOKUPS = ('exact', 'gte', 'gt', 'lte', 'lt')
+
+
+class DaysBetween(Func):
+    """DaysBetween(end, start): días enteros de la fecha start a la fecha end"""
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # Resta de fechas: entero en PostgreSQL
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday('
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='DATEDIFF')
+
+
+def _holding():
+    return Q(status__in=Loan.HOLDING_STATUSES, is_consumable_loan=False, expected_return_date__isnull=False)
+
+
+def overdue_q(today):
+    """Préstamos vencidos: barridos o activos con la fecha ya pasada (ver Loan.is_overdue)"""
+    return Q(is_consumable_loan=False) & (
+        Q(status='overdue') | Q(status='active', expected_return_date__lt=today)
+    )
+
+
+def with_timing(queryset, today):
+    """Anota is_overdue, days_overdue y days_until_return respecto a `today`"""
+    today = Value(today, output_field=DateField())
+    return queryset.annotate(
+        is_overdue=Case(When(overdue_q(today), then=Value(True)), default=Value(False), output_field=BooleanField()),
+        days_overdue=Case(
+            When(_holding() & Q(expected_return_date__lt=today), then=DaysBetween(today, F('expected_return_date'))),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        days_until_return=Case(
+            When(is_consumable_loan=False, expected_return_date__isnull=False,
+                 then=DaysBetween(F('expected_return_date'), today)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+def _bounds(lookup, days):
+    """(mínimo, máximo) de días que admite el lookup; None si no hay límite"""
+    lower = {'gte': days, 'gt': days + 1, 'exact': days}.get(lookup)
+    upper = {'lte': days, 'lt': days - 1, 'exact': days}.get(lookup)
+    return lower, upper
+
+
+def _days_overdue_q(lookup, days, today):
+    """
+    Filtro sobre days_overdue como rango de fechas: days_overdue >= n (n >= 1)
+    es un préstamo prestado con fecha de retorno <= hoy - n.
+    """
+    lower, upper = _bounds(lookup, days)
+    condition = Q()
+    if lower is not None and lower > 0:
+        condition &= _holding() & Q(expected_return_date__lte=today - timedelta(days=lower))
+    if upper is not None:
+        if upper < 0:
+            return Q(pk__in=[])
+        # Los préstamos que no están vencidos tienen 0 días
+        condition &= ~(_holding() & Q(expected_return_date__lt=today - timedelta(days=upper)))
+    return condition
+
+
+def _timing_params(params):
+    """Genera (nombre, lookup, parámetro, días) de los filtros de días en la URL"""
+    for name in ('days_overdue', 'days_until_return'):
+        for lookup in LOOKUPS:
+            param = name if lookup == 'exact' else f'{name}__{lookup}'
+            raw = params.get(param)
+            if raw is None:
+                continue
+            try:
+                yield name, lookup, param, int(raw)
+            except ValueError:
+                raise ValidationError({param: ['Debe ser un número entero de días']})
+
+
+def only_overdue(params):
+    """Los filtros de la URL dejan solo préstamos vencidos"""
+    if params.get('is_overdue', '').lower() in ('true', '1'):
+        return True
+    return any(
+        name == 'days_overdue' and (_bounds(lookup, days)[0] or 0) >= 1
+        for name, lookup, _, days in _timing_params(params)
+    )
+
+
+class LoanTimingFilter(BaseFilterBackend):
+    """
+    Filtros ?is_overdue=, ?days_overdue[__gte|__gt|__lte|__lt]= y
+    ?days_until_return[__...]=. El viewset indica la fecha local con
+    `get_local_date()`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        today = view.get_local_date()
+        params = request.query_params
+
+        is_overdue = params.get('is_overdue')
+        if is_overdue is not None:
+            value = is_overdue.lower()
+            if value not in ('true', 'false', '1', '0'):
+                raise ValidationError({'is_overdue': ['Debe ser true o false']})
+            condition = overdue_q(today)
+            queryset = queryset.filter(condition if value in ('true', '1') else ~condition)
+
+        for name, lookup, param, days in _timing_params(params):
+            if name == 'days_overdue':
+                queryset = queryset.filter(_days_overdue_q(lookup, days, today))
+            else:
+                queryset = queryset.filter(**{param: days})
+        return queryset
+
+
+class LoanOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter que, con los filtros limitados a vencidos, ordena por días
+    vencidos con la fecha de retorno (mismo orden, sobre el índice). En otro
+    caso ordena por el valor anotado.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or not only_overdue(request.query_params):
+            return ordering
+        aliases = {'days_overdue': '-expected_return_date', '-days_overdue': 'expected_return_date'}
+        return [aliases.get(term, term) for term in ordering]
@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from materials.models import Category
+from pack_a_stock_api.sparse_fields import SparseFieldsSerializerMixin
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = [
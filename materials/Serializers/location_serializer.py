@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from materials.models import Location
+from pack_a_stock_api.sparse_fields import SparseFieldsSerializerMixin
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     full_address = serializers.ReadOnlyField()
     
     class Meta:
@@ -13,3 +14,9 @@ class LocationSerializer(serializers.ModelSerializer):
             'country', 'is_active', 'full_address', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'full_address', 'created_at', 'updated_at']
+        field_dependencies = {
+            'full_address': [
+                'street', 'exterior_number', 'interior_number', 'neighborhood',
+                'postal_code', 'city', 'state', 'country'
+            ],
+        }
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+from materials.stock import MAX_BATCH_ITEMS
+
+
+class ConsumeItemSerializer(serializers.Serializer):
+    material = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class MaterialConsumeBatchSerializer(serializers.Serializer):
+    items = ConsumeItemSerializer(many=True, allow_empty=False, max_length=MAX_BATCH_ITEMS)
+    partial = serializers.BooleanField(default=False)
+    reference = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from materials.models import Material
+
+
+class MaterialImportRowSerializer(serializers.Serializer):
+    """
+    Validación de una fila de importación masiva.
+    category y location aceptan ID o nombre dentro de la cuenta.
+    """
+    name = serializers.CharField(max_length=255)
+    sku = serializers.CharField(max_length=100)
+    description = serializers.CharField(required=False, allow_blank=True)
+    barcode = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    category = serializers.CharField(max_length=255)
+    location = serializers.CharField(max_length=255, required=False)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    unit_of_measure = serializers.ChoiceField(choices=Material.UNIT_CHOICES, default='unit')
+    min_stock_level = serializers.IntegerField(min_value=0, default=0)
+    reorder_quantity = serializers.IntegerField(min_value=0, default=0)
+    image_url = serializers.URLField(required=False, allow_blank=True)
+    status = serializers.ChoiceField(choices=Material.STATUS_CHOICES, default='available')
+    is_available_for_loan = serializers.BooleanField(default=True)
+    requires_facial_auth = serializers.BooleanField(default=False)
+    is_active = serializers.BooleanField(default=True)
+
+
+class MaterialImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
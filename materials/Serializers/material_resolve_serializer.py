@@ -0,0 +1,10 @@
+from rest_framework import serializers
+from materials.resolver import MAX_CODES
+
+
+class MaterialResolveSerializer(serializers.Serializer):
+    codes = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        allow_empty=False,
+        max_length=MAX_CODES
+    )
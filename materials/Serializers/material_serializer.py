@@ -1,16 +1,19 @@
 from rest_framework import serializers
 from materials.models import Material
+from materials.qr import qr_image_url
+from pack_a_stock_api.sparse_fields import SparseFieldsSerializerMixin
 from materials.Serializers.category_serializer import CategorySerializer
 from materials.Serializers.location_serializer import LocationSerializer
 
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     category_detail = CategorySerializer(source='category', read_only=True)
     location_detail = LocationSerializer(source='location', read_only=True)
     is_consumable = serializers.ReadOnlyField()
     is_low_stock = serializers.ReadOnlyField()
     can_be_loaned = serializers.ReadOnlyField()
     needs_reorder = serializers.ReadOnlyField()
+    qr_image = serializers.SerializerMethodField()
     
     class Meta:
         model = Material
@@ -23,9 +26,30 @@ class MaterialSerializer(serializers.ModelSerializer):
             'can_be_loaned', 'needs_reorder', 'created_at', 'updated_at'
         ]
         read_only_fields = [
-            'id', 'qr_code', 'qr_image', 'available_quantity', 'is_consumable',
+            'id', 'qr_code', 'available_quantity', 'is_consumable',
             'is_low_stock', 'can_be_loaned', 'needs_reorder', 'created_at', 'updated_at'
         ]
+        expandable_fields = {'category': 'category_detail', 'location': 'location_detail'}
+        field_dependencies = {
+            'is_consumable': ['category__is_consumable'],
+            'is_low_stock': ['available_quantity', 'min_stock_level'],
+            'can_be_loaned': ['is_active', 'is_available_for_loan', 'status', 'available_quantity'],
+            'needs_reorder': ['category__is_consumable', 'available_quantity', 'min_stock_level'],
+            'qr_image': ['qr_code'],
+        }
+
+    def update(self, instance, validated_data):
+        # Los cambios de cantidad se registran como ajuste de inventario
+        try:
+            return super().update(instance, validated_data)
+        except ValueError as e:
+            raise serializers.ValidationError({'quantity': [str(e)]})
+
+    def get_qr_image(self, obj):
+        """URL del endpoint que renderiza el QR bajo demanda"""
+        url = qr_image_url(obj.qr_code)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 
 class MaterialCreateSerializer(serializers.ModelSerializer):
@@ -39,7 +63,7 @@ class MaterialCreateSerializer(serializers.ModelSerializer):
         ]
 
 
-class MaterialMinimalSerializer(serializers.ModelSerializer):
+class MaterialMinimalSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer ligero para listados"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     location_name = serializers.CharField(source='location.name', read_only=True)
@@ -2,19 +2,25 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from materials.models import Location
 from materials.Serializers.location_serializer import LocationSerializer
+from materials.cache import CATALOG
+from pack_a_stock_api.conditional import ConditionalGetMixin
+from pack_a_stock_api.query_plans import FetchPlanMixin
+from pack_a_stock_api.sparse_fields import SparseFieldsMixin
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(ConditionalGetMixin, SparseFieldsMixin, FetchPlanMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     permission_classes = [IsAuthenticated]
+    etag_scope = CATALOG
     filterset_fields = ['is_active', 'city', 'state']
     search_fields = ['name', 'description', 'city', 'state']
     ordering_fields = ['name', 'created_at']
+    query_budgets = {'list': 2, 'retrieve': 1}
     
     def get_queryset(self):
         user = self.request.user
-        return Location.objects.filter(account=user.account)
+        return self.plan_queryset(Location.objects.filter(account_id=user.account_id))
     
     def perform_create(self, serializer):
         account = self.request.user.account
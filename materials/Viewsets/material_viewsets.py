@@ -1,31 +1,68 @@
 from rest_framework import viewsets, status
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser, FormParser
+from django.db import transaction
+from audit.models import AuditLog
+from materials import stock
 from materials.models import Material
+from materials.cache import CATALOG
+from pack_a_stock_api.conditional import ConditionalGetMixin
+from pack_a_stock_api.query_plans import FetchPlan, FetchPlanMixin
+from pack_a_stock_api.sparse_fields import SparseFieldsMixin, requested_fields
+from materials.importers import MaterialImporter, detect_format
+from materials.reorder import suggest_reorders
+from materials.resolver import resolve_codes
+from materials.search import (
+    AUTOCOMPLETE_MAX_LIMIT,
+    AUTOCOMPLETE_MIN_LENGTH,
+    MaterialSearchFilter,
+    autocomplete_materials
+)
+from materials.qr import qr_image_url
 from materials.Serializers.material_serializer import (
     MaterialSerializer,
     MaterialCreateSerializer,
     MaterialMinimalSerializer
 )
+from materials.Serializers.material_consume_serializer import MaterialConsumeBatchSerializer
+from materials.Serializers.material_import_serializer import MaterialImportSerializer
+from materials.Serializers.material_resolve_serializer import MaterialResolveSerializer
 
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(ConditionalGetMixin, SparseFieldsMixin, FetchPlanMixin, viewsets.ModelViewSet):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
     permission_classes = [IsAuthenticated]
+    etag_scope = CATALOG
+    filter_backends = [DjangoFilterBackend, MaterialSearchFilter, OrderingFilter]
     filterset_fields = ['category', 'location', 'status', 'is_available_for_loan', 'is_active']
     search_fields = ['name', 'description', 'sku', 'barcode', 'qr_code']
     ordering_fields = ['name', 'sku', 'quantity', 'available_quantity', 'created_at']
+    fetch_plans = {
+        'list': FetchPlan(
+            select=['category', 'location'],
+            only=[
+                'id', 'name', 'sku', 'qr_code', 'quantity', 'available_quantity',
+                'status', 'is_available_for_loan', 'category__name', 'location__name'
+            ]
+        ),
+        'default': FetchPlan(select=['category', 'location']),
+    }
+    query_budgets = {'list': 2, 'retrieve': 1, 'low_stock': 1, 'consumables': 1, 'reorder_suggestions': 1}
     
     def get_queryset(self):
         user = self.request.user
-        return Material.objects.filter(account=user.account)
+        return self.plan_queryset(Material.objects.filter(account_id=user.account_id))
     
     def get_serializer_class(self):
         if self.action == 'create':
             return MaterialCreateSerializer
-        elif self.action == 'list':
+        elif self.action == 'list' and requested_fields(self.request) is None:
+            # Con ?fields= cualquier campo del detalle se puede pedir en el listado
             return MaterialMinimalSerializer
         return MaterialSerializer
     
@@ -36,12 +73,19 @@ class MaterialViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Obtener materiales con stock bajo"""
-        materials = self.get_queryset().filter(
-            available_quantity__lte=models.F('min_stock_level')
-        )
+        materials = self.get_queryset().filter(low_stock=True)
         serializer = self.get_serializer(materials, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def reorder_suggestions(self, request):
+        """Consumibles por reordenar agrupados por ubicación y categoría"""
+        groups = suggest_reorders(self.get_queryset())
+        return Response({
+            'count': sum(len(group['items']) for group in groups),
+            'groups': groups,
+        })
+    
     @action(detail=False, methods=['get'])
     def consumables(self, request):
         """Obtener solo materiales consumibles"""
@@ -65,16 +109,113 @@ class MaterialViewSet(viewsets.ModelViewSet):
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def consume_batch(self, request):
+        """
+        Consumir una canasta de consumibles en una transacción:
+        {"items": [{"material": id, "quantity": n}, ...], "partial": false}.
+        Sin partial, si algún material falla no se consume ninguno.
+        """
+        serializer = MaterialConsumeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        with transaction.atomic():
+            results, movements = stock.consume_batch(
+                request.user.account_id,
+                [(item['material'], item['quantity']) for item in data['items']],
+                user=request.user,
+                reference=data.get('reference') or None,
+                notes=data.get('notes') or None,
+                partial=data['partial']
+            )
+            if movements:
+                AuditLog.log_action(
+                    action='material_consume',
+                    user=request.user,
+                    table_name='materials',
+                    changes={
+                        str(movement.material_id): {'consumed': -movement.quantity_delta}
+                        for movement in movements
+                    },
+                    ip_address=request.META.get('REMOTE_ADDR'),
+                    user_agent=request.META.get('HTTP_USER_AGENT'),
+                    description=f'Consumo de {len(movements)} materiales'
+                )
+        
+        failed = sum(1 for result in results if 'error' in result)
+        if not movements and failed:
+            return Response({
+                'error': 'No se consumió ningún material',
+                'results': results
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'consumed': len(movements),
+            'failed': failed,
+            'results': results
+        })
+    
     @action(detail=True, methods=['get'])
     def qr_code(self, request, pk=None):
         """Obtener información del código QR del material"""
         material = self.get_object()
         return Response({
             'qr_code': material.qr_code,
-            'qr_image': material.qr_image.url if material.qr_image else None,
+            'qr_image': request.build_absolute_uri(qr_image_url(material.qr_code)),
+            'qr_image_svg': request.build_absolute_uri(qr_image_url(material.qr_code, fmt='svg')),
             'material': MaterialMinimalSerializer(material).data
         })
     
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_materials(self, request):
+        """
+        Importación masiva desde un archivo CSV o JSONL (campo `file`).
+        category/location aceptan ID o nombre. Los errores se reportan por fila.
+        """
+        serializer = MaterialImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        file_format = serializer.validated_data.get('format') or detect_format(upload.name)
+        
+        importer = MaterialImporter(request.user.account)
+        result = importer.import_file(upload, file_format)
+        return Response(result)
+    
+    @action(detail=False, methods=['get', 'post'])
+    def resolve(self, request):
+        """
+        Resolver en lote códigos escaneados (QR, SKU o código de barras).
+        GET ?codes=A,B,C o POST {"codes": [...]}; máximo 200 códigos.
+        """
+        if request.method == 'GET':
+            data = {'codes': [code for code in request.query_params.get('codes', '').split(',') if code]}
+        else:
+            data = request.data
+        serializer = MaterialResolveSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        codes = serializer.validated_data['codes']
+        
+        results = resolve_codes(request.user.account_id, codes)
+        return Response({
+            'results': [{'code': code, 'material': results[code]} for code in codes]
+        })
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Sugerencias por prefijo de nombre o SKU (?q=, ?limit=)"""
+        prefix = request.query_params.get('q', '').strip()
+        if len(prefix) < AUTOCOMPLETE_MIN_LENGTH:
+            return Response([])
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({'error': 'limit debe ser un entero positivo'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, AUTOCOMPLETE_MAX_LIMIT)
+        
+        return Response(autocomplete_materials(self.get_queryset(), prefix, limit))
+    
     @action(detail=False, methods=['get'])
     def search_by_qr(self, request):
         """Buscar material por código QR"""
@@ -89,5 +230,3 @@ class MaterialViewSet(viewsets.ModelViewSet):
         except Material.DoesNotExist:
             return Response({'error': 'Material no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
-
-from django.db import models
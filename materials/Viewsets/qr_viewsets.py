@@ -0,0 +1,54 @@
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from materials.models import Material
+from materials.qr import (
+    CACHE_CONTROL,
+    CONTENT_TYPES,
+    QR_CODE_PATTERN,
+    normalize_params,
+    qr_cache,
+    qr_etag,
+)
+
+
+@require_GET
+def qr_image(request, qr_code, fmt):
+    """
+    Imagen del código QR renderizada bajo demanda.
+
+    Query params opcionales (solo PNG):
+    - size: ancho/alto en pixeles (materials.qr.ALLOWED_SIZES)
+    - dpi: resolución declarada en el PNG para impresión (materials.qr.ALLOWED_DPI)
+
+    Es pública igual que las imágenes en media. Las variantes en caché se
+    sirven sin consultar la base de datos; antes de renderizar una nueva se
+    verifica que el código pertenezca a un material.
+    """
+    if not QR_CODE_PATTERN.match(qr_code):
+        return JsonResponse({'error': 'Código QR inválido'}, status=404)
+
+    try:
+        fmt, size, dpi = normalize_params(
+            fmt,
+            request.GET.get('size') or None,
+            request.GET.get('dpi') or None,
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Resolver 304 sin renderizar ni leer caché
+    etag = f'"{qr_etag(qr_code, fmt, size, dpi)}"'
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponseNotModified()
+    else:
+        content = qr_cache.lookup(qr_code, fmt, size, dpi)
+        if content is None:
+            if not Material.objects.filter(qr_code=qr_code).exists():
+                return JsonResponse({'error': 'Código QR no encontrado'}, status=404)
+            content, _ = qr_cache.get(qr_code, fmt, size, dpi)
+        response = HttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Location, Material
+from .models import Category, Location, Material, StockMovement
+from .qr import qr_image_url
 
 
 @admin.register(Category)
@@ -110,7 +111,22 @@ class MaterialAdmin(admin.ModelAdmin):
     is_low_stock.short_description = 'Stock Bajo'
 
     def qr_image(self, obj):
-        if obj.qr_image:
-            return format_html('<img src="{}" style="max-height:180px;"/>', obj.qr_image.url)
+        if obj.qr_code:
+            return format_html('<img src="{}" style="max-height:180px;"/>', qr_image_url(obj.qr_code))
         return '-'
     qr_image.short_description = 'QR'
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['material', 'kind', 'quantity_delta', 'available_delta', 'user', 'reference', 'created_at']
+    list_filter = ['kind', 'account']
+    search_fields = ['material__name', 'material__sku', 'reference']
+    raw_id_fields = ['material', 'user']
+
+    # El ledger solo se escribe desde materials.stock
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,47 @@
+"""
+Versiones por cuenta para invalidar cachés derivadas.
+
+Cada cuenta tiene un contador por ámbito (p.ej. el catálogo de materiales)
+que se incrementa en cada escritura. Las claves de caché incluyen la versión,
+así que invalidar es un solo `incr` y las entradas viejas expiran solas.
+La versión también forma los ETags de los listados del catálogo
+(pack_a_stock_api.conditional). En producción requiere una caché compartida
+entre procesos (REDIS_URL).
+"""
+import time
+
+from django.core.cache import cache
+
+CATALOG = 'catalog'
+
+# Préstamos y solicitudes aprobadas (ver loans.reservations)
+RESERVATIONS = 'reservations'
+
+
+def _version_key(scope, account_id):
+    return f'{scope}:version:{account_id}'
+
+
+def _seed(key):
+    # Sembrar con un timestamp para no repetir versiones si la clave se desaloja
+    cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def get_version(scope, account_id):
+    """Versión actual del ámbito para la cuenta"""
+    key = _version_key(scope, account_id)
+    version = cache.get(key)
+    if version is None:
+        _seed(key)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope, account_id):
+    """Invalida todas las entradas del ámbito para la cuenta"""
+    key = _version_key(scope, account_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        _seed(key)
+        return cache.incr(key)
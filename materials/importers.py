@@ -0,0 +1,190 @@
+"""
+Importación masiva de materiales desde CSV o JSONL.
+
+Los archivos se leen en streaming y se procesan por lotes: cada lote se valida,
+resuelve categorías/ubicaciones con una consulta por lote y se inserta con
+`bulk_create`. Los errores se reportan por fila sin abortar el archivo.
+"""
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+from materials.cache import CATALOG, bump_version
+from materials.models import Category, Location, Material
+from materials.Serializers.material_import_serializer import MaterialImportRowSerializer
+from materials.stock import record_opening
+
+
+def iter_csv_rows(binary_file):
+    """Genera (número de fila, dict) desde un archivo CSV con encabezados"""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        # La fila 1 son los encabezados
+        for line_number, row in enumerate(csv.DictReader(text), start=2):
+            yield line_number, row
+    finally:
+        text.detach()
+
+
+def iter_jsonl_rows(binary_file):
+    """Genera (número de línea, dict) desde un archivo JSONL"""
+    for line_number, line in enumerate(binary_file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = ValueError(f"JSON inválido: {e}")
+        if not isinstance(row, (dict, ValueError)):
+            row = ValueError("Cada línea debe ser un objeto JSON")
+        yield line_number, row
+
+
+def detect_format(filename):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+class MaterialImporter:
+    """Importa materiales a una cuenta por lotes"""
+
+    def __init__(self, account, batch_size=1000, max_errors=1000):
+        self.account = account
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def import_file(self, binary_file, file_format='csv'):
+        rows = iter_jsonl_rows(binary_file) if file_format == 'jsonl' else iter_csv_rows(binary_file)
+        return self.import_rows(rows)
+
+    def import_rows(self, rows):
+        batch = []
+        for line_number, row in rows:
+            batch.append((line_number, row))
+            if len(batch) >= self.batch_size:
+                self._process_batch(batch)
+                batch = []
+        if batch:
+            self._process_batch(batch)
+        # bulk_create no emite señales: invalidar cachés del catálogo una vez
+        if self.created:
+            bump_version(CATALOG, self.account.id)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def _error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line_number, 'errors': errors})
+
+    def _validate(self, batch):
+        # Una sola instancia por lote: construir los campos del serializer
+        # por fila cuesta más que la validación misma
+        serializer = MaterialImportRowSerializer()
+        valid = []
+        for line_number, row in batch:
+            if isinstance(row, Exception):
+                self._error(line_number, {'non_field_errors': [str(row)]})
+                continue
+            # Las celdas vacías de CSV toman el valor por defecto
+            data = {key: value for key, value in row.items() if key and value not in ('', None)}
+            try:
+                valid.append((line_number, serializer.run_validation(data)))
+            except serializers.ValidationError as e:
+                self._error(line_number, e.detail)
+        return valid
+
+    def _lookup(self, model, refs):
+        """Resuelve referencias por ID o nombre con una sola consulta"""
+        if not refs:
+            return {}
+        ids = [int(ref) for ref in refs if ref.isdigit()]
+        names = [ref for ref in refs if not ref.isdigit()]
+        resolved = {}
+        for pk, name in model.objects.filter(account=self.account).filter(
+            Q(id__in=ids) | Q(name__in=names)
+        ).values_list('id', 'name'):
+            resolved[str(pk)] = pk
+            resolved[name] = pk
+        return resolved
+
+    def _process_batch(self, batch):
+        valid = self._validate(batch)
+        if not valid:
+            return
+
+        categories = self._lookup(Category, {data['category'] for _, data in valid})
+        locations = self._lookup(Location, {data['location'] for _, data in valid if 'location' in data})
+        existing_skus = set(Material.objects.filter(
+            sku__in=[data['sku'] for _, data in valid]
+        ).values_list('sku', flat=True))
+
+        seen_skus = set()
+        pending = []
+        for line_number, data in valid:
+            errors = {}
+            category_id = categories.get(data['category'])
+            if category_id is None:
+                errors['category'] = [f"Categoría no encontrada: {data['category']}"]
+            location_id = None
+            if 'location' in data:
+                location_id = locations.get(data['location'])
+                if location_id is None:
+                    errors['location'] = [f"Ubicación no encontrada: {data['location']}"]
+            if data['sku'] in existing_skus or data['sku'] in seen_skus:
+                errors['sku'] = [f"SKU duplicado: {data['sku']}"]
+            if errors:
+                self._error(line_number, errors)
+                continue
+
+            seen_skus.add(data['sku'])
+            fields = {key: value for key, value in data.items() if key not in ('category', 'location')}
+            material = Material(
+                account=self.account,
+                category_id=category_id,
+                location_id=location_id,
+                qr_code=Material.generate_qr_code(),
+                available_quantity=data['quantity'],
+                **fields
+            )
+            material.apply_status_rules()
+            material.update_low_stock()
+            pending.append((line_number, material))
+
+        self._insert(pending)
+
+    def _insert(self, pending):
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                materials = Material.objects.bulk_create([material for _, material in pending])
+                record_opening(materials, reference='import')
+            self.created += len(pending)
+        except IntegrityError:
+            # Conflicto concurrente (p.ej. SKU creado por otra petición):
+            # reintentar fila por fila para reportar solo las afectadas
+            for line_number, material in pending:
+                try:
+                    with transaction.atomic():
+                        material.pk = None
+                        Material.objects.bulk_create([material])
+                        record_opening([material], reference='import')
+                    self.created += 1
+                except IntegrityError as e:
+                    self._error(line_number, {'non_field_errors': [str(e)]})
@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import Account
+from materials.models import Category, Material
+from materials.search import autocomplete_materials, search_materials
+from materials.stock import record_opening
+
+WORDS = [
+    'taladro', 'martillo', 'cable', 'guante', 'casco', 'escalera', 'laptop',
+    'proyector', 'cinta', 'tornillo', 'llave', 'sierra', 'multímetro', 'nivel',
+    'pinzas', 'extensión', 'batería', 'cargador', 'monitor', 'teclado',
+]
+
+DEFAULT_SEARCHES = ['taladro', 'cable extensión', 'multimetro', 'BENCH-0001', 'guante casco']
+DEFAULT_PREFIXES = ['ta', 'cab', 'BENCH-00', 'mul', 'pi']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de la búsqueda con ranking y del autocompletado de '
+        'materiales. --seed crea materiales sintéticos (SKU BENCH-*).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, required=True)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Crear N materiales sintéticos antes de medir')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Eliminar los materiales sintéticos al terminar')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--search', action='append', help='Términos a buscar (repetible)')
+        parser.add_argument('--prefix', action='append', help='Prefijos a autocompletar (repetible)')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Cuenta #{options['account']} no encontrada")
+
+        if options['seed']:
+            self._seed(account, options['seed'])
+
+        queryset = Material.objects.filter(account=account)
+        total = queryset.count()
+        self.stdout.write(f'{total} materiales en la cuenta\n')
+
+        for terms in options['search'] or DEFAULT_SEARCHES:
+            timings, top = self._measure(
+                lambda: list(search_materials(queryset, terms).values('name', 'sku', 'search_rank')[:20]),
+                options['iterations']
+            )
+            self._report(f'search "{terms}"', timings)
+            for row in top[:3]:
+                self.stdout.write(f"    {row['search_rank']:.3f}  {row['sku']}  {row['name']}")
+
+        for prefix in options['prefix'] or DEFAULT_PREFIXES:
+            timings, _ = self._measure(
+                lambda: autocomplete_materials(queryset, prefix, 10),
+                options['iterations']
+            )
+            self._report(f'autocomplete "{prefix}"', timings)
+
+        if options['cleanup']:
+            deleted, _ = queryset.filter(sku__startswith='BENCH-').delete()
+            self.stdout.write(f'{deleted} materiales sintéticos eliminados')
+
+    def _seed(self, account, count):
+        category, _ = Category.objects.get_or_create(account=account, name='Benchmark')
+        start = Material.objects.filter(sku__startswith='BENCH-').count()
+        batch = []
+        for i in range(start, start + count):
+            name = ' '.join(random.sample(WORDS, 3)).capitalize()
+            batch.append(Material(
+                account=account,
+                category=category,
+                name=f'{name} {i}',
+                sku=f'BENCH-{i:07d}',
+                qr_code=Material.generate_qr_code(),
+                description=' '.join(random.sample(WORDS, 6)),
+            ))
+            if len(batch) >= 5000:
+                record_opening(Material.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            record_opening(Material.objects.bulk_create(batch))
+        self.stdout.write(f'{count} materiales sintéticos creados')
+
+    @staticmethod
+    def _measure(run, iterations):
+        result = run()  # Calentamiento
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, result
+
+    def _report(self, label, timings):
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(
+            f'{label:<32} p50={statistics.median(timings):.2f}ms '
+            f'p95={p95:.2f}ms max={timings[-1]:.2f}ms'
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import Account
+from materials.importers import MaterialImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Importa materiales masivamente desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv o .jsonl')
+        parser.add_argument('--account', type=int, required=True, help='ID de la cuenta destino')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Formato del archivo (default: según la extensión)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Filas por lote (default: 1000)')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Cuenta #{options['account']} no encontrada")
+
+        file_format = options['format'] or detect_format(options['path'])
+        importer = MaterialImporter(account, batch_size=options['batch_size'])
+
+        started = time.monotonic()
+        with open(options['path'], 'rb') as fh:
+            result = importer.import_file(fh, file_format)
+        elapsed = time.monotonic() - started
+
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f"Fila {error['row']}: {error['errors']}"))
+        if result['errors_truncated']:
+            self.stdout.write(self.style.WARNING('... más errores omitidos'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {result['created']} materiales creados, {result['failed']} filas con error "
+            f"en {elapsed:.1f}s"
+        ))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Sum, Value, When
+from materials.cache import CATALOG, bump_version
+from materials.models import Material, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los saldos de cada material con la suma de sus movimientos '
+        'de inventario y reconstruye los que no coinciden.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, help='Solo materiales de esta cuenta')
+        parser.add_argument('--dry-run', action='store_true', help='Solo reportar diferencias')
+
+    def handle(self, *args, **options):
+        materials = Material.objects.all()
+        movements = StockMovement.objects.all()
+        if options['account']:
+            materials = materials.filter(account_id=options['account'])
+            movements = movements.filter(account_id=options['account'])
+
+        ledger = {
+            row['material_id']: (row['quantity'], row['available'])
+            for row in movements.values('material_id').annotate(
+                quantity=Sum('quantity_delta'), available=Sum('available_delta')
+            ).order_by()
+        }
+
+        drifted = invalid = 0
+        accounts = set()
+        rows = materials.values_list('id', 'account_id', 'sku', 'quantity', 'available_quantity')
+        for material_id, account_id, sku, quantity, available in rows.iterator(chunk_size=2000):
+            expected = ledger.get(material_id, (0, 0))
+            if expected == (quantity, available):
+                continue
+            drifted += 1
+            self.stdout.write(
+                f'{sku}: saldo {quantity}/{available}, ledger {expected[0]}/{expected[1]}'
+            )
+            if not 0 <= expected[1] <= expected[0]:
+                invalid += 1
+                self.stdout.write(self.style.ERROR(f'  {sku}: el ledger no es un saldo válido, se omite'))
+                continue
+            if not options['dry_run']:
+                Material.objects.filter(pk=material_id).update(
+                    quantity=expected[0],
+                    available_quantity=expected[1],
+                    low_stock=Case(
+                        When(min_stock_level__gte=expected[1], then=Value(True)),
+                        default=Value(False),
+                    ),
+                )
+                accounts.add(account_id)
+
+        for account_id in accounts:
+            bump_version(CATALOG, account_id)
+
+        action = 'encontrados' if options['dry_run'] else 'reconstruidos'
+        self.stdout.write(self.style.SUCCESS(
+            f'{drifted} materiales con diferencias ({drifted - invalid} {action}, {invalid} inválidos)'
+        ))
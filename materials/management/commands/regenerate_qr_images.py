@@ -0,0 +1,136 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from audit.changes import untracked
+from materials.models import Material, qr_upload_to
+from materials.qr import QR_RENDER_VERSION, render_qr_png
+
+
+def _render(code):
+    """Renderiza un QR en un proceso del pool"""
+    return render_qr_png(code)
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenera en paralelo las imágenes PNG de QR almacenadas (qr_image) '
+        'en el storage configurado. Reanudable desde un checkpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, help='Solo materiales de esta cuenta')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Solo materiales sin imagen almacenada')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                            help='Procesos para renderizar (default: CPUs)')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Escrituras simultáneas al storage (default: 8)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Materiales por lote (default: 500)')
+        parser.add_argument('--checkpoint', default=os.path.join(
+                                settings.QR_CACHE_DIR, 'regenerate_qr_images.json'),
+                            help='Archivo de checkpoint')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continuar desde el último checkpoint')
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint']
+        last_pk = 0
+        processed = 0
+        if options['resume']:
+            checkpoint = self._read_checkpoint(checkpoint_path)
+            if checkpoint:
+                last_pk = checkpoint['last_pk']
+                processed = checkpoint['processed']
+                self.stdout.write(f'Reanudando después del material #{last_pk} ({processed} procesados)')
+
+        queryset = Material.objects.filter(pk__gt=last_pk)
+        if options['account']:
+            queryset = queryset.filter(account_id=options['account'])
+        if options['missing_only']:
+            queryset = queryset.filter(Q(qr_image__isnull=True) | Q(qr_image=''))
+
+        rows = queryset.order_by('pk').values_list(
+            'pk', 'account_id', 'qr_code', 'qr_image'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        started = time.monotonic()
+        run_processed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as renderers, \
+                ThreadPoolExecutor(max_workers=options['concurrency']) as writers:
+            for chunk in self._chunks(rows, options['chunk_size']):
+                codes = [row[2] for row in chunk]
+                images = renderers.map(_render, codes, chunksize=max(1, len(codes) // options['workers']))
+                # El pool de hilos acota las escrituras concurrentes al storage
+                names = list(writers.map(self._store, chunk, images))
+
+                changed = [
+                    Material(pk=row[0], qr_image=name)
+                    for row, name in zip(chunk, names)
+                    if name != row[3]
+                ]
+                if changed:
+                    # Imagen derivada del código: no se registra en la auditoría
+                    with untracked():
+                        Material.objects.bulk_update(changed, ['qr_image'])
+
+                last_pk = chunk[-1][0]
+                processed += len(chunk)
+                run_processed += len(chunk)
+                self._write_checkpoint(checkpoint_path, last_pk, processed)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{processed} materiales (último #{last_pk}) - '
+                    f'{run_processed / elapsed:.1f} QR/s'
+                )
+
+        elapsed = time.monotonic() - started
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {run_processed} imágenes regeneradas en {elapsed:.1f}s '
+            f'({run_processed / elapsed if elapsed else 0:.1f} QR/s, render v{QR_RENDER_VERSION})'
+        ))
+
+    @staticmethod
+    def _chunks(rows, size):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _store(row, image):
+        pk, account_id, qr_code, _ = row
+        name = qr_upload_to(Material(account_id=account_id, qr_code=qr_code), f'{qr_code}.png')
+        # Con AWS_S3_FILE_OVERWRITE=False el storage renombraría el archivo
+        default_storage.delete(name)
+        return default_storage.save(name, ContentFile(image))
+
+    @staticmethod
+    def _read_checkpoint(path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_checkpoint(path, last_pk, processed):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'last_pk': last_pk, 'processed': processed}, fh)
+        os.replace(tmp_path, path)
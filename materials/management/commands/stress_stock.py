@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from accounts.models import Account
+from materials import stock
+from materials.models import Category, Material, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga concurrente de movimientos de inventario. Varios hilos '
+        'consumen, prestan y devuelven unidades de los mismos materiales y al '
+        'final se verifica que no haya actualizaciones perdidas. --naive repite '
+        'la prueba con lectura-modificación-escritura para comparar. '
+        'Usar con PostgreSQL: SQLite serializa las escrituras.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, required=True)
+        parser.add_argument('--materials', type=int, default=4)
+        parser.add_argument('--units', type=int, default=10000, help='Unidades iniciales por material')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--ops', type=int, default=500, help='Operaciones por hilo')
+        parser.add_argument('--baskets', type=int, default=0,
+                            help='Consumir canastas de N materiales con consume_batch')
+        parser.add_argument('--naive', action='store_true',
+                            help='Actualizar leyendo y escribiendo el saldo en Python')
+        parser.add_argument('--keep', action='store_true', help='No eliminar los materiales de prueba')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Cuenta #{options['account']} no encontrada")
+
+        materials = self._setup(account, options['materials'], options['units'])
+        initial = {m.pk: (m.quantity, m.available_quantity) for m in materials}
+        expected = defaultdict(lambda: [0, 0])
+        counters = Counter()
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = defaultdict(lambda: [0, 0])
+            local_counters = Counter()
+            own = list(Material.objects.filter(pk__in=initial).select_related('category'))
+            try:
+                for _ in range(options['ops']):
+                    try:
+                        if options['baskets']:
+                            changes = self._consume_basket(own, rng, options['baskets'])
+                        else:
+                            material = rng.choice(own)
+                            changes = {material.pk: self._operate(material, rng, options['naive'])}
+                    except ValueError:
+                        local_counters['rejected'] += 1
+                        continue
+                    except DatabaseError:
+                        local_counters['errors'] += 1
+                        continue
+                    local_counters['applied'] += 1
+                    for pk, deltas in changes.items():
+                        local[pk][0] += deltas[0]
+                        local[pk][1] += deltas[1]
+            finally:
+                connection.close()
+            with lock:
+                counters.update(local_counters)
+                for pk, (quantity, available) in local.items():
+                    expected[pk][0] += quantity
+                    expected[pk][1] += available
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = counters['applied'] + counters['rejected'] + counters['errors']
+        self.stdout.write(
+            f"{total} operaciones en {elapsed:.2f}s ({total / elapsed:.0f} ops/s): "
+            f"{counters['applied']} aplicadas, {counters['rejected']} rechazadas, "
+            f"{counters['errors']} errores de BD"
+        )
+
+        ok = self._verify(materials, initial, expected, options['naive'])
+        if not options['keep']:
+            self._cleanup(account)
+        if not ok:
+            raise CommandError('Se detectaron actualizaciones perdidas o saldos inválidos')
+        self.stdout.write(self.style.SUCCESS('Sin actualizaciones perdidas'))
+
+    def _setup(self, account, count, units):
+        consumables, _ = Category.objects.get_or_create(
+            account=account, name='Stress (consumibles)', defaults={'is_consumable': True}
+        )
+        equipment, _ = Category.objects.get_or_create(
+            account=account, name='Stress (equipos)', defaults={'is_consumable': False}
+        )
+        return [
+            Material.objects.create(
+                account=account,
+                category=consumables if i % 2 == 0 else equipment,
+                name=f'Stress {i}',
+                sku=f'STRESS-{account.pk}-{i:04d}',
+                quantity=units,
+                available_quantity=units,
+            )
+            for i in range(count)
+        ]
+
+    def _operate(self, material, rng, naive):
+        """Aplica una operación aleatoria y retorna (delta cantidad, delta disponible)"""
+        units = rng.randint(1, 3)
+        if material.category.is_consumable:
+            deltas = (-units, -units)
+        else:
+            deltas = (0, -units) if rng.random() < 0.5 else (0, units)
+
+        if naive:
+            current = Material.objects.values('quantity', 'available_quantity').get(pk=material.pk)
+            quantity = current['quantity'] + deltas[0]
+            available = current['available_quantity'] + deltas[1]
+            if not 0 <= available <= quantity:
+                raise ValueError('Stock insuficiente')
+            Material.objects.filter(pk=material.pk).update(quantity=quantity, available_quantity=available)
+        elif material.category.is_consumable:
+            stock.consume(material, units)
+        elif deltas[1] < 0:
+            stock.issue(material, units)
+        else:
+            stock.return_to_stock(material, units)
+        return deltas
+
+    def _consume_basket(self, own, rng, size):
+        """Consume una canasta de consumibles en orden aleatorio (partial)"""
+        consumables = [material for material in own if material.category.is_consumable]
+        basket = rng.sample(consumables, min(size, len(consumables)))
+        items = [(material.pk, rng.randint(1, 3)) for material in basket]
+        _, movements = stock.consume_batch(basket[0].account_id, items, partial=True)
+        if not movements:
+            raise ValueError('Stock insuficiente')
+        return {
+            movement.material_id: (movement.quantity_delta, movement.available_delta)
+            for movement in movements
+        }
+
+    def _verify(self, materials, initial, expected, naive):
+        ok = True
+        ledger = {
+            row['material_id']: (row['quantity'], row['available'])
+            for row in StockMovement.objects.filter(material_id__in=initial).values('material_id').annotate(
+                quantity=Sum('quantity_delta'), available=Sum('available_delta')
+            ).order_by()
+        }
+        for material in materials:
+            material.refresh_from_db()
+            actual = (material.quantity, material.available_quantity)
+            wanted = (
+                initial[material.pk][0] + expected[material.pk][0],
+                initial[material.pk][1] + expected[material.pk][1],
+            )
+            line = f'{material.sku}: esperado {wanted[0]}/{wanted[1]}, actual {actual[0]}/{actual[1]}'
+            if not naive:
+                line += f', ledger {ledger[material.pk][0]}/{ledger[material.pk][1]}'
+            lost = actual != wanted or (not naive and ledger[material.pk] != actual)
+            invalid = not 0 <= actual[1] <= actual[0]
+            if lost or invalid:
+                ok = False
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        return ok
+
+    def _cleanup(self, account):
+        Material.objects.filter(account=account, sku__startswith=f'STRESS-{account.pk}-').delete()
+        Category.objects.filter(account=account, name__startswith='Stress (').delete()
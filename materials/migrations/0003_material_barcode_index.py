@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('materials', '0002_material_qr_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['account', 'barcode'], name='materials_m_account_b91686_idx'),
+        ),
+    ]
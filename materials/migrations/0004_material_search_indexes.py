@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-18 08:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+import pack_a_stock_api.db_operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('materials', '0003_material_barcode_index'),
+    ]
+
+    operations = [
+        # No-op fuera de PostgreSQL
+        django.contrib.postgres.operations.TrigramExtension(),
+        pack_a_stock_api.db_operations.PostgresOnlyAddIndex(
+            model_name='material',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='spanish', weight='A'), '||', django.contrib.postgres.search.SearchVector('sku', config='simple', weight='A'), django.contrib.postgres.search.SearchConfig('spanish')), '||', django.contrib.postgres.search.SearchVector('description', config='spanish', weight='C'), django.contrib.postgres.search.SearchConfig('spanish')), name='material_search_idx'),
+        ),
+        pack_a_stock_api.db_operations.PostgresOnlyAddIndex(
+            model_name='material',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='material_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        pack_a_stock_api.db_operations.PostgresOnlyAddIndex(
+            model_name='material',
+            index=models.Index(models.F('account'), django.db.models.functions.comparison.Collate(django.db.models.functions.text.Upper('name'), 'C'), name='material_name_prefix_idx'),
+        ),
+        pack_a_stock_api.db_operations.PostgresOnlyAddIndex(
+            model_name='material',
+            index=models.Index(models.F('account'), django.db.models.functions.comparison.Collate(django.db.models.functions.text.Upper('sku'), 'C'), name='material_sku_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def open_ledger(apps, schema_editor):
+    """Acota los saldos existentes y registra un movimiento de apertura por material"""
+    Material = apps.get_model('materials', 'Material')
+    StockMovement = apps.get_model('materials', 'StockMovement')
+
+    Material.objects.filter(quantity__lt=0).update(quantity=0)
+    Material.objects.filter(available_quantity__lt=0).update(available_quantity=0)
+    Material.objects.filter(available_quantity__gt=F('quantity')).update(available_quantity=F('quantity'))
+
+    batch = []
+    rows = Material.objects.values_list('id', 'account_id', 'quantity', 'available_quantity')
+    for material_id, account_id, quantity, available in rows.iterator(chunk_size=2000):
+        if not quantity and not available:
+            continue
+        batch.append(StockMovement(
+            account_id=account_id,
+            material_id=material_id,
+            kind='receive',
+            quantity_delta=quantity,
+            available_delta=available,
+            reference='opening',
+        ))
+        if len(batch) >= 2000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('materials', '0004_material_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receive', 'Entrada'), ('consume', 'Consumo'), ('issue', 'Préstamo'), ('return', 'Devolución'), ('adjust', 'Ajuste')], max_length=20)),
+                ('quantity_delta', models.IntegerField(default=0)),
+                ('available_delta', models.IntegerField(default=0)),
+                ('reference', models.CharField(blank=True, help_text='Origen, p.ej. loan:42', max_length=100, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Inventario',
+                'verbose_name_plural': 'Movimientos de Inventario',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='accounts.account'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='material',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='materials.material'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['material', 'created_at'], name='materials_s_materia_ece3d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['account', 'created_at'], name='materials_s_account_62431e_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='material',
+            constraint=models.CheckConstraint(check=models.Q(('available_quantity__gte', 0), ('available_quantity__lte', models.F('quantity'))), name='material_stock_bounds'),
+        ),
+    ]
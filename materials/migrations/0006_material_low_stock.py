@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 09:02
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+
+
+def fill_low_stock(apps, schema_editor):
+    Material = apps.get_model('materials', 'Material')
+    Material.objects.update(low_stock=Case(
+        When(available_quantity__lte=F('min_stock_level'), then=Value(True)),
+        default=Value(False),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('materials', '0005_stock_movements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='low_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['account', 'location', 'category'], name='material_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('materials', '0006_material_low_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['account', 'name', 'id'], name='materials_m_account_8a0e94_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['account', 'created_at', 'id'], name='materials_m_account_d6a0e3_idx'),
+        ),
+    ]
@@ -1,16 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.core.files.base import ContentFile
 from accounts.models import Account
+from audit.changes import AuditedModel
 import uuid
-from io import BytesIO
-import qrcode
 
 
 def qr_upload_to(instance, filename):
     """Ruta para almacenar imagen PNG del QR por cuenta y código"""
     code = getattr(instance, 'qr_code', None) or filename
-    account_id = instance.account.id if getattr(instance, 'account', None) else 'unknown'
+    account_id = getattr(instance, 'account_id', None) or 'unknown'
     return f"qr_codes/{account_id}/{code}.png"
 
 
@@ -83,7 +81,7 @@ class Location(models.Model):
         return ', '.join(parts)
 
 
-class Material(models.Model):
+class Material(AuditedModel):
     """Materiales/Equipos disponibles para préstamo"""
     
     STATUS_CHOICES = [
@@ -118,7 +116,8 @@ class Material(models.Model):
     # Para consumibles: QR por lote
     # Para materiales regulares: QR individual
     qr_code = models.CharField(max_length=100, unique=True, editable=False)
-    # Imagen PNG del QR (por lote para consumibles)
+    # Imagen PNG del QR almacenada (legado). Las imágenes se sirven bajo demanda
+    # desde materials.qr; este campo solo lo llena regenerate_qr_images
     qr_image = models.ImageField(upload_to=qr_upload_to,
                                  blank=True, null=True)
     
@@ -136,6 +135,8 @@ class Material(models.Model):
         validators=[MinValueValidator(0)],
         help_text="Cantidad sugerida para reordenar cuando stock esté bajo"
     )
+    # available_quantity <= min_stock_level, mantenido en cada movimiento (materials.stock)
+    low_stock = models.BooleanField(default=False, editable=False)
     
     # Imagen (S3)
     image_url = models.URLField(blank=True, null=True)
@@ -150,6 +151,11 @@ class Material(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Captura de cambios (audit.changes); los saldos quedan en los
+    # movimientos de stock (materials.stock)
+    audit_table = 'materials'
+    audit_exclude = ('updated_at', 'quantity', 'available_quantity', 'low_stock')
+
     class Meta:
         verbose_name = 'Material'
         verbose_name_plural = 'Materiales'
@@ -160,8 +166,26 @@ class Material(models.Model):
             models.Index(fields=['account', 'location']),
             models.Index(fields=['qr_code']),
             models.Index(fields=['sku']),
+            models.Index(fields=['account', 'barcode']),
             models.Index(fields=['status']),
             models.Index(fields=['is_available_for_loan']),
+            # Paginación por llave (orden, id), ver pack_a_stock_api.pagination
+            models.Index(fields=['account', 'name', 'id']),
+            models.Index(fields=['account', 'created_at', 'id']),
+            # Solo los materiales con stock bajo (tablero y sugerencias de compra)
+            models.Index(
+                fields=['account', 'location', 'category'],
+                condition=models.Q(low_stock=True),
+                name='material_low_stock_idx',
+            ),
+            # Los índices de búsqueda y autocompletado (solo PostgreSQL) se
+            # crean en la migración 0004, ver materials.search
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(available_quantity__gte=0) & models.Q(available_quantity__lte=models.F('quantity')),
+                name='material_stock_bounds',
+            ),
         ]
 
     def __str__(self):
@@ -172,40 +196,95 @@ class Material(models.Model):
         """Determina si el material es consumible basado en su categoría"""
         return self.category.is_consumable if self.category else False
 
+    @staticmethod
+    def generate_qr_code():
+        """Genera un código QR único para un material nuevo"""
+        return f"MAT-{uuid.uuid4().hex[:12].upper()}"
+
+    def apply_status_rules(self):
+        """Materiales dañados, retirados o en mantenimiento no están disponibles"""
+        if self.status in ['damaged', 'retired', 'maintenance']:
+            self.available_quantity = 0
+            self.is_available_for_loan = False
+
+    def update_low_stock(self):
+        self.low_stock = self.available_quantity <= self.min_stock_level
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Saldos leídos: save() solo aplica la diferencia (ver materials.stock)
+        instance._loaded_stock = (
+            instance.__dict__.get('quantity'),
+            instance.__dict__.get('available_quantity'),
+        )
+        # Nivel mínimo leído: low_stock solo se recalcula si cambia
+        instance._loaded_min_stock = instance.__dict__.get('min_stock_level')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Los saldos recargados también pasan a ser los leídos
+        loaded = list(getattr(self, '_loaded_stock', (None, None)))
+        for index, name in enumerate(('quantity', 'available_quantity')):
+            if fields is None or name in fields:
+                loaded[index] = self.__dict__.get(name)
+        self._loaded_stock = tuple(loaded)
+        if fields is None or 'min_stock_level' in fields:
+            self._loaded_min_stock = self.__dict__.get('min_stock_level')
+
     def save(self, *args, **kwargs):
+        from materials import stock
+
         # Generar QR code único si no existe
-        created_qr = False
         if not self.qr_code:
-            self.qr_code = f"MAT-{uuid.uuid4().hex[:12].upper()}"
-            created_qr = True
+            self.qr_code = self.generate_qr_code()
 
         # Actualizar available_quantity basado en el status
-        if self.status in ['damaged', 'retired', 'maintenance']:
-            self.available_quantity = 0
-            self.is_available_for_loan = False
+        self.apply_status_rules()
 
-        # Guardar primero para disponer de ID y ruta de almacenamiento
-        super().save(*args, **kwargs)
-
-        # Generar imagen PNG del QR si aún no existe (o si acabamos de crear el qr)
-        try:
-            if (created_qr or not self.qr_image) and self.qr_code:
-                qr = qrcode.QRCode(box_size=8, border=2)
-                qr.add_data(self.qr_code)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white").convert('RGB')
-                buffer = BytesIO()
-                img.save(buffer, format='PNG')
-                buffer.seek(0)
-                file_name = f"{self.qr_code}.png"
-                # Use save=False para evitar recursión
-                self.qr_image.save(file_name, ContentFile(buffer.read()), save=False)
-                buffer.close()
-                # Guardar cambios de campo qr_image
-                super().save(update_fields=['qr_image'])
-        except Exception:
-            # No detener el flujo si falla la generación de la imagen
-            pass
+        # La imagen del QR se renderiza bajo demanda (materials.qr)
+        if self._state.adding:
+            self.update_low_stock()
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                stock.record_opening([self])
+            self._loaded_min_stock = self.min_stock_level
+            return
+
+        # Los saldos de un material existente solo cambian con movimientos:
+        # se guardan los demás campos y la diferencia se aplica como ajuste
+        quantity_delta, available_delta = stock.pending_deltas(self)
+        update_fields = kwargs.pop('update_fields', None)
+        if update_fields is None:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+            ]
+        update_fields = [
+            name for name in update_fields
+            if name not in stock.STOCK_FIELDS + stock.DERIVED_FIELDS
+        ]
+
+        with transaction.atomic():
+            super().save(*args, update_fields=update_fields, **kwargs)
+            if self.status in stock.BLOCKED_STATUSES:
+                moved = stock.adjust(self, quantity_delta=quantity_delta)
+                if available_delta:
+                    moved = stock.clear_available(self) or moved
+            else:
+                if quantity_delta and not available_delta:
+                    # Unidades agregadas o dadas de baja
+                    available_delta = quantity_delta
+                moved = stock.adjust(self, quantity_delta, available_delta)
+            min_stock_changed = (
+                'min_stock_level' in update_fields and
+                self.min_stock_level != getattr(self, '_loaded_min_stock', None)
+            )
+            if min_stock_changed and not moved:
+                stock.refresh_low_stock(self)
+        self._loaded_min_stock = self.__dict__.get('min_stock_level')
 
     @property
     def is_low_stock(self):
@@ -227,36 +306,70 @@ class Material(models.Model):
         """Verifica si se necesita reordenar (para consumibles)"""
         return self.is_consumable and self.is_low_stock
     
-    def consume(self, quantity):
+    def consume(self, quantity, user=None):
         """Reduce el stock de un consumible (no se devuelve)"""
+        from materials import stock
+
         if not self.is_consumable:
             raise ValueError("Este material no es consumible")
         
-        if quantity > self.available_quantity:
-            raise ValueError(
-                f"Stock insuficiente para {self.name}. "
-                f"Disponible: {self.available_quantity}, Solicitado: {quantity}"
-            )
-        
-        self.available_quantity -= quantity
-        self.quantity -= quantity
-        
-        if self.available_quantity == 0:
-            self.status = 'retired'
-            self.is_available_for_loan = False
-        
-        self.save()
+        return stock.consume(self, quantity, user=user)
     
-    def return_material(self, quantity=1):
+    def return_material(self, quantity=1, user=None):
         """Devolver material no-consumible (incrementa available_quantity)"""
+        from materials import stock
+
         if self.is_consumable:
             raise ValueError("Los consumibles no se devuelven")
         
-        self.available_quantity += quantity
-        if self.available_quantity > self.quantity:
-            self.available_quantity = self.quantity
-        
-        if self.status == 'on_loan' and self.available_quantity == self.quantity:
-            self.status = 'available'
-        
-        self.save()
+        return stock.return_to_stock(self, quantity, user=user)
+
+
+class StockMovement(models.Model):
+    """Movimientos de inventario. La suma por material es su saldo"""
+
+    RECEIVE = 'receive'
+    CONSUME = 'consume'
+    ISSUE = 'issue'
+    RETURN = 'return'
+    ADJUST = 'adjust'
+
+    KIND_CHOICES = [
+        (RECEIVE, 'Entrada'),
+        (CONSUME, 'Consumo'),
+        (ISSUE, 'Préstamo'),
+        (RETURN, 'Devolución'),
+        (ADJUST, 'Ajuste'),
+    ]
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='stock_movements')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+
+    # Cambio aplicado a cada saldo del material
+    quantity_delta = models.IntegerField(default=0)
+    available_delta = models.IntegerField(default=0)
+
+    user = models.ForeignKey(
+        'accounts.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_movements'
+    )
+    reference = models.CharField(max_length=100, blank=True, null=True, help_text="Origen, p.ej. loan:42")
+    notes = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Movimiento de Inventario'
+        verbose_name_plural = 'Movimientos de Inventario'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['material', 'created_at']),
+            models.Index(fields=['account', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.available_delta:+d} - {self.material_id}"
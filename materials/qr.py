@@ -0,0 +1,247 @@
+"""
+Renderizado de códigos QR bajo demanda.
+
+Las imágenes se construyen a partir de `Material.qr_code` cuando se solicitan
+(ya no en `Material.save`) y se guardan en una caché LRU en memoria acotada
+y en una caché en disco compartida entre procesos del mismo servidor. Solo
+se admiten los tamaños y DPI de ALLOWED_SIZES / ALLOWED_DPI y la caché en
+disco se poda (por antigüedad de uso) al pasar de QR_DISK_CACHE_MAX_FILES.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from PIL import Image
+from django.conf import settings
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+# Parámetros del QR. Si cambian, incrementar QR_RENDER_VERSION para invalidar
+# cachés (memoria, disco y navegadores) y regenerar imágenes almacenadas.
+QR_BOX_SIZE = 8
+QR_BORDER = 2
+QR_RENDER_VERSION = 1
+
+QR_CODE_PATTERN = re.compile(r'^MAT-[0-9A-F]{12}$')
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# Variantes admitidas: acotan el render y el número de archivos en disco
+ALLOWED_SIZES = (128, 256, 512, 1024)
+ALLOWED_DPI = (72, 150, 300, 600)
+
+# La caché en disco se revisa cada PRUNE_EVERY escrituras del proceso y se
+# poda hasta PRUNE_RATIO del máximo
+PRUNE_EVERY = 100
+PRUNE_RATIO = 0.9
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def normalize_params(fmt='png', size=None, dpi=None):
+    """
+    Valida y normaliza los parámetros de una variante.
+    Lanza ValueError si algún parámetro es inválido.
+    """
+    fmt = (fmt or 'png').lower()
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    # SVG es vectorial: tamaño y DPI no aplican
+    if fmt == 'svg':
+        return fmt, None, None
+
+    return fmt, _allowed('size', size, ALLOWED_SIZES), _allowed('dpi', dpi, ALLOWED_DPI)
+
+
+def _allowed(name, value, allowed):
+    """Entero de `allowed` (o None); ValueError con el mismo mensaje si no lo es"""
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = None
+    if value not in allowed:
+        raise ValueError(f"{name} debe ser uno de {', '.join(map(str, allowed))}")
+    return value
+
+
+def qr_etag(code, fmt='png', size=None, dpi=None):
+    """ETag fuerte de una variante; se calcula sin renderizar la imagen"""
+    key = f"{QR_RENDER_VERSION}:{QR_BOX_SIZE}:{QR_BORDER}:{code}:{fmt}:{size}:{dpi}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _build_qr(code):
+    qr = qrcode.QRCode(box_size=QR_BOX_SIZE, border=QR_BORDER)
+    qr.add_data(code)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr_png(code, size=None, dpi=None):
+    """Renderiza el QR como PNG. Función pura para poder usarse en procesos"""
+    img = _build_qr(code).make_image(fill_color="black", back_color="white")
+    img = img.get_image().convert('1')
+    if size and size != img.size[0]:
+        # NEAREST mantiene los módulos nítidos para los lectores
+        img = img.resize((size, size), Image.NEAREST)
+    buffer = BytesIO()
+    save_kwargs = {'format': 'PNG', 'optimize': True}
+    if dpi:
+        save_kwargs['dpi'] = (dpi, dpi)
+    img.save(buffer, **save_kwargs)
+    return buffer.getvalue()
+
+
+def render_qr_svg(code):
+    """Renderiza el QR como SVG"""
+    img = _build_qr(code).make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    return img.to_string(encoding='unicode').encode()
+
+
+def render_qr(code, fmt='png', size=None, dpi=None):
+    """Renderiza una variante del QR sin pasar por caché"""
+    if fmt == 'svg':
+        return render_qr_svg(code)
+    return render_qr_png(code, size=size, dpi=dpi)
+
+
+class QRImageCache:
+    """Caché LRU en memoria acotada con respaldo en disco acotado"""
+
+    def __init__(self, max_items, directory=None, max_files=None):
+        self.max_items = max_items
+        self.directory = directory
+        self.max_files = max_files
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _disk_path(self, etag, fmt):
+        return os.path.join(self.directory, etag[:2], f"{etag}.{fmt}")
+
+    def _remember(self, etag, content):
+        with self._lock:
+            self._items[etag] = content
+            self._items.move_to_end(etag)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _read_disk(self, etag, fmt):
+        if not self.directory:
+            return None
+        path = self._disk_path(etag, fmt)
+        try:
+            with open(path, 'rb') as fh:
+                content = fh.read()
+            # La fecha de modificación marca el último uso para la poda
+            os.utime(path)
+        except OSError:
+            return None
+        return content
+
+    def _write_disk(self, etag, fmt, content):
+        if not self.directory:
+            return
+        path = self._disk_path(etag, fmt)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escritura atómica para que otros procesos nunca lean archivos a medias
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("No se pudo escribir el QR %s en la caché de disco", etag, exc_info=True)
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self.max_files and self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Borra los archivos usados hace más tiempo si la caché en disco excede max_files"""
+        if not self.directory or not self.max_files:
+            return 0
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    files.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+        excess = len(files) - int(self.max_files * PRUNE_RATIO)
+        if len(files) <= self.max_files or excess <= 0:
+            return 0
+        files.sort()
+        removed = 0
+        for _, path in files[:excess]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                # Otro proceso ya lo borró
+                continue
+        return removed
+
+    def lookup(self, code, fmt='png', size=None, dpi=None):
+        """Contenido de la variante si está en memoria o en disco, o None"""
+        etag = qr_etag(code, fmt, size, dpi)
+
+        with self._lock:
+            content = self._items.get(etag)
+            if content is not None:
+                self._items.move_to_end(etag)
+                return content
+
+        content = self._read_disk(etag, fmt)
+        if content is not None:
+            self._remember(etag, content)
+        return content
+
+    def get(self, code, fmt='png', size=None, dpi=None):
+        """Retorna (contenido, etag) de la variante, renderizando si es necesario"""
+        etag = qr_etag(code, fmt, size, dpi)
+        content = self.lookup(code, fmt, size, dpi)
+        if content is None:
+            content = render_qr(code, fmt, size, dpi)
+            self._write_disk(etag, fmt, content)
+            self._remember(etag, content)
+        return content, etag
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+qr_cache = QRImageCache(
+    max_items=getattr(settings, 'QR_MEMORY_CACHE_ITEMS', 512),
+    directory=getattr(settings, 'QR_CACHE_DIR', None),
+    max_files=getattr(settings, 'QR_DISK_CACHE_MAX_FILES', None),
+)
+
+
+def qr_image_url(code, fmt='png', size=None, dpi=None):
+    """Ruta relativa del endpoint de renderizado para una variante"""
+    url = reverse('material-qr-image', kwargs={'qr_code': code, 'fmt': fmt})
+    params = [f"v={QR_RENDER_VERSION}"]
+    if size:
+        params.append(f"size={size}")
+    if dpi:
+        params.append(f"dpi={dpi}")
+    return f"{url}?{'&'.join(params)}"
@@ -0,0 +1,52 @@
+"""
+Sugerencias de compra a partir del índice de stock bajo.
+
+Solo lee materiales con `low_stock` (índice parcial), así el costo depende de
+cuántos materiales están bajos y no del tamaño del inventario.
+"""
+from itertools import groupby
+
+SUGGESTION_FIELDS = (
+    'id', 'name', 'sku', 'available_quantity', 'min_stock_level', 'reorder_quantity',
+    'unit_of_measure', 'location_id', 'location__name', 'category_id', 'category__name',
+)
+
+
+def suggested_quantity(row):
+    """reorder_quantity, o lo necesario para salir del nivel mínimo si es mayor"""
+    shortfall = row['min_stock_level'] - row['available_quantity'] + 1
+    return max(row['reorder_quantity'], shortfall)
+
+
+def suggest_reorders(queryset):
+    """Consumibles con stock bajo agrupados por ubicación y categoría"""
+    rows = queryset.filter(
+        low_stock=True, is_active=True, category__is_consumable=True
+    ).values(*SUGGESTION_FIELDS).order_by(
+        # Los IDs desempatan ubicaciones o categorías con el mismo nombre
+        'location__name', 'location_id', 'category__name', 'category_id', 'name'
+    )
+
+    groups = []
+    key = lambda row: (row['location_id'], row['category_id'])
+    for (location_id, category_id), items in groupby(rows, key=key):
+        items = list(items)
+        suggestions = [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'sku': row['sku'],
+                'available_quantity': row['available_quantity'],
+                'min_stock_level': row['min_stock_level'],
+                'unit_of_measure': row['unit_of_measure'],
+                'suggested_quantity': suggested_quantity(row),
+            }
+            for row in items
+        ]
+        groups.append({
+            'location': {'id': location_id, 'name': items[0]['location__name']},
+            'category': {'id': category_id, 'name': items[0]['category__name']},
+            'items': suggestions,
+            'total_suggested': sum(item['suggested_quantity'] for item in suggestions),
+        })
+    return groups
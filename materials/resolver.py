@@ -0,0 +1,89 @@
+"""
+Resolución de códigos escaneados (QR, SKU o código de barras) a materiales.
+
+Pensado para el escaneo en lotes de los lectores: devuelve registros compactos
+y los guarda en una caché por cuenta que se invalida al guardar o eliminar
+cualquier material de la cuenta (ver materials.signals).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from materials.cache import CATALOG, get_version
+from materials.models import Material
+
+MAX_CODES = 200
+
+# Marca para cachear también los códigos que no existen
+MISSING = 0
+
+RESOLVE_FIELDS = (
+    'id', 'name', 'sku', 'qr_code', 'barcode', 'available_quantity', 'status',
+    'is_available_for_loan', 'is_active', 'category_id', 'location_id',
+    'category__is_consumable',
+)
+
+
+def _compact(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'sku': row['sku'],
+        'qr_code': row['qr_code'],
+        'barcode': row['barcode'],
+        'category': row['category_id'],
+        'location': row['location_id'],
+        'is_consumable': row['category__is_consumable'],
+        'available_quantity': row['available_quantity'],
+        'status': row['status'],
+        'can_be_loaned': (
+            row['is_active'] and row['is_available_for_loan'] and
+            row['status'] == 'available' and row['available_quantity'] > 0
+        ),
+    }
+
+
+def _lookup(account_id, codes):
+    """Busca los códigos en una sola consulta. Prioridad: QR, SKU, barcode"""
+    rows = Material.objects.filter(account_id=account_id).filter(
+        Q(qr_code__in=codes) | Q(sku__in=codes) | Q(barcode__in=codes)
+    ).values(*RESOLVE_FIELDS)
+
+    by_qr, by_sku, by_barcode = {}, {}, {}
+    for row in rows:
+        record = _compact(row)
+        by_qr[row['qr_code']] = record
+        by_sku[row['sku']] = record
+        if row['barcode']:
+            by_barcode.setdefault(row['barcode'], record)
+
+    return {
+        code: by_qr.get(code) or by_sku.get(code) or by_barcode.get(code)
+        for code in codes
+    }
+
+
+def resolve_codes(account_id, codes):
+    """Retorna {código: registro compacto o None} para los códigos dados"""
+    codes = list(dict.fromkeys(codes))
+    version = get_version(CATALOG, account_id)
+    prefix = f'materials:resolve:{account_id}:{version}:'
+
+    cached = cache.get_many([prefix + code for code in codes])
+    results = {}
+    misses = []
+    for code in codes:
+        value = cached.get(prefix + code)
+        if value is None:
+            misses.append(code)
+        else:
+            results[code] = value or None
+
+    if misses:
+        found = _lookup(account_id, misses)
+        cache.set_many(
+            {prefix + code: record or MISSING for code, record in found.items()},
+            timeout=settings.MATERIAL_RESOLVE_CACHE_TIMEOUT
+        )
+        results.update(found)
+
+    return results
@@ -0,0 +1,180 @@
+"""
+Búsqueda de materiales con ranking.
+
+En PostgreSQL usa búsqueda de texto completo (tsvector) y similitud de
+trigramas, respaldadas por índices GIN. En otros motores (SQLite en
+desarrollo) usa LIKE con un ranking equivalente por reglas. Los pesos del
+ranking se configuran en settings.MATERIAL_SEARCH['WEIGHTS'].
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Collate, Upper
+from rest_framework.filters import SearchFilter
+
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_MAX_LIMIT = 25
+
+# Configuración de texto de PostgreSQL; forma parte de la expresión indexada
+SEARCH_CONFIG = 'spanish'
+
+DEFAULT_WEIGHTS = {
+    # Relevancia de texto completo (nombre/SKU > descripción)
+    'fulltext': 1.0,
+    # Similitud aproximada del nombre (errores de tecleo)
+    'trigram': 0.5,
+    # El nombre empieza con el término buscado
+    'prefix': 1.0,
+    # Coincidencia exacta de SKU, código de barras o QR
+    'exact_code': 4.0,
+}
+
+
+def ranking_weights():
+    configured = getattr(settings, 'MATERIAL_SEARCH', {}).get('WEIGHTS', {})
+    return {**DEFAULT_WEIGHTS, **configured}
+
+
+def search_vector():
+    """
+    Vector de búsqueda. Es la misma expresión del índice GIN creado en la
+    migración 0004, así PostgreSQL puede usarlo.
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('sku', weight='A', config='simple') +
+        SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def prefix_key(field):
+    """
+    Clave de autocompletado: UPPER(campo) con colación "C". Con la misma
+    expresión indexada, un prefijo se resuelve como un rango ordenado del
+    índice (account, clave) y el LIMIT corta sin ordenar las coincidencias.
+    """
+    return Collate(Upper(field), 'C')
+
+
+def _prefix_range(prefix):
+    prefix = prefix.upper()
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _exact_code_match(term):
+    return Q(sku__iexact=term) | Q(barcode=term) | Q(qr_code=term)
+
+
+def _rank_postgres(queryset, terms, weights):
+    query = SearchQuery(terms, search_type='websearch', config=SEARCH_CONFIG)
+    lower, upper = _prefix_range(terms)
+    code = terms.upper()
+    return queryset.alias(
+        # Las expresiones de los índices de prefijo de la migración 0004
+        name_key=prefix_key('name'),
+        sku_key=prefix_key('sku'),
+    ).annotate(
+        search=search_vector(),
+        search_rank=(
+            SearchRank(F('search'), query) * Value(weights['fulltext']) +
+            TrigramSimilarity('name', terms) * Value(weights['trigram']) +
+            Case(
+                When(name__istartswith=terms, then=Value(weights['prefix'])),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ) +
+            Case(
+                When(_exact_code_match(terms), then=Value(weights['exact_code'])),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        ),
+    ).filter(
+        # Cada rama coincide con un índice, así el OR se resuelve como
+        # BitmapOr de índices en vez de recorrer la tabla
+        Q(search=query) |
+        Q(name__trigram_similar=terms) |
+        Q(name_key__gte=lower, name_key__lt=upper) |
+        Q(sku_key__gte=lower, sku_key__lt=upper) |
+        Q(sku_key=code) |
+        Q(barcode=terms) |
+        Q(qr_code=terms)
+    )
+
+
+def _rank_fallback(queryset, terms, weights):
+    words = terms.split()
+    matches = Q()
+    for word in words:
+        matches &= (
+            Q(name__icontains=word) | Q(sku__icontains=word) |
+            Q(description__icontains=word) | Q(barcode__icontains=word)
+        )
+    matches |= _exact_code_match(terms)
+
+    return queryset.filter(matches).annotate(
+        search_rank=(
+            Case(
+                When(_exact_code_match(terms), then=Value(weights['exact_code'])),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ) +
+            Case(
+                When(name__istartswith=terms, then=Value(weights['prefix'])),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ) +
+            Case(
+                When(Q(name__icontains=terms) | Q(sku__icontains=terms), then=Value(weights['fulltext'])),
+                When(description__icontains=terms, then=Value(weights['fulltext'] / 4)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        ),
+    )
+
+
+def search_materials(queryset, terms):
+    """Filtra y ordena por relevancia los materiales que coinciden con `terms`"""
+    terms = ' '.join(terms.split())
+    if not terms:
+        return queryset
+    weights = ranking_weights()
+    if connection.vendor == 'postgresql':
+        queryset = _rank_postgres(queryset, terms, weights)
+    else:
+        queryset = _rank_fallback(queryset, terms, weights)
+    return queryset.order_by('-search_rank', 'name', 'id')
+
+
+def autocomplete_materials(queryset, prefix, limit=10):
+    """Sugerencias por prefijo de nombre o SKU"""
+    if connection.vendor == 'postgresql':
+        lower, upper = _prefix_range(prefix)
+        by_name = queryset.annotate(key=prefix_key('name')).filter(
+            key__gte=lower, key__lt=upper
+        ).order_by('key', 'id')
+        by_sku = queryset.annotate(key=prefix_key('sku')).filter(
+            key__gte=lower, key__lt=upper
+        ).order_by('key', 'id')
+    else:
+        by_name = queryset.filter(name__istartswith=prefix).order_by(Upper('name'), 'id')
+        by_sku = queryset.filter(sku__istartswith=prefix).order_by(Upper('sku'), 'id')
+
+    suggestions = {}
+    # Las coincidencias de SKU primero: suelen ser búsquedas exactas
+    rows = list(by_sku.values('id', 'name', 'sku')[:limit]) + list(by_name.values('id', 'name', 'sku')[:limit])
+    for row in rows:
+        suggestions.setdefault(row['id'], row)
+    return list(suggestions.values())[:limit]
+
+
+class MaterialSearchFilter(SearchFilter):
+    """SearchFilter (?search=) con ranking de relevancia para materiales"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+        return search_materials(queryset, terms)
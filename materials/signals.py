@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from materials.cache import CATALOG, bump_version
+from materials.models import Category, Location, Material
+
+
+@receiver([post_save, post_delete], sender=Material)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Location)
+def invalidate_catalog_caches(sender, instance, **kwargs):
+    """
+    Invalida las cachés y ETags del catálogo de la cuenta. Los materiales
+    incluyen su categoría y ubicación, así que cualquiera de los tres cuenta.
+    Se incrementa al confirmar la transacción: antes, un lector podría guardar
+    los datos viejos con la versión nueva.
+    """
+    account_id = instance.account_id
+    transaction.on_commit(lambda: bump_version(CATALOG, account_id))
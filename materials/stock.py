@@ -0,0 +1,368 @@
+"""
+Movimientos de inventario.
+
+Toda modificación de `quantity`/`available_quantity` pasa por aquí: cada
+movimiento es un UPDATE condicional con expresiones F (sin leer el saldo en
+Python) más su registro en StockMovement. Si la condición no se cumple no se
+escribe nada y se lanza ValueError, así dos kioscos concurrentes no pueden
+perder actualizaciones ni sobregirar el stock. La suma de los movimientos de un
+material es su saldo (ver reconcile_stock). Las operaciones que bloquean
+filas se repiten con with_retries si la BD las aborta por un interbloqueo.
+"""
+import random
+import time
+
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from audit.changes import untracked
+from materials.cache import CATALOG, bump_version
+from materials.models import Material, StockMovement
+
+STOCK_FIELDS = ('quantity', 'available_quantity')
+
+# Campos que solo se escriben junto con los saldos
+DERIVED_FIELDS = ('low_stock',)
+
+# Estados en los que el material no tiene unidades disponibles
+BLOCKED_STATUSES = ('maintenance', 'damaged', 'retired')
+
+
+def low_stock_after(available_delta=0):
+    """Valor de low_stock tras sumar available_delta, evaluado en SQL"""
+    return Case(
+        When(available_quantity__lte=F('min_stock_level') - available_delta, then=Value(True)),
+        default=Value(False),
+    )
+
+
+def refresh_low_stock(material):
+    """Recalcula low_stock con los saldos actuales de la BD"""
+    Material.objects.filter(pk=material.pk).update(low_stock=low_stock_after())
+    material.refresh_from_db(fields=['low_stock'])
+
+
+def _positive(quantity):
+    quantity = int(quantity)
+    if quantity <= 0:
+        raise ValueError("La cantidad debe ser mayor a cero")
+    return quantity
+
+
+def _status_changes(kind, available_delta):
+    """Transiciones de estado que acompañan al movimiento, evaluadas en SQL"""
+    # En el SET de un UPDATE las columnas tienen el valor anterior:
+    # available_quantity == -delta significa que el saldo queda en cero
+    if kind == StockMovement.CONSUME and available_delta < 0:
+        empty = When(available_quantity=-available_delta, then=Value('retired'))
+        return {
+            'status': Case(empty, default=F('status')),
+            'is_available_for_loan': Case(
+                When(available_quantity=-available_delta, then=Value(False)),
+                default=F('is_available_for_loan')
+            ),
+        }
+    if kind == StockMovement.ISSUE and available_delta < 0:
+        return {'status': Case(
+            When(status='available', available_quantity=-available_delta, then=Value('on_loan')),
+            default=F('status')
+        )}
+    if available_delta > 0:
+        return {'status': Case(
+            When(status='on_loan', then=Value('available')),
+            default=F('status')
+        )}
+    return {}
+
+
+def snapshot(material):
+    """Marca los saldos actuales de la instancia como los leídos de la BD"""
+    material._loaded_stock = (material.quantity, material.available_quantity)
+
+
+def pending_deltas(material):
+    """Cambios a los saldos hechos sobre la instancia desde que se leyó"""
+    loaded = getattr(material, '_loaded_stock', None)
+    if loaded is None or None in loaded:
+        return 0, 0
+    return material.quantity - loaded[0], material.available_quantity - loaded[1]
+
+
+def apply(material, kind, quantity_delta=0, available_delta=0, user=None, reference=None, notes=None):
+    """
+    Aplica un movimiento en una sola sentencia y lo registra.
+    Actualiza los saldos y el estado de la instancia.
+    """
+    # El movimiento es el registro del cambio (no se audita el UPDATE)
+    with transaction.atomic(), untracked():
+        updated = Material.objects.filter(
+            pk=material.pk,
+            quantity__gte=-quantity_delta,
+            available_quantity__gte=-available_delta,
+            available_quantity__lte=F('quantity') + (quantity_delta - available_delta),
+        ).update(
+            quantity=F('quantity') + quantity_delta,
+            available_quantity=F('available_quantity') + available_delta,
+            low_stock=low_stock_after(available_delta),
+            updated_at=timezone.now(),
+            **_status_changes(kind, available_delta)
+        )
+        if not updated:
+            material.refresh_from_db(fields=STOCK_FIELDS)
+            snapshot(material)
+            if available_delta < 0:
+                raise ValueError(
+                    f"Stock insuficiente para {material.name}. "
+                    f"Disponible: {material.available_quantity}, Solicitado: {-available_delta}"
+                )
+            raise ValueError(
+                f"Movimiento inválido para {material.name}: la cantidad disponible "
+                f"debe quedar entre 0 y la cantidad total"
+            )
+        movement = StockMovement.objects.create(
+            account_id=material.account_id,
+            material=material,
+            kind=kind,
+            quantity_delta=quantity_delta,
+            available_delta=available_delta,
+            user=user,
+            reference=reference,
+            notes=notes,
+        )
+        account_id = material.account_id
+        transaction.on_commit(lambda: bump_version(CATALOG, account_id))
+
+    material.refresh_from_db(fields=STOCK_FIELDS + ('status', 'is_available_for_loan', 'low_stock', 'updated_at'))
+    snapshot(material)
+    return movement
+
+
+def receive(material, quantity, **kwargs):
+    """Entrada de unidades nuevas al inventario"""
+    quantity = _positive(quantity)
+    return apply(material, StockMovement.RECEIVE, quantity, quantity, **kwargs)
+
+
+def consume(material, quantity, **kwargs):
+    """Salida definitiva de unidades (consumibles)"""
+    quantity = _positive(quantity)
+    return apply(material, StockMovement.CONSUME, -quantity, -quantity, **kwargs)
+
+
+MAX_BATCH_ITEMS = 200
+
+
+# Interbloqueo, conflicto de serialización y espera de bloqueo agotada (PostgreSQL)
+RETRY_SQLSTATES = ('40P01', '40001', '55P03')
+RETRY_ATTEMPTS = 3
+
+
+def is_retryable(error):
+    """La BD abortó la transacción por un conflicto con otra y se puede repetir"""
+    cause = error.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    return code in RETRY_SQLSTATES or 'database is locked' in str(error)
+
+
+def with_retries(func, attempts=RETRY_ATTEMPTS):
+    """
+    Ejecuta func(), que abre su propia transacción, y la repite hasta
+    `attempts` veces si la BD la aborta por un conflicto de concurrencia,
+    con una espera breve y aleatoria entre intentos. Dentro de otra
+    transacción no se reintenta: la transacción exterior ya está abortada.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except OperationalError as e:
+            if attempt == attempts or transaction.get_connection().in_atomic_block or not is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, 0.02 * attempt))
+
+
+def lock_materials(account_id, material_ids):
+    """
+    Bloquea (SELECT ... FOR UPDATE) los materiales de la cuenta en orden de
+    ID, así dos operaciones con materiales en común no se interbloquean.
+    Retorna {id: material} con la categoría cargada.
+    """
+    return {
+        material.pk: material
+        for material in Material.objects.select_for_update(of=('self',)).select_related(
+            'category'
+        ).filter(account_id=account_id, pk__in=material_ids).order_by('pk')
+    }
+
+
+def apply_locked(account_id, entries, user=None, notes=None):
+    """
+    Aplica movimientos a materiales ya bloqueados y validados por el llamador
+    (ver lock_materials), con un UPDATE para todos los saldos y un INSERT para
+    todos los movimientos. entries: [(material, tipo, delta cantidad,
+    delta disponible, referencia)]. Las transiciones de estado son las mismas
+    que las de `apply`. Retorna los movimientos creados.
+    """
+    now = timezone.now()
+    for material, kind, quantity_delta, available_delta, _ in entries:
+        previous = material.available_quantity
+        material.quantity += quantity_delta
+        material.available_quantity += available_delta
+        if not 0 <= material.available_quantity <= material.quantity:
+            raise ValueError(
+                f"Movimiento inválido para {material.name}: la cantidad disponible "
+                f"debe quedar entre 0 y la cantidad total"
+            )
+        if kind == StockMovement.CONSUME and available_delta < 0 and not material.available_quantity:
+            material.status = 'retired'
+            material.is_available_for_loan = False
+        elif kind == StockMovement.ISSUE and available_delta < 0 and previous == -available_delta:
+            if material.status == 'available':
+                material.status = 'on_loan'
+        elif available_delta > 0 and material.status == 'on_loan':
+            material.status = 'available'
+        material.low_stock = material.available_quantity <= material.min_stock_level
+        material.updated_at = now
+        snapshot(material)
+
+    with untracked():
+        Material.objects.bulk_update(
+            list({material.pk: material for material, *_ in entries}.values()),
+            STOCK_FIELDS + DERIVED_FIELDS + ('status', 'is_available_for_loan', 'updated_at')
+        )
+    movements = StockMovement.objects.bulk_create([
+        StockMovement(
+            account_id=account_id,
+            material=material,
+            kind=kind,
+            quantity_delta=quantity_delta,
+            available_delta=available_delta,
+            user=user,
+            reference=reference,
+            notes=notes,
+        )
+        for material, kind, quantity_delta, available_delta, reference in entries
+    ])
+    if movements:
+        transaction.on_commit(lambda: bump_version(CATALOG, account_id))
+    return movements
+
+
+def consume_batch(account_id, items, user=None, reference=None, notes=None, partial=False):
+    """
+    Consume varios materiales de la cuenta en una transacción.
+    items: [(material_id, cantidad)]; los IDs repetidos se suman.
+
+    Con los saldos bloqueados se valida cada material y se escribe todo en un
+    UPDATE y un INSERT. Sin `partial`, si algún material falla no se aplica
+    ninguno. Retorna (resultados por material, movimientos creados).
+    """
+    quantities = {}
+    for material_id, quantity in items:
+        quantities[material_id] = quantities.get(material_id, 0) + _positive(quantity)
+
+    with transaction.atomic():
+        rows = lock_materials(account_id, quantities)
+
+        results = []
+        consumed = []
+        for material_id, quantity in quantities.items():
+            material = rows.get(material_id)
+            result = {'material': material_id, 'quantity': quantity}
+            if material is None:
+                result['error'] = 'Material no encontrado'
+            elif not material.is_consumable:
+                result['error'] = 'Este material no es consumible'
+            elif material.available_quantity < quantity:
+                result['error'] = (
+                    f"Stock insuficiente para {material.name}. "
+                    f"Disponible: {material.available_quantity}, Solicitado: {quantity}"
+                )
+            else:
+                consumed.append((material, quantity, result))
+            results.append(result)
+
+        if len(consumed) < len(quantities) and not partial:
+            return results, []
+
+        movements = apply_locked(account_id, [
+            (material, StockMovement.CONSUME, -quantity, -quantity, reference)
+            for material, quantity, _ in consumed
+        ], user=user, notes=notes)
+        for material, _, result in consumed:
+            result['available_quantity'] = material.available_quantity
+    return results, movements
+
+
+def issue(material, quantity, **kwargs):
+    """Unidades que salen en préstamo"""
+    quantity = _positive(quantity)
+    return apply(material, StockMovement.ISSUE, available_delta=-quantity, **kwargs)
+
+
+def return_to_stock(material, quantity, **kwargs):
+    """Unidades prestadas que vuelven al inventario"""
+    quantity = _positive(quantity)
+    return apply(material, StockMovement.RETURN, available_delta=quantity, **kwargs)
+
+
+def adjust(material, quantity_delta=0, available_delta=0, **kwargs):
+    """Corrección manual de saldos (edición del material, inventario físico)"""
+    if not quantity_delta and not available_delta:
+        return None
+    return apply(material, StockMovement.ADJUST, quantity_delta, available_delta, **kwargs)
+
+
+def _set_available(material, target, kind_down, kind_up, **kwargs):
+    """
+    Lleva la cantidad disponible a `target(fila)` bloqueando la fila para
+    calcular la diferencia. Para saldos absolutos (no relativos).
+    """
+    with transaction.atomic():
+        row = Material.objects.select_for_update().values(
+            'quantity', 'available_quantity', 'status'
+        ).get(pk=material.pk)
+        delta = target(row) - row['available_quantity']
+        if not delta:
+            return None
+        return apply(material, kind_down if delta < 0 else kind_up, available_delta=delta, **kwargs)
+
+
+def clear_available(material, **kwargs):
+    """Deja sin unidades disponibles un material dañado, retirado o en mantenimiento"""
+    return _set_available(
+        material, lambda row: 0, StockMovement.ADJUST, StockMovement.ADJUST, **kwargs
+    )
+
+
+def sync_loaned(material, loaned, **kwargs):
+    """
+    Ajusta la disponibilidad a la cantidad total menos las unidades prestadas.
+    `loaned()` se evalúa con la fila ya bloqueada: un préstamo o devolución
+    confirmado antes del bloqueo queda incluido en el cálculo.
+    """
+    def target(row):
+        if row['status'] in BLOCKED_STATUSES:
+            return 0
+        return max(row['quantity'] - loaned(), 0)
+    return _set_available(material, target, StockMovement.ISSUE, StockMovement.RETURN, **kwargs)
+
+
+def record_opening(materials, user=None, reference=None):
+    """Registra el saldo inicial de materiales recién creados (incluye bulk_create)"""
+    movements = [
+        StockMovement(
+            account_id=material.account_id,
+            material_id=material.pk,
+            kind=StockMovement.RECEIVE,
+            quantity_delta=material.quantity,
+            available_delta=material.available_quantity,
+            user=user,
+            reference=reference,
+        )
+        for material in materials
+        if material.quantity or material.available_quantity
+    ]
+    StockMovement.objects.bulk_create(movements, batch_size=1000)
+    for material in materials:
+        snapshot(material)
+    return movements
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import threading
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from audit.changes import untracked
+from materials import stock
+from materials.models import Material, StockMovement
+from materials.Viewsets.category_viewsets import CategoryViewSet
+from materials.Viewsets.location_viewsets import LocationViewSet
+from materials.Viewsets.material_viewsets import MaterialViewSet
+from pack_a_stock_api.testing import QueryBudgetTestCase, make_account, make_material, make_user
+
+
+class CategoryQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/materials/categories/'
+    budgets = CategoryViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
+
+
+class LocationQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/materials/locations/'
+    budgets = LocationViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
+
+
+class MaterialQueryBudgetTests(QueryBudgetTestCase):
+    url = '/api/materials/materials/'
+    budgets = MaterialViewSet.query_budgets
+
+    def test_list(self):
+        self.assertListBudget(self.url, self.budgets['list'])
+
+    def test_retrieve(self):
+        self.assertDetailBudget(self.url, self.budgets['retrieve'])
+
+    def test_low_stock(self):
+        self.assertListBudget(f'{self.url}low_stock/', self.budgets['low_stock'])
+
+    def test_consumables(self):
+        self.assertListBudget(f'{self.url}consumables/', self.budgets['consumables'])
+
+    def test_reorder_suggestions(self):
+        self.assertListBudget(f'{self.url}reorder_suggestions/', self.budgets['reorder_suggestions'])
+
+
+def ledger(material):
+    """(cantidad, disponible) según la suma de los movimientos del material"""
+    totals = StockMovement.objects.filter(material=material).aggregate(
+        quantity=Sum('quantity_delta'), available=Sum('available_delta')
+    )
+    return totals['quantity'] or 0, totals['available'] or 0
+
+
+class StockApplyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+        cls.user = make_user(cls.account)
+
+    def test_opening_balance_is_recorded(self):
+        material = make_material(self.account, quantity=10)
+        self.assertEqual(ledger(material), (10, 10))
+
+    def test_consume_updates_balance_and_ledger(self):
+        material = make_material(self.account, consumable=True, quantity=10)
+        movement = stock.consume(material, 3, user=self.user, reference='test:1')
+
+        self.assertEqual(movement.kind, StockMovement.CONSUME)
+        self.assertEqual((movement.quantity_delta, movement.available_delta), (-3, -3))
+        self.assertEqual((material.quantity, material.available_quantity), (7, 7))
+        material.refresh_from_db()
+        self.assertEqual((material.quantity, material.available_quantity), (7, 7))
+        self.assertEqual(ledger(material), (7, 7))
+
+    def test_consume_to_zero_retires_material(self):
+        material = make_material(self.account, consumable=True, quantity=2)
+        stock.consume(material, 2)
+        material.refresh_from_db()
+        self.assertEqual(material.status, 'retired')
+        self.assertFalse(material.is_available_for_loan)
+        self.assertTrue(material.low_stock)
+
+    def test_issue_and_return_move_only_available(self):
+        material = make_material(self.account, quantity=1)
+        stock.issue(material, 1)
+        self.assertEqual((material.quantity, material.available_quantity, material.status), (1, 0, 'on_loan'))
+        stock.return_to_stock(material, 1)
+        self.assertEqual((material.quantity, material.available_quantity, material.status), (1, 1, 'available'))
+        self.assertEqual(ledger(material), (1, 1))
+
+    def test_rejected_consume_writes_nothing(self):
+        material = make_material(self.account, consumable=True, quantity=2)
+        with self.assertRaisesMessage(ValueError, 'Stock insuficiente'):
+            stock.consume(material, 3)
+
+        material.refresh_from_db()
+        self.assertEqual((material.quantity, material.available_quantity), (2, 2))
+        self.assertEqual(ledger(material), (2, 2))
+        self.assertEqual(material.movements.count(), 1)
+
+    def test_available_cannot_exceed_quantity(self):
+        material = make_material(self.account, quantity=5)
+        with self.assertRaisesMessage(ValueError, 'Movimiento inválido'):
+            stock.return_to_stock(material, 1)
+        self.assertEqual(ledger(material), (5, 5))
+
+    def test_non_positive_quantity_is_rejected(self):
+        material = make_material(self.account, consumable=True, quantity=5)
+        with self.assertRaises(ValueError):
+            stock.consume(material, 0)
+
+    def test_check_constraint_rejects_invalid_balance(self):
+        material = make_material(self.account, quantity=5)
+        for available in (-1, 6):
+            with self.subTest(available=available), self.assertRaises(IntegrityError), transaction.atomic():
+                Material.objects.filter(pk=material.pk).update(available_quantity=available)
+
+    def test_save_applies_quantity_change_as_adjustment(self):
+        material = make_material(self.account, quantity=5)
+        material.quantity = 8
+        material.save()
+
+        material.refresh_from_db()
+        self.assertEqual((material.quantity, material.available_quantity), (8, 8))
+        self.assertEqual(material.movements.filter(kind=StockMovement.ADJUST).count(), 1)
+        self.assertEqual(ledger(material), (8, 8))
+
+
+class ConsumeBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+
+    def test_consumes_all_items(self):
+        first = make_material(self.account, consumable=True, quantity=10)
+        second = make_material(self.account, consumable=True, quantity=10)
+
+        results, movements = stock.consume_batch(self.account.pk, [(first.pk, 2), (second.pk, 3), (first.pk, 1)])
+
+        self.assertEqual(len(movements), 2)
+        self.assertEqual({r['material']: r['available_quantity'] for r in results}, {first.pk: 7, second.pk: 7})
+        self.assertEqual(ledger(first), (7, 7))
+        self.assertEqual(ledger(second), (7, 7))
+
+    def test_one_failure_applies_nothing(self):
+        first = make_material(self.account, consumable=True, quantity=10)
+        short = make_material(self.account, consumable=True, quantity=1)
+        equipment = make_material(self.account, quantity=10)
+
+        results, movements = stock.consume_batch(
+            self.account.pk, [(first.pk, 2), (short.pk, 2), (equipment.pk, 1), (0, 1)]
+        )
+
+        self.assertEqual(movements, [])
+        errors = {r['material']: r.get('error') for r in results}
+        self.assertIsNone(errors[first.pk])
+        self.assertIn('Stock insuficiente', errors[short.pk])
+        self.assertEqual(errors[equipment.pk], 'Este material no es consumible')
+        self.assertEqual(errors[0], 'Material no encontrado')
+        for material in (first, short, equipment):
+            material.refresh_from_db()
+            self.assertEqual(ledger(material), (material.quantity, material.available_quantity))
+        self.assertEqual(first.available_quantity, 10)
+
+    def test_partial_applies_valid_items(self):
+        first = make_material(self.account, consumable=True, quantity=10)
+        short = make_material(self.account, consumable=True, quantity=1)
+
+        _, movements = stock.consume_batch(self.account.pk, [(first.pk, 2), (short.pk, 2)], partial=True)
+
+        self.assertEqual([m.material_id for m in movements], [first.pk])
+        first.refresh_from_db()
+        short.refresh_from_db()
+        self.assertEqual(first.available_quantity, 8)
+        self.assertEqual(short.available_quantity, 1)
+
+    def test_other_account_materials_are_not_found(self):
+        other = make_material(make_account(), consumable=True, quantity=10)
+        results, movements = stock.consume_batch(self.account.pk, [(other.pk, 1)])
+        self.assertEqual(movements, [])
+        self.assertEqual(results[0]['error'], 'Material no encontrado')
+
+
+class ReconcileStockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+
+    def drift(self, material, quantity, available):
+        """Saldo que no coincide con el ledger (escritura fuera de materials.stock)"""
+        with untracked():
+            Material.objects.filter(pk=material.pk).update(quantity=quantity, available_quantity=available)
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_stock', '--account', str(self.account.pk), *args, stdout=out)
+        return out.getvalue()
+
+    def test_rebuilds_drifted_balances(self):
+        material = make_material(self.account, consumable=True, quantity=10)
+        stock.consume(material, 4)
+        self.drift(material, 9, 9)
+
+        output = self.reconcile()
+
+        self.assertIn('1 materiales con diferencias (1 reconstruidos, 0 inválidos)', output)
+        material.refresh_from_db()
+        self.assertEqual((material.quantity, material.available_quantity), (6, 6))
+
+    def test_dry_run_only_reports(self):
+        material = make_material(self.account, quantity=10)
+        self.drift(material, 9, 9)
+
+        output = self.reconcile('--dry-run')
+
+        self.assertIn('(1 encontrados, 0 inválidos)', output)
+        material.refresh_from_db()
+        self.assertEqual((material.quantity, material.available_quantity), (9, 9))
+
+    def test_matching_balances_are_untouched(self):
+        make_material(self.account, quantity=10)
+        self.assertIn('0 materiales con diferencias', self.reconcile())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite serializa las escrituras')
+class ConcurrentStockTests(TransactionTestCase):
+    """Kioscos concurrentes sobre el mismo material (ver stress_stock para carga)"""
+    threads = 8
+    ops = 10
+
+    def test_no_lost_updates(self):
+        account = make_account()
+        units = self.threads * self.ops // 2
+        material = make_material(account, consumable=True, quantity=units)
+        applied = []
+        lock = threading.Lock()
+
+        def worker():
+            own = Material.objects.select_related('category').get(pk=material.pk)
+            count = 0
+            try:
+                for _ in range(self.ops):
+                    try:
+                        stock.consume(own, 1)
+                    except ValueError:
+                        continue
+                    count += 1
+            finally:
+                connection.close()
+            with lock:
+                applied.append(count)
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        material.refresh_from_db()
+        self.assertEqual(sum(applied), units)
+        self.assertEqual((material.quantity, material.available_quantity), (0, 0))
+        self.assertEqual(ledger(material), (0, 0))
@@ -0,0 +1,3 @@
+from pack_a_stock_api.celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -0,0 +1,9 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pack_a_stock_api.settings')
+
+app = Celery('pack_a_stock_api')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,93 @@
+"""
+Listados compactos (?compact=true).
+
+Las filas llevan las relaciones solo como ID y la respuesta agrega un mapa
+`included` con cada objeto relacionado una sola vez, p.ej.
+{"results": [...], "included": {"users": {"3": {...}}, "materials": {...}}}.
+Cada tipo se carga con un `in_bulk` y se serializa una vez, en lugar de
+repetir el mismo usuario o cuenta anidado en cada fila.
+"""
+from rest_framework.response import Response
+from pack_a_stock_api.query_plans import FetchPlan
+
+COMPACT_PARAM = 'compact'
+
+
+def compact_requested(request):
+    value = request.query_params.get(COMPACT_PARAM, '') if request is not None else ''
+    return value.lower() in ('1', 'true', 'yes')
+
+
+class Include:
+    """
+    Tipo de objeto incluido. `paths` indica dónde están los IDs: un campo de
+    la fila ('borrower'), un campo de una lista anidada ('items.material') o
+    un campo de otro tipo incluido antes ('users.account').
+    """
+
+    def __init__(self, key, queryset, serializer_class, paths):
+        self.key = key
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.paths = paths
+
+
+def _values(data, parts):
+    if isinstance(data, list):
+        for item in data:
+            yield from _values(item, parts)
+    elif not parts:
+        if data is not None:
+            yield data
+    elif isinstance(data, dict):
+        yield from _values(data.get(parts[0]), parts[1:])
+
+
+class CompactListMixin:
+    """
+    Mixin para viewsets con FetchPlanMixin. Declarar
+    `compact_serializer_class` (filas con relaciones como ID),
+    `compact_includes` ([Include, ...] en orden de dependencia) y
+    opcionalmente fetch_plans['compact'].
+    """
+    compact_serializer_class = None
+    compact_includes = []
+
+    def is_compact(self):
+        return self.action == 'list' and compact_requested(self.request)
+
+    def get_fetch_plan(self):
+        if self.is_compact():
+            # Las relaciones se cargan con in_bulk, sin JOIN
+            return self.fetch_plans.get('compact') or FetchPlan()
+        return super().get_fetch_plan()
+
+    def get_included(self, rows):
+        included = {}
+        for include in self.compact_includes:
+            ids = set()
+            for path in include.paths:
+                source, *parts = path.split('.')
+                if source in included:
+                    ids.update(_values(list(included[source].values()), parts))
+                else:
+                    ids.update(_values(rows, [source, *parts]))
+            objects = include.queryset.in_bulk(ids) if ids else {}
+            data = include.serializer_class(list(objects.values()), many=True).data
+            included[include.key] = {str(item['id']): item for item in data}
+        return included
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_compact():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = self.compact_serializer_class(
+            page if page is not None else queryset, many=True, context=self.get_serializer_context()
+        ).data
+        included = self.get_included(rows)
+        if page is not None:
+            response = self.get_paginated_response(rows)
+            response.data['included'] = included
+            return response
+        return Response({'results': rows, 'included': included})
@@ -0,0 +1,62 @@
+"""
+GET condicional (ETag / If-None-Match) para viewsets con versiones por cuenta.
+
+El ETag se deriva de la versión del ámbito (materials.cache) para la cuenta
+del usuario más la URL completa y el formato de respuesta, así que se calcula
+con una lectura de caché: si coincide con If-None-Match se responde 304 sin
+consultar ni serializar los registros. Cualquier escritura del ámbito cambia
+la versión y con ella todos los ETags de la cuenta.
+"""
+import hashlib
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from materials.cache import get_version
+
+
+def _opaque(etag):
+    # Comparación débil (RFC 9110): se ignora el prefijo W/
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+class ConditionalGetMixin:
+    """
+    Mixin para viewsets: ETag en list y retrieve.
+    Declarar `etag_scope` (p.ej. materials.cache.CATALOG).
+    """
+    etag_scope = None
+
+    def get_etag(self, request):
+        # La versión se lee antes que los registros: si una escritura ocurre
+        # entre ambas lecturas el ETag queda viejo y el cliente vuelve a pedir
+        version = get_version(self.etag_scope, request.user.account_id)
+        key = '|'.join(str(part) for part in (
+            self.etag_scope, request.user.account_id, version,
+            request.build_absolute_uri(), request.accepted_media_type,
+        ))
+        return 'W/"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        if self.etag_scope is None:
+            return handler(request, *args, **kwargs)
+        etag = self.get_etag(request)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            tags = parse_etags(if_none_match)
+            if _opaque(etag) in {_opaque(tag) for tag in tags}:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                response['Cache-Control'] = 'private, no-cache'
+                return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
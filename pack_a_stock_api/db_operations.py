@@ -0,0 +1,23 @@
+"""Operaciones de migración específicas de motor de base de datos"""
+from django.db import migrations
+
+
+class PostgresOnlyAddIndex(migrations.AddIndex):
+    """
+    AddIndex que solo se aplica en PostgreSQL (GIN, opclasses, etc.).
+
+    El índice no forma parte del estado de migraciones ni de Meta.indexes:
+    SQLite reconstruye la tabla a partir del estado al agregar restricciones
+    o columnas y fallaría al recrear índices propios de PostgreSQL.
+    """
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,181 @@
+"""
+Paginación de la API.
+
+Por defecto es paginación por número de página (?page=, ?page_size=), la que
+usan los clientes actuales. Con ?cursor= (vacío para la primera página) se
+usa paginación por llave (keyset): la página siguiente se pide con la llave
+del último registro sobre el orden actual (?ordering= o el orden del modelo)
+más `id` como desempate, así el costo no crece con la profundidad de la
+página. ?count=false omite el COUNT(*) en ambos modos.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardPagination(PageNumberPagination):
+    """Paginación por número de página o por llave (?cursor=)"""
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'cursor' if self.cursor_query_param in request.query_params else 'page'
+        self.with_count = request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0')
+        if self.mode == 'page' and self.with_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self.with_count else None
+        if self.mode == 'cursor':
+            return self._paginate_cursor(queryset, request)
+        return self._paginate_uncounted(queryset, request)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page' and self.with_count:
+            return super().get_paginated_response(data)
+        payload = {'next': self.next_link, 'previous': self.previous_link, 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    # Página sin total: se pide un registro extra para saber si hay siguiente
+    def _paginate_uncounted(self, queryset, request):
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise NotFound(self.invalid_page_message.format(page_number=number, message=''))
+
+        offset = (number - 1) * self.page_size
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        url = request.build_absolute_uri()
+        self.next_link = (
+            replace_query_param(url, self.page_query_param, number + 1)
+            if len(rows) > self.page_size else None
+        )
+        if number == 1:
+            self.previous_link = None
+        elif number == 2:
+            self.previous_link = remove_query_param(url, self.page_query_param)
+        else:
+            self.previous_link = replace_query_param(url, self.page_query_param, number - 1)
+        return rows[:self.page_size]
+
+    # Paginación por llave
+    def _keyset_fields(self, queryset):
+        """
+        ([(campo, descendente)], desempate descendente) del orden actual.
+        Solo admite campos del modelo.
+        """
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        fields = []
+        tie_desc = None
+        for term in ordering:
+            if not isinstance(term, str):
+                raise ValidationError({'cursor': ['El orden actual no admite paginación por cursor']})
+            name = term.lstrip('-')
+            if name == '?' or '__' in name:
+                raise ValidationError({'cursor': ['El orden actual no admite paginación por cursor']})
+            if name == 'pk':
+                name = queryset.model._meta.pk.name
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise ValidationError({'cursor': ['El orden actual no admite paginación por cursor']})
+            if field.primary_key:
+                tie_desc = term.startswith('-')
+                break
+            fields.append((field, term.startswith('-')))
+        if tie_desc is None:
+            # El desempate sigue la dirección del último campo (mismo índice)
+            tie_desc = fields[-1][1] if fields else False
+        return fields, tie_desc
+
+    def _decode_cursor(self, value, fields, tie_desc):
+        if not value:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(value.encode()).decode())
+            if data['o'] != self._signature(fields, tie_desc):
+                raise ValueError
+            values = [
+                None if raw is None else field.to_python(raw)
+                for (field, _), raw in zip(fields, data['v'])
+            ]
+            return values, data['id']
+        except Exception:
+            raise NotFound('Cursor inválido')
+
+    def _encode_cursor(self, row, fields, tie_desc):
+        data = {
+            'o': self._signature(fields, tie_desc),
+            'v': [getattr(row, field.attname) for field, _ in fields],
+            'id': row.pk,
+        }
+        return base64.urlsafe_b64encode(json.dumps(data, default=self._json_value).encode()).decode()
+
+    @staticmethod
+    def _json_value(value):
+        # isoformat completo: la llave debe conservar los microsegundos
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def _signature(fields, tie_desc):
+        terms = [('-' if desc else '') + field.name for field, desc in fields]
+        return ','.join(terms + ['-id' if tie_desc else 'id'])
+
+    @staticmethod
+    def _after(fields, tie_desc, values, last_id):
+        """
+        Registros posteriores a la llave (values, last_id) según el orden.
+        Los NULL van siempre al final, en cualquier motor.
+        """
+        condition = Q(pk__lt=last_id) if tie_desc else Q(pk__gt=last_id)
+        for (field, desc), value in reversed(list(zip(fields, values))):
+            name = field.attname
+            if value is None:
+                # En la cola de NULL solo cuenta el desempate
+                condition = Q(**{f'{name}__isnull': True}) & condition
+                continue
+            beyond = Q(**{f'{name}__lt' if desc else f'{name}__gt': value})
+            if field.null:
+                beyond |= Q(**{f'{name}__isnull': True})
+            condition = beyond | (Q(**{name: value}) & condition)
+        return condition
+
+    def _paginate_cursor(self, queryset, request):
+        fields, tie_desc = self._keyset_fields(queryset)
+        order_by = [
+            F(field.attname).desc(nulls_last=True) if desc else F(field.attname).asc(nulls_last=True)
+            for field, desc in fields
+        ]
+        order_by.append('-pk' if tie_desc else 'pk')
+        queryset = queryset.order_by(*order_by)
+
+        cursor = self._decode_cursor(request.query_params.get(self.cursor_query_param), fields, tie_desc)
+        if cursor is not None:
+            queryset = queryset.filter(self._after(fields, tie_desc, *cursor))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.previous_link = None
+        self.next_link = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            url = request.build_absolute_uri()
+            self.next_link = replace_query_param(
+                url, self.cursor_query_param, self._encode_cursor(rows[-1], fields, tie_desc)
+            )
+        return rows
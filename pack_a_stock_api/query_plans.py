@@ -0,0 +1,41 @@
+"""
+Planes de carga declarativos para los viewsets.
+
+Cada viewset declara en `fetch_plans` qué relaciones une (select_related),
+precarga (prefetch_related) y qué columnas lee (only) por acción, para que
+el número de consultas no dependa del tamaño de la página. Las acciones sin
+plan propio usan el plan 'default'.
+"""
+class FetchPlan:
+    def __init__(self, select=(), prefetch=(), only=()):
+        self.select = tuple(select)
+        self.prefetch = tuple(prefetch)
+        self.only = tuple(only)
+
+    def apply(self, queryset):
+        if self.select:
+            queryset = queryset.select_related(*self.select)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+class FetchPlanMixin:
+    """
+    Aplica el plan de la acción actual en `plan_queryset`.
+
+    Los viewsets pueden declarar también `query_budgets = {'list': N, ...}`,
+    que verifican las pruebas de cada app (ver pack_a_stock_api.testing).
+    """
+    fetch_plans = {}
+    query_budgets = {}
+
+    def get_fetch_plan(self):
+        return self.fetch_plans.get(self.action) or self.fetch_plans.get('default')
+
+    def plan_queryset(self, queryset):
+        plan = self.get_fetch_plan()
+        return plan.apply(queryset) if plan else queryset
+
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -67,6 +68,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'audit.changes.AuditContextMiddleware',  # Usuario de los cambios auditados
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -173,6 +175,64 @@ else:
     MEDIA_URL = 'media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Caché (compartida entre procesos en producción vía Redis)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Celery (tareas periódicas; el broker por defecto es el Redis de la caché)
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL or 'memory://')
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-loan-availability': {
+        'task': 'loans.tasks.reconcile_availability',
+        'schedule': config('LOAN_AVAILABILITY_RECONCILE_INTERVAL', default=3600, cast=int),
+    },
+    'sweep-overdue-loans': {
+        'task': 'loans.tasks.sweep_overdue',
+        'schedule': config('LOAN_OVERDUE_SWEEP_INTERVAL', default=900, cast=int),
+    },
+    'archive-closed-loans': {
+        'task': 'loans.tasks.archive_closed',
+        'schedule': config('LOAN_ARCHIVE_INTERVAL', default=86400, cast=int),
+    },
+}
+
+# Resolución de códigos escaneados (segundos)
+MATERIAL_RESOLVE_CACHE_TIMEOUT = config('MATERIAL_RESOLVE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Capacidad libre por rango de fechas (loans.reservations, segundos)
+LOAN_AVAILABILITY_CACHE_TIMEOUT = config('LOAN_AVAILABILITY_CACHE_TIMEOUT', default=300, cast=int)
+
+# Archivo de préstamos y solicitudes cerrados (loans.archive)
+LOAN_ARCHIVE_AFTER_DAYS = config('LOAN_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+LOAN_ARCHIVE_BATCH_SIZE = config('LOAN_ARCHIVE_BATCH_SIZE', default=1000, cast=int)
+
+# Auditoría diferida (audit.buffer): spool local por servidor
+AUDIT_BUFFER_ENABLED = config('AUDIT_BUFFER_ENABLED', default=True, cast=bool)
+AUDIT_BUFFER_SIZE = config('AUDIT_BUFFER_SIZE', default=200, cast=int)
+AUDIT_FLUSH_INTERVAL = config('AUDIT_FLUSH_INTERVAL', default=2.0, cast=float)
+AUDIT_SPOOL_DIR = config('AUDIT_SPOOL_DIR', default=os.path.join(BASE_DIR, 'cache', 'audit'))
+AUDIT_SPOOL_FSYNC = config('AUDIT_SPOOL_FSYNC', default=False, cast=bool)
+# Captura automática de cambios de los modelos auditados (audit.changes)
+AUDIT_CHANGES_ENABLED = config('AUDIT_CHANGES_ENABLED', default=True, cast=bool)
+
+# Códigos QR renderizados bajo demanda (materials.qr)
+QR_CACHE_DIR = config('QR_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'qr'))
+QR_MEMORY_CACHE_ITEMS = config('QR_MEMORY_CACHE_ITEMS', default=512, cast=int)
+QR_DISK_CACHE_MAX_FILES = config('QR_DISK_CACHE_MAX_FILES', default=50000, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -190,13 +250,25 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'pack_a_stock_api.pagination.StandardPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
+        'rest_framework.filters.SearchFilter',
+        'rest_framework.filters.OrderingFilter',
     ),
 }
 
+# Ranking de búsqueda de materiales (ver materials.search)
+MATERIAL_SEARCH = {
+    'WEIGHTS': {
+        'fulltext': config('MATERIAL_SEARCH_WEIGHT_FULLTEXT', default=1.0, cast=float),
+        'trigram': config('MATERIAL_SEARCH_WEIGHT_TRIGRAM', default=0.5, cast=float),
+        'prefix': config('MATERIAL_SEARCH_WEIGHT_PREFIX', default=1.0, cast=float),
+        'exact_code': config('MATERIAL_SEARCH_WEIGHT_EXACT_CODE', default=4.0, cast=float),
+    },
+}
+
 # JWT Settings
 from datetime import timedelta
 
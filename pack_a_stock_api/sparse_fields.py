@@ -0,0 +1,143 @@
+"""
+Campos parciales (?fields=) y expansión (?expand=) en los serializers.
+
+Sin parámetros la respuesta no cambia. Con ?fields=id,name solo se incluyen
+esos campos; los serializers anidados (p.ej. category_detail) solo se
+incluyen si se piden en ?expand= con el nombre de la relación
+(?expand=category). Los campos que no se piden ni se construyen ni se
+serializan, y el viewset proyecta el queryset a las columnas que usan
+(ver SparseFieldsMixin).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import PrimaryKeyRelatedField
+from pack_a_stock_api.query_plans import FetchPlan
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _param_set(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def requested_fields(request):
+    """Campos pedidos en ?fields= más los anidados de ?expand=, o None"""
+    if request is None:
+        return None
+    fields = _param_set(request, FIELDS_PARAM)
+    if fields is None:
+        return None
+    return fields, _param_set(request, EXPAND_PARAM) or set()
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Mixin para ModelSerializer. En Meta:
+    - expandable_fields: {relación: campo anidado}, p.ej. {'category': 'category_detail'}
+    - field_dependencies: columnas que lee un campo calculado,
+      p.ej. {'is_low_stock': ['available_quantity', 'min_stock_level']}
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Solo el serializer raíz recibe el request en el contexto
+        requested = requested_fields(self.context.get('request'))
+        if requested is None:
+            return
+        allowed = self.allowed_fields(*requested)
+        for name in list(self.fields):
+            if name not in allowed:
+                self.fields.pop(name)
+
+    @classmethod
+    def allowed_fields(cls, fields, expand):
+        expandable = getattr(cls.Meta, 'expandable_fields', {})
+        nested = set(expandable.values())
+        allowed = {name for name in fields if name not in nested}
+        allowed.update(expandable[name] for name in expand if name in expandable)
+        return allowed
+
+    def projection(self):
+        """
+        (columnas, relaciones) que leen los campos de este serializer, o
+        (None, relaciones) si algún campo no se puede proyectar a columnas.
+        """
+        model = self.Meta.model
+        dependencies = getattr(self.Meta, 'field_dependencies', {})
+        columns = {model._meta.pk.name}
+        related_columns = {}
+        full_relations = set()
+        projectable = True
+
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in dependencies:
+                paths = dependencies[name]
+            elif field.source == '*':
+                projectable = False
+                continue
+            else:
+                paths = ['__'.join(field.source.split('.'))]
+
+            for path in paths:
+                head, _, rest = path.partition('__')
+                try:
+                    model_field = model._meta.get_field(head)
+                except FieldDoesNotExist:
+                    # Propiedad sin dependencias declaradas
+                    projectable = False
+                    continue
+                if (not model_field.is_relation or isinstance(field, PrimaryKeyRelatedField)
+                        or head == getattr(model_field, 'attname', None) != model_field.name):
+                    # Columna propia o llave foránea leída como ID
+                    columns.add(model_field.name)
+                elif not model_field.concrete:
+                    # Relación inversa (prefetch)
+                    full_relations.add(head)
+                else:
+                    columns.add(head)
+                    if rest:
+                        related_columns.setdefault(head, set()).add(path)
+                    else:
+                        full_relations.add(head)
+
+        # Una relación que se serializa completa no se restringe a columnas
+        for relation, paths in related_columns.items():
+            if relation not in full_relations:
+                columns.update(paths)
+        relations = full_relations | set(related_columns)
+        return (sorted(columns) if projectable else None), relations
+
+
+class SparseFieldsMixin:
+    """
+    Mixin para viewsets con FetchPlanMixin: con ?fields= reduce el plan de
+    carga a las relaciones y columnas que usa la respuesta.
+    """
+
+    def get_fetch_plan(self):
+        plan = super().get_fetch_plan()
+        if self.action not in ('list', 'retrieve') or requested_fields(self.request) is None:
+            return plan
+        serializer = self.get_serializer()
+        if not hasattr(serializer, 'projection'):
+            return plan
+
+        columns, relations = serializer.projection()
+        base = plan or FetchPlan()
+        select = [path for path in base.select if path.split('__')[0] in relations]
+        covered = {path.split('__')[0] for path in select}
+        model = serializer.Meta.model
+        for relation in relations - covered:
+            field = model._meta.get_field(relation)
+            if field.many_to_one or field.one_to_one:
+                select.append(relation)
+        prefetch = [
+            lookup for lookup in base.prefetch
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in relations
+        ]
+        return FetchPlan(select=select, prefetch=prefetch, only=columns or ())
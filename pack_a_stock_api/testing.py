@@ -0,0 +1,149 @@
+"""
+Utilidades compartidas por las pruebas de las apps (`<app>/tests.py`).
+
+QueryBudgetTestCase verifica los `query_budgets` de los viewsets (ver
+pack_a_stock_api.query_plans): cada endpoint de lectura se consulta con dos
+tamaños de página y debe usar exactamente las consultas del presupuesto, sin
+importar cuántas filas devuelve.
+"""
+from datetime import timedelta
+from itertools import count
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import Account, User
+
+_sequence = count(1)
+
+
+def make_account(**fields):
+    number = next(_sequence)
+    fields.setdefault('company_name', f'Cuenta {number}')
+    fields.setdefault('email', f'cuenta{number}@example.com')
+    return Account.objects.create(**fields)
+
+
+def make_user(account, user_type='inventarista', **fields):
+    number = next(_sequence)
+    fields.setdefault('email', f'usuario{number}@example.com')
+    fields.setdefault('full_name', f'Usuario {number}')
+    return User.objects.create_user(account=account, user_type=user_type, password='secreta', **fields)
+
+
+def make_material(account, consumable=False, quantity=10, **fields):
+    """Material con su propia categoría y saldo inicial (registrado en el ledger)"""
+    from materials.models import Category, Material
+
+    number = next(_sequence)
+    category = Category.objects.create(account=account, name=f'Categoría {number}', is_consumable=consumable)
+    fields.setdefault('name', f'Material {number}')
+    fields.setdefault('sku', f'TEST-{number:06d}')
+    fields.setdefault('available_quantity', quantity)
+    return Material.objects.create(account=account, category=category, quantity=quantity, **fields)
+
+
+def seed_catalog(user, size):
+    """`size` ubicaciones, materiales, préstamos, solicitudes y extensiones de la cuenta del usuario"""
+    from loans.models import Loan, LoanExtension, LoanRequest, LoanRequestItem
+    from materials.models import Category, Location, Material
+    from materials.stock import record_opening
+
+    account = user.account
+    category = Category.objects.create(account=account, name='Presupuesto')
+    locations = Location.objects.bulk_create([
+        Location(
+            account=account, name=f'Almacén {i}', street='Calle', exterior_number='1',
+            neighborhood='Centro', postal_code='00000', city='Ciudad', state='Estado',
+        )
+        for i in range(size)
+    ])
+    materials = Material.objects.bulk_create([
+        Material(
+            account=account,
+            category=category,
+            location=locations[i],
+            name=f'Material {i}',
+            sku=f'QB-{account.pk}-{i:06d}',
+            qr_code=Material.generate_qr_code(),
+            quantity=size,
+            available_quantity=size,
+        )
+        for i in range(size)
+    ])
+    record_opening(materials)
+    today = timezone.now().date()
+    loans = Loan.objects.bulk_create([
+        Loan(
+            account=account,
+            borrower=user,
+            issued_by=user,
+            material=material,
+            expected_return_date=today + timedelta(days=7),
+        )
+        for material in materials
+    ])
+    requests = LoanRequest.objects.bulk_create([
+        LoanRequest(
+            account=account,
+            requester=user,
+            desired_pickup_date=today,
+            desired_return_date=today + timedelta(days=7),
+        )
+        for _ in range(size)
+    ])
+    LoanRequestItem.objects.bulk_create([
+        LoanRequestItem(loan_request=loan_request, material=material)
+        for loan_request, material in zip(requests, materials)
+    ])
+    LoanExtension.objects.bulk_create([
+        LoanExtension(
+            account=account,
+            loan=loan,
+            requested_by=user,
+            new_return_date=today + timedelta(days=14),
+            reason='Presupuesto',
+        )
+        for loan in loans
+    ])
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Base de las pruebas de presupuesto de consultas. Las subclases llaman a
+    assertListBudget / assertDetailBudget con la URL y el presupuesto del
+    viewset (`query_budgets[acción]`).
+    """
+    page_sizes = (1, 20)
+    seed_size = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = make_account()
+        cls.user = make_user(cls.account)
+        seed_catalog(cls.user, cls.seed_size)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ok(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, f'GET {url}')
+        return response.json()
+
+    def assertListBudget(self, url, budget):
+        # Se mide con las cachés por cuenta ya llenas (p.ej. la zona horaria)
+        self.get_ok(url)
+        separator = '&' if '?' in url else '?'
+        for size in self.page_sizes:
+            with self.subTest(page_size=size), self.assertNumQueries(budget):
+                self.get_ok(f'{url}{separator}page_size={size}')
+
+    def assertDetailBudget(self, url, budget):
+        data = self.get_ok(url)
+        results = data['results'] if isinstance(data, dict) and 'results' in data else data
+        detail_url = f"{url}{results[0]['id']}/"
+        self.get_ok(detail_url)
+        with self.assertNumQueries(budget):
+            self.get_ok(detail_url)
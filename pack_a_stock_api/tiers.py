@@ -0,0 +1,126 @@
+"""
+Lectura de la tabla activa y la de archivo (ver loans.archive).
+
+Con ?history=true el listado incluye los registros archivados: los filtros,
+la búsqueda y el orden se aplican a cada tabla y ambas se combinan en un
+UNION ALL ordenado que se pagina en la base de datos. Solo la página se
+convierte en instancias del modelo activo (con sus relaciones precargadas),
+así los serializers no cambian. El detalle (?history=true) busca en el
+archivo si el registro ya no está en la tabla activa. Sin el parámetro las
+consultas solo tocan la tabla activa.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import BooleanField, Value, prefetch_related_objects
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+
+HISTORY_PARAM = 'history'
+
+
+def history_requested(request):
+    return request.query_params.get(HISTORY_PARAM, '').lower() in ('true', '1')
+
+
+class TieredReadMixin:
+    """
+    Mixin para viewsets con FetchPlanMixin. El viewset declara:
+    - archive_model: modelo de archivo con las mismas columnas
+    - scope_queryset(queryset): restricciones de acceso, igual para ambas tablas
+    - archive_actions: acciones que siempre buscan también en el archivo
+    - attach_archived(instances): opcional, carga las relaciones inversas de
+      las instancias archivadas (las del modelo activo ya no existen)
+    """
+    archive_model = None
+    archive_actions = ()
+
+    def reads_archive(self):
+        if self.action in self.archive_actions:
+            return True
+        return self.action in ('list', 'retrieve') and history_requested(self.request)
+
+    def get_archive_queryset(self):
+        return self.scope_queryset(self.archive_model.objects.all())
+
+    def attach_archived(self, instances):
+        pass
+
+    def _tier_rows(self, queryset, archived):
+        """Filas (columnas del modelo activo, anotaciones) del queryset de una tabla"""
+        model = self.queryset.model
+        fields = [field.attname for field in model._meta.concrete_fields]
+        queryset = queryset.annotate(is_archived=Value(archived, output_field=BooleanField()))
+        annotations = list(queryset.query.annotations)
+        self._tier_columns = (model, fields, annotations)
+        return queryset.prefetch_related(None).order_by().values_list(*fields, *annotations)
+
+    def _filter_tier(self, queryset):
+        try:
+            return super().filter_queryset(queryset), None
+        except ValidationError as error:
+            # P.ej. ?loan= con un ID que solo existe en la otra tabla
+            return None, error
+
+    def filter_queryset(self, queryset):
+        if self.action != 'list' or not self.reads_archive():
+            return super().filter_queryset(queryset)
+        if 'cursor' in self.request.query_params:
+            raise ValidationError({'cursor': ['La paginación por cursor no admite ?history=true']})
+
+        archive = self.get_archive_queryset()
+        hot, error = self._filter_tier(queryset)
+        cold, _ = self._filter_tier(archive)
+        if hot is None and cold is None:
+            raise error
+        ordered = hot if hot is not None else cold
+        ordering = list(ordered.query.order_by or queryset.model._meta.ordering)
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering.append('-id')
+
+        self.tiered = True
+        tiers = [
+            self._tier_rows(tier, archived)
+            for tier, archived in ((hot, False), (cold, True)) if tier is not None
+        ]
+        return tiers[0].union(*tiers[1:], all=True).order_by(*ordering)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and getattr(self, 'tiered', False):
+            page = self.tier_instances(page, queryset.db)
+        return page
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if not self.reads_archive():
+                raise
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            archive = self.get_archive_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            rows = list(self._tier_rows(archive, True)[:1])
+        except (TypeError, ValueError, DjangoValidationError):
+            # ID mal formado, igual que get_object_or_404
+            raise Http404
+        if not rows:
+            raise Http404
+        obj = self.tier_instances(rows, archive.db)[0]
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def tier_instances(self, rows, db):
+        """Instancias del modelo activo para filas de _tier_rows"""
+        model, fields, annotations = self._tier_columns
+        instances = []
+        for row in rows:
+            instance = model.from_db(db, fields, row[:len(fields)])
+            for name, value in zip(annotations, row[len(fields):]):
+                setattr(instance, name, value)
+            instances.append(instance)
+
+        plan = self.get_fetch_plan()
+        if plan:
+            prefetch_related_objects(instances, *plan.select)
+            prefetch_related_objects([obj for obj in instances if not obj.is_archived], *plan.prefetch)
+        self.attach_archived([obj for obj in instances if obj.is_archived])
+        return instances
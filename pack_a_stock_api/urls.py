@@ -13,6 +13,7 @@ from loans.routers import router as loans_router
 
 # Importar views de autenticación
 from accounts.Viewsets.auth_viewsets import login, refresh_token, logout
+from materials.Viewsets.qr_viewsets import qr_image
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -22,6 +23,9 @@ urlpatterns = [
     path('api/auth/refresh/', refresh_token, name='refresh_token'),
     path('api/auth/logout/', logout, name='logout'),
     
+    # Imágenes QR renderizadas bajo demanda
+    path('api/materials/qr/<str:qr_code>.<str:fmt>', qr_image, name='material-qr-image'),
+    
     # API principal con routers modularizados
     path('api/accounts/', include(accounts_router.urls)),
     path('api/materials/', include(materials_router.urls)),